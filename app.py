@@ -1,31 +1,33 @@
-import base64
-
 import jwt
-import requests
-from flask import Flask, request, jsonify, url_for
+from flask import Flask, request, jsonify, send_from_directory, url_for
 from flask_cors import CORS
 from coingecko_sol_all import get_coingecko_sol_all, get_coingecko_sol_all_memes, get_coingecko_all_memes
-from coingecko_sol import get_market_cap_sums_and_participation
-from liquidity import calculate_correlations
+from coingecko_sol import get_market_cap_index_columnar, get_market_cap_sums_and_participation
+from liquidity import MAX_GRID_LAGS, calculate_correlation_grid, calculate_correlations, parse_grid_axis
+from price_history import PriceHistoryUnavailable
 from rsps import get_rsps
-from prices import get_price_chart
-import json
-from database import get_db_connection, get_db_cursor
+from prices import get_price_chart, get_price_chart_columnar
+from database import db_session, fetch_frame, get_pool_stats
+from columnar import COLUMNAR_FORMAT, frame_to_columnar, wants_columnar
+from response_cache import cached_response, get_cache_stats
+from json_provider import OrjsonProvider
+from compression import compress_response
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.asymmetric import rsa
 from jupiter import get_jupiter_all, get_jupiter
-import cryptography.hazmat.primitives.serialization as serialization
+import jwks_cache
+import jobs
+from plots import PLOT_IMMUTABLE_MAX_AGE, PLOTS_DIR, read_manifest
 from trading_view_experiments import fetch_records_from_experiments, add_record_to_experiments, delete_record_from_experiments
 
 from trw_guy_new_entry import add_data, get_data, delete_data_by_date
-from trw_guy import trw_guy_def
+from trw_guy_model import PROJECTION_GL_MAX, PROJECTION_POINTS, ZSCORE_MODELS, fetch_data as fetch_price_data, model_summary, projection
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Configure CORS to allow all origins
 CORS(app, 
@@ -40,26 +42,11 @@ COGNITO_USERPOOL_ID = os.getenv('COGNITO_USERPOOL_ID', 'your_user_pool_id')
 COGNITO_APP_CLIENT_ID = os.getenv('COGNITO_APP_CLIENT_ID', 'your_client_id')
 COGNITO_ISSUER = f"https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USERPOOL_ID}"
 
-# Helper function to convert JWK to PEM format
-def convert_jwk_to_pem(jwk):
-    n = base64.urlsafe_b64decode(jwk['n'] + '==')
-    e = base64.urlsafe_b64decode(jwk['e'] + '==')
-
-    public_key = rsa.RSAPublicNumbers(
-        int.from_bytes(e, byteorder='big'),
-        int.from_bytes(n, byteorder='big')
-    ).public_key(default_backend())
+jwks_cache.configure(f'{COGNITO_ISSUER}/.well-known/jwks.json')
 
-    return public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    )
-
-# Caching the public keys
-def get_cognito_public_keys():
-    response = requests.get(f'{COGNITO_ISSUER}/.well-known/jwks.json')
-    keys = response.json()['keys']
-    return {key['kid']: key for key in keys}
+@app.after_request
+def compress(response):
+    return compress_response(response)
 
 # Middleware to check token
 def token_required(f):
@@ -72,18 +59,16 @@ def token_required(f):
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
-            # Decode the token
-            public_keys = get_cognito_public_keys()
+            # Look up the signing key (cached, see jwks_cache.py)
             unverified_header = jwt.get_unverified_header(token)
-            jwk = public_keys[unverified_header['kid']]
-
-            # Convert JWK to PEM
-            rsa_public_key = convert_jwk_to_pem(jwk)
+            public_key = jwks_cache.get_public_key(unverified_header.get('kid'))
+            if public_key is None:
+                return jsonify({'message': 'Invalid token'}), 401
 
             # Verify the token
             payload = jwt.decode(
                 token,
-                key=rsa_public_key,
+                key=public_key,
                 algorithms=['RS256'],
                 audience=COGNITO_APP_CLIENT_ID,
                 issuer=COGNITO_ISSUER
@@ -103,33 +88,76 @@ def token_required(f):
 
 # Database connection function is now imported from database.py
 
+def regenerate_plots():
+    # trw_guy pulls in matplotlib; only the background job that renders the plots imports it
+    from trw_guy import trw_guy_def
+    return trw_guy_def()
+
+def fetch_liquidity_records(start_date, end_date, record_index):
+    query = """
+        SELECT * FROM liquidity
+        WHERE (record_date BETWEEN %s AND %s) AND (record_index = %s)
+        ORDER BY record_date ASC
+    """
+    with db_session() as cursor:
+        cursor.execute(query, (start_date, end_date, record_index))
+        records = cursor.fetchall()
+
+    return records
+
+def fetch_liquidity_columnar(start_date, end_date, record_index):
+    query = """
+        SELECT * FROM liquidity
+        WHERE (record_date BETWEEN %s AND %s) AND (record_index = %s)
+        ORDER BY record_date ASC
+    """
+    frame = fetch_frame(query, (start_date, end_date, record_index), parse_dates=['record_date'])
+
+    return frame_to_columnar(frame, 'record_date')
+
+def liquidity_response(start_date, end_date, record_index):
+    if wants_columnar(request.args):
+        return jsonify(fetch_liquidity_columnar(start_date, end_date, record_index))
+    return jsonify(fetch_liquidity_records(start_date, end_date, record_index))
+
 @app.route('/')
 def hello_world():
     return 'Hello, World!'
 
+@app.route('/db-pool-stats', methods=['GET'])
+def db_pool_stats():
+    return jsonify(get_pool_stats())
+
+@app.route('/response-cache-stats', methods=['GET'])
+def response_cache_stats():
+    return jsonify(get_cache_stats())
+
 @app.route('/coin/<coin>', methods=['GET'])
+@cached_response('table1')
 def coin_price(coin):
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    response = get_price_chart(start_date, end_date, coin)
-    return response
+    if wants_columnar(request.args):
+        return jsonify(get_price_chart_columnar(start_date, end_date, coin))
+    return get_price_chart(start_date, end_date, coin)
 
 @app.route('/coingecko-sol-all', methods=['GET'])
+@cached_response('table2')
 def coingecko_sol_api():
-    response = get_coingecko_sol_all()
-    return jsonify(json.loads(response['body']))
+    return jsonify(get_coingecko_sol_all())
 
 @app.route('/coingecko-sol-memes-all', methods=['GET'])
+@cached_response('table3')
 def coingecko_sol_memes_api():
-    response = get_coingecko_sol_all_memes()
-    return jsonify(json.loads(response['body']))
+    return jsonify(get_coingecko_sol_all_memes())
 
 @app.route('/coingecko-memes-all', methods=['GET'])
+@cached_response('table4')
 def coingecko_memes_api():
-    response = get_coingecko_all_memes()
-    return jsonify(json.loads(response['body']))
+    return jsonify(get_coingecko_all_memes())
 
 @app.route('/coingecko-sol', methods=['GET'])
+@cached_response('table1', 'table2', external=True)
 def coingecko_sol_range():
     try:
         start_date = request.args.get('start_date')
@@ -141,6 +169,8 @@ def coingecko_sol_range():
         if not start_date or not end_date:
             return "start_date and end_date are required parameters.", 400
 
+        if wants_columnar(request.args):
+            return jsonify(get_market_cap_index_columnar(start_date, end_date, index_start, index_end, exclude_ids, "coingecko", base_indexed=False))
         market_cap_sums, whatever, participation, correlation_data = get_market_cap_sums_and_participation(start_date, end_date, index_start, index_end, exclude_ids, "coingecko")
         response = {
             'market_cap_sums': market_cap_sums,
@@ -153,6 +183,7 @@ def coingecko_sol_range():
         return str(e), 500
 
 @app.route('/coingecko-sol-memes', methods=['GET'])
+@cached_response('table1', 'table3', external=True)
 def coingecko_sol_memes_range():
     try:
         start_date = request.args.get('start_date')
@@ -165,6 +196,8 @@ def coingecko_sol_memes_range():
         if not start_date or not end_date:
             return "start_date and end_date are required parameters.", 400
 
+        if wants_columnar(request.args):
+            return jsonify(get_market_cap_index_columnar(start_date, end_date, index_start, index_end, exclude_ids, "coingecko-sol-memes", correlation_coin_ids))
         market_cap_sums, market_cap_sums_base_indexed, participation, correlation_data = get_market_cap_sums_and_participation(start_date, end_date, index_start, index_end, exclude_ids, "coingecko-sol-memes", correlation_coin_ids)
         response = {
             'market_cap_sums': market_cap_sums,
@@ -177,6 +210,7 @@ def coingecko_sol_memes_range():
         return str(e), 500
 
 @app.route('/coingecko-memes', methods=['GET'])
+@cached_response('table1', 'table4', external=True)
 def coingecko_memes_range():
     try:
         start_date = request.args.get('start_date')
@@ -189,6 +223,8 @@ def coingecko_memes_range():
         if not start_date or not end_date:
             return "start_date and end_date are required parameters.", 400
 
+        if wants_columnar(request.args):
+            return jsonify(get_market_cap_index_columnar(start_date, end_date, index_start, index_end, exclude_ids, "coingecko-memes", correlation_coin_ids))
         market_cap_sums, market_cap_sums_base_indexed, participation, correlation_data = get_market_cap_sums_and_participation(start_date, end_date, index_start, index_end, exclude_ids, "coingecko-memes", correlation_coin_ids)
         response = {
             'market_cap_sums': market_cap_sums,
@@ -202,6 +238,7 @@ def coingecko_memes_range():
 
 
 @app.route('/rsps', methods=['GET'])
+@cached_response('table1')
 def get_rsps_data():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
@@ -214,120 +251,139 @@ def get_rsps_data():
 
 @app.route('/new-secret-path', methods=['GET'])
 @token_required
+@cached_response('liquidity')
 def get_liquidity():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    conn = get_db_connection()
-    cursor = get_db_cursor(conn)
-
-    query = """
-        SELECT * FROM liquidity
-        WHERE (record_date BETWEEN %s AND %s) AND (record_index = %s)
-        ORDER BY record_date ASC
-    """
-    cursor.execute(query, (start_date, end_date, "TGA1"))
-    records = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
-
-    return jsonify(records)
+    return liquidity_response(start_date, end_date, "TGA1")
 
 @app.route('/tga1', methods=['GET'])
+@cached_response('liquidity')
 def get_liquidity_free():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    conn = get_db_connection()
-    cursor = get_db_cursor(conn)
-
-    query = """
-        SELECT * FROM liquidity
-        WHERE (record_date BETWEEN %s AND %s) AND (record_index = %s)
-        ORDER BY record_date ASC
-    """
-    cursor.execute(query, (start_date, end_date, "TGA1"))
-    records = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
-
-    return jsonify(records)
+    return liquidity_response(start_date, end_date, "TGA1")
 
 @app.route('/new-secret-path2', methods=['GET'])
 @token_required
+@cached_response('liquidity')
 def get_liquidity2():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    conn = get_db_connection()
-    cursor = get_db_cursor(conn)
-
-    query = """
-        SELECT * FROM liquidity
-        WHERE (record_date BETWEEN %s AND %s) AND (record_index = %s)
-        ORDER BY record_date ASC
-    """
-    cursor.execute(query, (start_date, end_date, "TGA2"))
-    records = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
-
-    return jsonify(records)
+    return liquidity_response(start_date, end_date, "TGA2")
 
 @app.route('/tga2', methods=['GET'])
+@cached_response('liquidity')
 def get_liquidity_free2():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
 
-    conn = get_db_connection()
-    cursor = get_db_cursor(conn)
-
-    query = """
-        SELECT * FROM liquidity
-        WHERE (record_date BETWEEN %s AND %s) AND (record_index = %s)
-        ORDER BY record_date ASC
-    """
-    cursor.execute(query, (start_date, end_date, "TGA2"))
-    records = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
-
-    return jsonify(records)
+    return liquidity_response(start_date, end_date, "TGA2")
 
 
 @app.route('/liquidity/correlation', methods=['POST'])
 def get_liquidity_correlation():
     data = request.get_json()
-    return jsonify(calculate_correlations(data.get("liquidity"), data.get("lag"), data.get("ma_length")))
+    columnar = wants_columnar(request.args) or data.get("format") == COLUMNAR_FORMAT
+    try:
+        return jsonify(calculate_correlations(data.get("liquidity"), data.get("lag"), data.get("ma_length"), columnar))
+    except PriceHistoryUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+
+@app.route('/liquidity/correlation-grid', methods=['POST'])
+def get_liquidity_correlation_grid():
+    data = request.get_json()
+    try:
+        lags = parse_grid_axis(data.get("lags"), "lags", MAX_GRID_LAGS)
+        ma_lengths = parse_grid_axis(data.get("ma_lengths"), "ma_lengths")
+        return jsonify(calculate_correlation_grid(data.get("liquidity"), lags, ma_lengths))
+    except (KeyError, TypeError, ValueError) as e:
+        return str(e), 400
+    except PriceHistoryUnavailable as e:
+        return jsonify({"error": str(e)}), 503
 
 
 @app.route('/jupiter-all', methods=['GET'])
+@cached_response('lst')
 def jupiter_all():
-    response = get_jupiter_all()
-    return jsonify(json.loads(response['body']))
+    return jsonify(get_jupiter_all())
 
 @app.route('/jupiter', methods=['GET'])
+@cached_response('lst2')
 def jupiter():
     ids = request.args.get('ids', '').split(',')
 
-    response = get_jupiter(ids)
-    return jsonify(json.loads(response['body']))
+    return jsonify(get_jupiter(ids, wants_columnar(request.args)))
 
 @app.route('/trw-guy-generate', methods=['GET'])
 def trw_guy_generate():
-    trw_guy_def()
-    return jsonify({})
+    return jsonify(jobs.submit(jobs.TRW_GUY_JOB, regenerate_plots)), 202
 
 @app.route('/add-data', methods=['POST'])
 def trw_guy_add_data():
     data = request.json
-    response = add_data(data)
-    trw_guy_def()
-    return response
+    response, status = add_data(data)
+    if status < 400:
+        # Several adds in a row are coalesced into one regeneration
+        jobs.submit(jobs.TRW_GUY_JOB, regenerate_plots)
+    return response, status
+
+@app.route('/trw-guy/model', methods=['GET'])
+@cached_response('price_data')
+def trw_guy_model():
+    return jsonify(model_summary())
+
+@app.route('/trw-guy/model/zscores', methods=['GET'])
+@cached_response('price_data')
+def trw_guy_model_zscores():
+    model = request.args.get('model', 'polynomial')
+    if model not in ZSCORE_MODELS:
+        return jsonify({"error": f"model must be one of {', '.join(ZSCORE_MODELS)}"}), 400
+    return jsonify(ZSCORE_MODELS[model](*fetch_price_data()))
+
+@app.route('/trw-guy/model/projection', methods=['GET'])
+@cached_response('price_data')
+def trw_guy_model_projection():
+    try:
+        gl_max = float(request.args.get('gl_max', PROJECTION_GL_MAX))
+        points = int(request.args.get('points', PROJECTION_POINTS))
+        return jsonify(projection(*fetch_price_data(), gl_max=gl_max, points=points))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/plots', methods=['GET'])
+def plot_urls():
+    manifest = read_manifest()
+    if manifest is None:
+        return jsonify({"error": "Plots have not been generated yet"}), 404
+    return jsonify({name: url_for('plot', name=name, v=version)
+                    for name, version in manifest["plots"].items()})
+
+@app.route('/plots/<name>.png', methods=['GET'])
+def plot(name):
+    manifest = read_manifest() or {"plots": {}}
+    version = manifest["plots"].get(name)
+    if version is not None and request.args.get('v') == version:
+        # The URL changes with the image, so this one can be kept indefinitely
+        response = send_from_directory(PLOTS_DIR, f'{name}.png', max_age=PLOT_IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+    return send_from_directory(PLOTS_DIR, f'{name}.png', max_age=0)
+
+@app.route('/jobs', methods=['GET'])
+def jobs_status():
+    return jsonify(jobs.get_status())
+
+@app.route('/jobs/<name>', methods=['GET'])
+def job_status(name):
+    status = jobs.get_status(name)
+    if status is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(status)
 
 @app.route('/delete-data', methods=['DELETE'])
 def trw_guy_delete_data():
@@ -0,0 +1,88 @@
+"""
+Benchmark the columnar response format against the default one.
+
+Builds the real /jupiter payload for every LST in db_backup/lst2.csv and
+compares payload size and build + encode time of the default record lists
+with ?format=columnar, whose blocks come straight from the analytics
+matrices. Checks that both carry the same values.
+
+Usage:
+    python benchmarks/bench_columnar.py
+"""
+import csv
+import math
+import os
+import sys
+import time
+from decimal import Decimal
+
+import orjson
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jupiter import get_jupiter_analytics
+from json_provider import dumps_bytes
+
+LST2_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_backup', 'lst2.csv')
+
+VALUE_KEYS = {
+    'price_data': 'price',
+    'base_indexed_data': 'indexed_price',
+    'cumulative_yield_data': 'cumulative_yield',
+}
+
+
+def load_rows():
+    with open(LST2_CSV, newline='') as f:
+        return [{'asset_name': row['asset_name'], 'price': Decimal(row['price']), 'timestamp': row['timestamp']}
+                for row in csv.DictReader(f)]
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def same_value(a, b):
+    if a is None or (isinstance(a, float) and math.isnan(a)):
+        return b is None
+    return math.isclose(a, b, rel_tol=1e-12)
+
+
+def check(records, columnar):
+    for section, value_key in VALUE_KEYS.items():
+        block = columnar[section]
+        positions = {date: i for i, date in enumerate(block['dates'])}
+        for name, rows in records[section].items():
+            values = block['series'][name]
+            # A date repeated within a series keeps its last value
+            latest = {row['timestamp']: row[value_key] for row in rows}
+            for date, value in latest.items():
+                assert same_value(value, values[positions[date]]), (section, name, date)
+
+
+def main():
+    rows = load_rows()
+    payload = get_jupiter_analytics(rows)
+    columnar_payload = get_jupiter_analytics(rows, columnar=True)
+
+    records_encode, records_bytes = best_of(lambda: dumps_bytes(payload))
+    columnar_encode, columnar_bytes = best_of(lambda: dumps_bytes(columnar_payload))
+    records_time, _ = best_of(lambda: dumps_bytes(get_jupiter_analytics(rows)))
+    columnar_time, _ = best_of(lambda: dumps_bytes(get_jupiter_analytics(rows, columnar=True)))
+
+    check(orjson.loads(records_bytes), orjson.loads(columnar_bytes))
+
+    print(f"/jupiter payload for {len(payload['price_data'])} LSTs")
+    print("              size     encode   build + encode")
+    print(f"records:  {len(records_bytes) / 1024:6.0f} KiB {records_encode * 1000:7.1f} ms {records_time * 1000:8.1f} ms")
+    print(f"columnar: {len(columnar_bytes) / 1024:6.0f} KiB {columnar_encode * 1000:7.1f} ms {columnar_time * 1000:8.1f} ms")
+    print(f"size:     {len(records_bytes) / len(columnar_bytes):6.1f}x smaller")
+
+
+if __name__ == '__main__':
+    main()
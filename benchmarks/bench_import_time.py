@@ -0,0 +1,78 @@
+"""
+Benchmark what a gunicorn worker pays to import the app.
+
+Imports app.py in fresh interpreters with -X importtime and reports the
+total import time, peak RSS and the slowest top-level imports. The eager
+case also imports trw_guy (matplotlib) and scipy.stats at start-up, as
+app.py and jupiter.py used to; the lazy case is what workers do now,
+leaving them to the first request that needs them. The app no longer uses
+scipy at all, so the eager case needs it installed separately.
+
+Usage:
+    python benchmarks/bench_import_time.py
+"""
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    "eager": "import app, trw_guy, scipy.stats",
+    "lazy": "import app",
+}
+HEAVY_MODULES = ("matplotlib", "scipy", "sklearn", "pandas")
+REPORT = (
+    "import resource, sys; "
+    "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss); "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def run(statement):
+    """
+    Returns:
+        tuple: (total import time in ms, peak RSS in MiB, loaded heavy modules,
+        {module imported by the statement or by app: cumulative import time in ms})
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"{statement}; {REPORT}"],
+                            cwd=APP_DIR, capture_output=True, text=True, check=True)
+
+    total = 0
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Nesting is shown as two more spaces of indent per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            total += int(cumulative) / 1000
+        if depth <= 1 and name.strip() != "app":
+            imports[name.strip()] = int(cumulative) / 1000
+
+    rss_kib, modules = result.stdout.splitlines()[-2:]
+    return total, int(rss_kib) / 1024, modules, imports
+
+
+def best_of(statement, repeat=5):
+    runs = [run(statement) for _ in range(repeat)]
+    return min(runs, key=lambda r: r[0])
+
+
+def main():
+    results = {name: best_of(statement) for name, statement in CASES.items()}
+
+    for name, (total, rss, modules, imports) in results.items():
+        print(f"{name}: {total:7.0f} ms import, {rss:6.1f} MiB peak RSS, loaded: {modules or '-'}")
+        for module, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:5]:
+            print(f"    {module:28s} {cumulative:7.1f} ms")
+
+    eager, lazy = results["eager"], results["lazy"]
+    print(f"saved per worker: {eager[0] - lazy[0]:.0f} ms, {eager[1] - lazy[1]:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark the /jupiter response serialization.
+
+Builds the real /jupiter payload for every LST in db_backup/lst2.csv and
+times the old Lambda-era path (json.dumps with decimal_default, json.loads
+in app.py, then jsonify with Flask's default provider) against a single
+orjson encode through json_provider. Checks that both decode to the same
+document.
+
+Usage:
+    python benchmarks/bench_json_serialization.py
+"""
+import csv
+import json
+import math
+import os
+import sys
+import time
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jupiter import get_jupiter_analytics
+from json_provider import dumps_bytes
+
+LST2_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_backup', 'lst2.csv')
+
+
+def load_rows():
+    with open(LST2_CSV, newline='') as f:
+        return [{'asset_name': row['asset_name'], 'price': Decimal(row['price']), 'timestamp': row['timestamp']}
+                for row in csv.DictReader(f)]
+
+
+def decimal_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError
+
+
+def legacy_encode(payload, provider):
+    # get_jupiter returned {'body': json.dumps(...)}, which app.py parsed and jsonify'd again
+    body = json.dumps(payload, default=decimal_default)
+    return provider.dumps(json.loads(body)).encode('utf-8')
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def without_nan(value):
+    # The old path emitted bare NaN tokens, orjson emits null
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {key: without_nan(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [without_nan(item) for item in value]
+    return value
+
+
+def main():
+    payload = get_jupiter_analytics(load_rows())
+    provider = DefaultJSONProvider(Flask(__name__))
+
+    legacy_time, legacy_bytes = best_of(lambda: legacy_encode(payload, provider))
+    orjson_time, orjson_bytes = best_of(lambda: dumps_bytes(payload))
+
+    assert without_nan(json.loads(legacy_bytes)) == json.loads(orjson_bytes)
+
+    print(f"/jupiter payload for {len(payload['price_data'])} LSTs: {len(orjson_bytes) / 1024:.0f} KiB")
+    print(f"dumps + loads + jsonify: {legacy_time * 1000:8.1f} ms")
+    print(f"orjson, once to bytes:   {orjson_time * 1000:8.1f} ms")
+    print(f"speedup:                 {legacy_time / orjson_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
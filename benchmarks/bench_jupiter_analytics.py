@@ -0,0 +1,173 @@
+"""
+Benchmark the /jupiter analytics.
+
+Builds the /jupiter payload for every LST in db_backup/lst2.csv with the
+old per-asset loops (dict lookups into the solana prices for every return,
+then list comprehensions and np.prod per statistic and rolling window)
+and with get_jupiter_analytics (one dates x assets price matrix, every
+statistic computed column-wise), and checks they agree.
+
+The old path needs scipy, which the app itself no longer uses.
+
+Usage:
+    python benchmarks/bench_jupiter_analytics.py
+"""
+import csv
+import math
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from scipy.stats import kurtosis, skew
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jupiter import format_decimal, get_jupiter_analytics
+
+LST2_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_backup', 'lst2.csv')
+
+
+def load_rows():
+    with open(LST2_CSV, newline='') as f:
+        return [{'asset_name': row['asset_name'], 'price': Decimal(row['price']), 'timestamp': row['timestamp']}
+                for row in csv.DictReader(f)]
+
+
+def legacy_analytics(results):
+    response = {}
+    price_data = {}
+
+    for row in results:
+        asset_name = row['asset_name']
+        price_info = {'price': float(row['price']), 'timestamp': row['timestamp']}
+        if asset_name not in response:
+            response[asset_name] = []
+        response[asset_name].append(price_info)
+        if asset_name not in price_data:
+            price_data[asset_name] = {}
+        price_data[asset_name][row['timestamp']] = float(row['price'])
+
+    common_dates = set.intersection(*(set(data.keys()) for data in price_data.values()))
+    first_common_date = (datetime.strptime(min(common_dates), "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+    daily_changes = {}
+    cumulative_yield_response = {}
+    for asset_name, prices in price_data.items():
+        sorted_dates = sorted(prices.keys())
+        daily_returns = []
+
+        for i in range(4, len(sorted_dates)):
+            current_date = sorted_dates[i]
+            previous_date = sorted_dates[i - 1]
+            if previous_date in prices and current_date in prices:
+                prev_price = prices[previous_date]
+                prev_price_sol = price_data["solana"][previous_date]
+                curr_price = prices[current_date]
+                curr_price_sol = price_data["solana"][current_date]
+                if prev_price > 0:
+                    daily_return = ((curr_price / curr_price_sol) / (prev_price / prev_price_sol)) - 1
+                    daily_returns.append(daily_return)
+
+        if daily_returns:
+            variance = np.var(daily_returns)
+            std_deviation = np.std(daily_returns)
+
+            rolling_apy = {}
+            for window in [30, 60, 90, 120]:
+                if len(daily_returns) >= window:
+                    cumulative_return = np.prod([(1 + r) for r in daily_returns[-window:]])
+                    rolling_apy[f"rolling_apy_{window}d"] = (cumulative_return ** (365 / window)) - 1
+                else:
+                    rolling_apy[f"rolling_apy_{window}d"] = None
+
+            cumulative_yield_value = 1
+            cumulative_yield_response[asset_name] = []
+            for i in range(0, len(sorted_dates)):
+                current_date = sorted_dates[i]
+                if current_date >= first_common_date:
+                    cumulative_yield_value *= (1 + daily_returns[i - 4])
+                    cumulative_yield_response[asset_name].append({
+                        'timestamp': current_date,
+                        'cumulative_yield': cumulative_yield_value - 1
+                    })
+
+            negative_returns = [r for r in daily_returns if r < 0]
+            average_daily_return = np.mean(daily_returns)
+            daily_changes[asset_name] = {
+                'average_daily_return': average_daily_return,
+                'apy': (1 + average_daily_return) ** 365 - 1,
+                'variance': variance,
+                'std_deviation': std_deviation,
+                'downside_volatility': np.std(negative_returns) if negative_returns else 0,
+                'rolling_apy_30d': rolling_apy.get('rolling_apy_30d', 0),
+                'rolling_apy_60d': rolling_apy.get('rolling_apy_60d', 0),
+                'rolling_apy_90d': rolling_apy.get('rolling_apy_90d', 0),
+                'rolling_apy_120d': rolling_apy.get('rolling_apy_120d', 0),
+                'skewness': format_decimal(skew(daily_returns)),
+                'kurtosis': format_decimal(kurtosis(daily_returns)),
+                'num_days': len(daily_returns)
+            }
+
+    base_indexed_response = {}
+    for asset_name, prices in price_data.items():
+        base_price = prices[first_common_date] if first_common_date in prices else None
+        base_indexed_response[asset_name] = []
+        for timestamp in sorted(prices.keys()):
+            if timestamp >= first_common_date:
+                indexed_price = (prices[timestamp] / base_price) * 100 if base_price else None
+                base_indexed_response[asset_name].append({
+                    'timestamp': timestamp,
+                    'indexed_price': indexed_price
+                })
+
+    return {
+        'price_data': response,
+        'base_indexed_data': base_indexed_response,
+        'cumulative_yield_data': cumulative_yield_response,
+        'daily_changes': daily_changes
+    }
+
+
+def assert_close(new, old, path='payload'):
+    if isinstance(old, dict):
+        assert list(new) == list(old), path
+        for key in old:
+            assert_close(new[key], old[key], f'{path}.{key}')
+    elif isinstance(old, list):
+        assert len(new) == len(old), path
+        for i, (new_item, old_item) in enumerate(zip(new, old)):
+            assert_close(new_item, old_item, f'{path}[{i}]')
+    elif isinstance(old, float) and not (old is None or math.isnan(old)):
+        assert math.isclose(new, old, rel_tol=1e-9, abs_tol=1e-15), f'{path}: {new} != {old}'
+    else:
+        assert new == old or (isinstance(new, float) and math.isnan(new) and math.isnan(old)), path
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    rows = load_rows()
+
+    legacy_time, legacy = best_of(lambda: legacy_analytics(rows))
+    vectorized_time, vectorized = best_of(lambda: get_jupiter_analytics(rows))
+
+    assert_close(vectorized, legacy)
+
+    print(f"{len(rows)} lst2 rows, {len(legacy['price_data'])} LSTs")
+    print(f"per-asset loops:     {legacy_time * 1000:8.1f} ms")
+    print(f"price matrix:        {vectorized_time * 1000:8.1f} ms")
+    print(f"speedup:             {legacy_time / vectorized_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
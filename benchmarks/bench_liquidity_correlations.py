@@ -0,0 +1,96 @@
+"""
+Regression check and benchmark for the /liquidity/correlation kernel.
+
+Runs the original O(n^2) expanding loop and the vectorized
+liquidity.calculate_correlations pipeline on the same synthetic ten-year
+BTC/ETH/SOL + liquidity history, asserts that every output point matches,
+and prints timings. Exits non-zero if the outputs diverge.
+
+Usage:
+    python benchmarks/bench_liquidity_correlations.py
+"""
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from liquidity import correlation_series, merge_price_and_liquidity
+
+N_DAYS = 3650
+CASES = [(0, 14), (7, 30), (30, 1), (0, 0)]
+
+
+def make_inputs(n_days=N_DAYS, seed=7):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2015-01-01', periods=n_days)
+
+    def walk(start, vol):
+        return start * np.exp(np.cumsum(rng.normal(0, vol, n_days)))
+
+    prices = pd.DataFrame({
+        "timestamp": dates,
+        "price_btc": walk(300, 0.03),
+        "price_eth": walk(1, 0.04),
+        "price_sol": walk(0.5, 0.05),
+    })
+
+    # Liquidity only on weekdays, like the TGA series
+    weekdays = dates.dayofweek < 5
+    liquidity = [list(row) for row in zip(dates[weekdays].strftime('%Y-%m-%d'), walk(6e6, 0.005)[:weekdays.sum()].tolist())]
+
+    return prices, liquidity
+
+
+def legacy_series(merged_df, lag, ma_length):
+    # The loop calculate_correlations used before the vectorized kernel
+    merged_df = merged_df.copy()
+    merged_df['price_btc'] = merged_df['price_btc'].shift(-lag)
+    merged_df['price_eth'] = merged_df['price_eth'].shift(-lag)
+    merged_df['price_sol'] = merged_df['price_sol'].shift(-lag)
+
+    cumulative = {"btc": [], "eth": [], "sol": []}
+    sma = {"btc": [], "eth": [], "sol": []}
+    for i in range(1, len(merged_df) + 1):
+        subset_df = merged_df.iloc[:i]
+        for coin in cumulative:
+            cumulative[coin].append(subset_df[f'price_{coin}'].corr(subset_df['price_liquidity']))
+            if len(cumulative[coin]) >= ma_length:
+                sma[coin].append(pd.Series(cumulative[coin][-ma_length:]).mean())
+            else:
+                sma[coin].append(pd.Series(cumulative[coin]).mean())
+
+    return {coin: (np.array(cumulative[coin]), np.array(sma[coin])) for coin in cumulative}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    merged_df = merge_price_and_liquidity(*make_inputs())
+    print(f"{len(merged_df)} aligned days")
+
+    for lag, ma_length in CASES:
+        with warnings.catch_warnings():
+            # Series.corr on a single row warns about degrees of freedom
+            warnings.simplefilter('ignore', RuntimeWarning)
+            legacy_time, expected = timed(lambda: legacy_series(merged_df, lag, ma_length))
+        vector_time, actual = timed(lambda: correlation_series(merged_df, lag, ma_length))
+
+        for coin in expected:
+            for expected_values, actual_values in zip(expected[coin], actual[coin]):
+                np.testing.assert_allclose(actual_values, expected_values, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+        print(f"lag={lag:<3} ma_length={ma_length:<3} legacy {legacy_time * 1000:9.1f} ms   "
+              f"vectorized {vector_time * 1000:7.2f} ms   speedup {legacy_time / vector_time:8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark the vectorized top-N market cap index against the per-day sort it replaced.
+
+Builds a synthetic 3,000-coin x 365-day index (with ~10% of observations
+missing), checks that both implementations agree, and prints timings.
+
+Usage:
+    python benchmarks/bench_market_cap_index.py
+"""
+import os
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from market_cap_index import build_market_cap_matrix, rank_index_band
+
+N_COINS = 3000
+N_DAYS = 365
+INDEX_START = 0
+INDEX_END = 99
+EXCLUDE_IDS = ['coin-0', 'coin-17', 'coin-256']
+
+
+def make_index(n_coins=N_COINS, n_days=N_DAYS, missing=0.1, seed=42):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=n_days)
+    names = np.array([f'coin-{i}' for i in range(n_coins)])
+
+    day_idx, coin_idx = np.meshgrid(np.arange(n_days), np.arange(n_coins), indexing='ij')
+    keep = rng.random(day_idx.size) > missing
+    day_idx, coin_idx = day_idx.ravel()[keep.ravel()], coin_idx.ravel()[keep.ravel()]
+
+    return pd.DataFrame({
+        'coin_name': names[coin_idx],
+        'market_cap': rng.lognormal(15, 2, day_idx.size),
+        'timestamp': dates[day_idx],
+    })
+
+
+def legacy_index(rows, index_start, index_end, exclude_ids):
+    # Per-day Python sort, as get_market_cap_sums_and_participation used to do
+    coins_by_date = defaultdict(list)
+    for coin in rows:
+        date_str = coin['timestamp'].strftime('%Y-%m-%d')
+        if coin['coin_name'] not in exclude_ids:
+            coins_by_date[date_str].append(coin)
+
+    market_cap_sums = {}
+    participation = defaultdict(int)
+    for date_str, coins in coins_by_date.items():
+        filtered_coins = sorted(coins, key=lambda x: x['market_cap'], reverse=True)
+        selected_coins = filtered_coins[index_start:index_end + 1]
+        market_cap_sums[date_str] = sum(coin['market_cap'] for coin in selected_coins)
+        for coin in selected_coins:
+            participation[coin['coin_name']] += 1
+
+    return market_cap_sums, dict(participation)
+
+
+def vectorized_index(frame, index_start, index_end, exclude_ids):
+    dates, coin_names, values = build_market_cap_matrix(frame)
+    band = rank_index_band(dates, coin_names, values, index_start, index_end, exclude_ids)
+    selected = band["participation"] > 0
+    return (dict(zip(band["dates"].tolist(), band["sums"].tolist())),
+            dict(zip(coin_names[selected].tolist(), band["participation"][selected].tolist())))
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    frame = make_index()
+    rows = frame.to_dict('records')
+    print(f"{N_COINS} coins x {N_DAYS} days ({len(frame):,} rows), band {INDEX_START}..{INDEX_END}")
+
+    legacy_time, (legacy_sums, legacy_participation) = best_of(
+        lambda: legacy_index(rows, INDEX_START, INDEX_END, EXCLUDE_IDS))
+    vector_time, (vector_sums, vector_participation) = best_of(
+        lambda: vectorized_index(frame, INDEX_START, INDEX_END, EXCLUDE_IDS))
+
+    assert legacy_sums.keys() == vector_sums.keys()
+    assert all(np.isclose(legacy_sums[d], vector_sums[d]) for d in legacy_sums)
+    assert legacy_participation == vector_participation
+
+    print(f"legacy per-day sort:  {legacy_time * 1000:9.1f} ms")
+    print(f"vectorized engine:    {vector_time * 1000:9.1f} ms")
+    print(f"speedup:              {legacy_time / vector_time:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
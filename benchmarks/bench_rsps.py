@@ -0,0 +1,196 @@
+"""
+Regression check and benchmark for the matrix-based RSPS engine.
+
+Runs the per-coin DataFrame loop get_rsps used before and
+rsps.compute_rsps on the same synthetic meme index (thousands of coins,
+some listed mid-period or missing days) with six benchmark series,
+asserts that both return the same coins and statistics, and prints
+timings. The old loop paired returns by position, so betas are checked
+against a per-coin date-joined pandas reference instead.
+
+Usage:
+    python benchmarks/bench_rsps.py
+"""
+import math
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rsps import BENCHMARKS, MIN_BETA_OVERLAP, compute_rsps
+
+N_COINS = 3000
+N_DAYS = 180
+MAX_MARKET_CAP = 5e9
+MIN_MARKET_CAP = 1e5
+RESULTS = 50
+EXCLUDED = ['meme-3', 'meme-10', 'meme-42']
+
+
+def make_inputs(n_coins=N_COINS, n_days=N_DAYS, seed=11):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=n_days)
+
+    frames = []
+    for coin in range(n_coins):
+        # A third of the coins list late, a tenth miss a few random days
+        listed = rng.integers(0, n_days // 2) if coin % 3 == 0 else 0
+        days = np.arange(listed, n_days)
+        if coin % 10 == 0:
+            days = np.sort(rng.choice(days, size=len(days) - 3, replace=False))
+        price = rng.lognormal(-4, 1) * np.exp(np.cumsum(rng.normal(0, 0.08, len(days))))
+        frames.append(pd.DataFrame({
+            'coin_name': f'meme-{coin}',
+            'market_cap': price * rng.lognormal(20, 1.5),
+            'price': price,
+            'timestamp': dates[days],
+        }))
+    coins = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    benchmarks = {}
+    for name in BENCHMARKS:
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, n_days)))
+        # Some benchmarks have gaps of their own
+        days = np.sort(rng.choice(n_days, size=n_days - 5, replace=False)) if name in ('others', 'eth') else np.arange(n_days)
+        benchmarks[name] = dict(zip(dates[days].strftime('%Y-%m-%d'), prices[days].tolist()))
+
+    return coins, benchmarks
+
+
+def legacy_rsps(coins_for_date_range, benchmark_prices, max_market_cap, min_market_cap, results, excluded):
+    # The per-coin loop get_rsps ran before the matrix engine
+    coin_dfs = {}
+    benchmark_dfs = {}
+    for name, raw in benchmark_prices.items():
+        df = pd.DataFrame([{"timestamp": x[0], "price": x[1]} for x in raw.items()], columns=["timestamp", "price"])
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df = df.sort_values(by='timestamp')
+        df['ROC'] = df['price'].pct_change() * 100
+        benchmark_dfs[name] = df
+
+    for coin_name, df in coins_for_date_range.groupby('coin_name', sort=False):
+        coin_dfs[coin_name] = {"coin_name": coin_name, "df": df}
+
+    market_cap_sum = coins_for_date_range.groupby(coins_for_date_range['timestamp'].dt.normalize())['market_cap'].sum()
+    df_market_cap_sum = market_cap_sum.rename_axis('timestamp').reset_index()
+
+    outside_cap = (coins_for_date_range['market_cap'] > float(max_market_cap)) | (coins_for_date_range['market_cap'] < float(min_market_cap))
+    for token in set(coins_for_date_range.loc[outside_cap, 'coin_name']):
+        if token in coin_dfs:
+            del coin_dfs[token]
+
+    df_market_cap_sum = df_market_cap_sum.sort_values(by='timestamp')
+    for i in coin_dfs:
+        coin_dfs[i]["df"] = coin_dfs[i]["df"].sort_values(by='timestamp')
+        coin_dfs[i]['df']['ROC'] = coin_dfs[i]['df']['price'].pct_change() * 100
+        coin_dfs[i]['mean'] = round(coin_dfs[i]['df']['ROC'].mean(skipna=True), 2)
+        coin_dfs[i]['std'] = round(coin_dfs[i]['df']['ROC'].astype(float).std(skipna=True), 2)
+
+    df_market_cap_sum['ROC'] = df_market_cap_sum['market_cap'].pct_change() * 100
+    index_mean = round(df_market_cap_sum['ROC'].mean(skipna=True), 2)
+    index_std = round(df_market_cap_sum['ROC'].astype(float).std(skipna=True), 2)
+
+    for i in coin_dfs:
+        coin_dfs[i]['relative_mean'] = round(((coin_dfs[i]['mean'] - index_mean) / abs(index_mean)) * 100, 2)
+        coin_dfs[i]['relative_volatility'] = round(coin_dfs[i]['std'] / index_std, 2)
+
+    coins_list = [coin_dfs[i] for i in coin_dfs]
+    sort_by_mean = sorted(coins_list, key=lambda x: x['relative_mean'], reverse=True)
+    sort_by_volatility = sorted(coins_list, key=lambda x: x['relative_volatility'], reverse=True)
+
+    summed_indices = {}
+    for idx, coin in enumerate(sort_by_mean):
+        if coin['coin_name'] not in excluded:
+            summed_indices[coin['coin_name']] = idx
+    for idx, coin in enumerate(sort_by_volatility):
+        if coin['coin_name'] not in excluded:
+            summed_indices[coin['coin_name']] = summed_indices.get(coin['coin_name'], 0) + idx
+
+    top_coins = [coin for coin, _ in sorted(summed_indices.items(), key=lambda x: x[1])[:results]]
+
+    list_to_return = []
+    for i in top_coins:
+        roc = coin_dfs[i]['df']['ROC'][1:]
+        for name, df in benchmark_dfs.items():
+            covariance = np.cov(roc, df['ROC'][1:])[0, 1] if len(roc) == len(df['ROC'][1:]) else 0
+            coin_dfs[i][f'beta_{name}'] = abs(round(covariance / np.var(df['ROC'][1:], ddof=1), 2))
+        del coin_dfs[i]["df"]
+        for j in coins_list:
+            if j["coin_name"] == i:
+                list_to_return.append(j)
+                break
+
+    for i in list_to_return:
+        for key in ("mean", "relative_mean", "relative_volatility", "std"):
+            if math.isnan(i[key]):
+                i[key] = "-"
+
+    return list_to_return
+
+
+def reference_betas(coins, benchmark_prices, coin_name):
+    # One coin at a time: join returns on date, drop unpaired days, sample covariance
+    rows = coins[coins['coin_name'] == coin_name].sort_values('timestamp')
+    coin_returns = pd.Series(rows['price'].to_numpy(), index=rows['timestamp'].dt.normalize()).pct_change() * 100
+
+    betas = {}
+    for name, prices in benchmark_prices.items():
+        benchmark = pd.Series(prices)
+        benchmark.index = pd.to_datetime(benchmark.index)
+        joined = pd.concat([coin_returns, benchmark.sort_index().pct_change() * 100], axis=1, join='inner').dropna()
+        if len(joined) < MIN_BETA_OVERLAP:
+            betas[f'beta_{name}'] = "-"
+        else:
+            betas[f'beta_{name}'] = abs(round(joined.iloc[:, 0].cov(joined.iloc[:, 1]) / joined.iloc[:, 1].var(), 2))
+    return betas
+
+
+def benchmark_frame(benchmark_prices):
+    # The dates x benchmarks frame rsps.fetch_benchmark_prices builds from one query
+    prices = pd.DataFrame({name: pd.Series(raw, dtype='float64') for name, raw in benchmark_prices.items()})
+    prices.index = pd.to_datetime(prices.index)
+    return prices.sort_index()
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    coins, benchmarks = make_inputs()
+    args = (MAX_MARKET_CAP, MIN_MARKET_CAP, RESULTS, EXCLUDED)
+    print(f"{N_COINS} coins x {N_DAYS} days ({len(coins):,} rows), top {RESULTS}")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        legacy_time, expected = best_of(lambda: legacy_rsps(coins, benchmarks, *args), repeat=1)
+    engine_time, actual = best_of(lambda: compute_rsps(coins, benchmark_frame(benchmarks), *args))
+
+    assert [coin['coin_name'] for coin in expected] == [coin['coin_name'] for coin in actual]
+    for legacy_coin, engine_coin in zip(expected, actual):
+        legacy_coin.update(reference_betas(coins, benchmarks, legacy_coin['coin_name']))
+        assert legacy_coin.keys() == engine_coin.keys()
+        for key, value in legacy_coin.items():
+            if isinstance(value, float):
+                # Summation order may move a value across a rounding boundary
+                assert abs(value - engine_coin[key]) <= 0.01 + 1e-9, (legacy_coin['coin_name'], key, value, engine_coin[key])
+            else:
+                assert value == engine_coin[key]
+
+    print(f"legacy per-coin loop: {legacy_time * 1000:9.1f} ms")
+    print(f"matrix engine:        {engine_time * 1000:9.1f} ms")
+    print(f"speedup:              {legacy_time / engine_time:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
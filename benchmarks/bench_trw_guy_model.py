@@ -0,0 +1,121 @@
+"""
+Benchmark the "Better Model" predictions used by the trw_guy charts.
+
+Runs the old path (the GL -> gold and gold -> BTC LinearRegression models
+refit for each of the three charts, then predict_bitcoin_price called per
+point: 100 grid points, 1,000 logspaced points and one per row from 2018)
+against trw_guy_model (each fit once in closed form, predictions as one
+array expression) on db_backup/price_data.csv, and checks they agree.
+
+Also times a full refit of the model state against appending one row to
+it, for histories of increasing length.
+
+The old path needs scikit-learn, which the app itself no longer uses.
+
+Usage:
+    python benchmarks/bench_trw_guy_model.py
+"""
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.linear_model import LinearRegression
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trw_guy_model import append_rows, build_state, fit_models, predict_bitcoin_price, to_models
+
+PRICE_DATA_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_backup', 'price_data.csv')
+
+
+def load_data():
+    with open(PRICE_DATA_CSV, newline='') as f:
+        rows = list(csv.DictReader(f))
+    global_liquidity = np.array([float(row['global_liquidity']) for row in rows])
+    bitcoin_prices = np.array([float(row['bitcoin_price']) for row in rows])
+    gold_prices = np.array([float(row['gold_price']) for row in rows])
+    return global_liquidity, bitcoin_prices, gold_prices
+
+
+def legacy_fit(x, y):
+    model = LinearRegression()
+    model.fit(x.reshape(-1, 1), y)
+    return model
+
+
+def legacy_predict(gl_value, model_gl, model_log):
+    log_gold_pred = model_gl.predict([[np.log(gl_value)]])[0]
+    log_bitcoin_pred = model_log.predict([[log_gold_pred]])[0]
+    return np.exp(log_bitcoin_pred), np.exp(log_gold_pred)
+
+
+def legacy_predictions(global_liquidity, bitcoin_prices, gold_prices):
+    results = []
+
+    # michael_howell_better_model and btc_vs_gl_better_model each fit their own models
+    for gl_values in (np.linspace(global_liquidity.min(), 350, 100),
+                      np.logspace(np.log10(global_liquidity.min()), np.log10(350), 1000)):
+        model_log = legacy_fit(np.log(gold_prices[241:]), np.log(bitcoin_prices[241:]))
+        model_gl = legacy_fit(np.log(global_liquidity), np.log(gold_prices))
+        results.append(np.array([legacy_predict(gl, model_gl, model_log)[0] for gl in gl_values]))
+
+    # zscore_btc_prices_valuation
+    mask = (bitcoin_prices[192:] > 0) & (gold_prices[192:] > 0) & (global_liquidity[192:] > 0)
+    model_gl = legacy_fit(np.log(global_liquidity[192:][mask]), np.log(gold_prices[192:][mask]))
+    model_log = legacy_fit(np.log(gold_prices[241:]), np.log(bitcoin_prices[241:]))
+    results.append(np.array([legacy_predict(gl, model_gl, model_log)[0] for gl in global_liquidity[192:][mask]]))
+    return results
+
+
+def vectorized_predictions(global_liquidity, bitcoin_prices, gold_prices):
+    models = fit_models(range(len(global_liquidity)), global_liquidity, bitcoin_prices, gold_prices)
+    mask = (bitcoin_prices[192:] > 0) & (gold_prices[192:] > 0) & (global_liquidity[192:] > 0)
+    grids = (np.linspace(global_liquidity.min(), 350, 100),
+             np.logspace(np.log10(global_liquidity.min()), np.log10(350), 1000))
+
+    results = [predict_bitcoin_price(gl_values, models["gold_gl"], models["bitcoin_gold"])[0] for gl_values in grids]
+    results.append(predict_bitcoin_price(global_liquidity[192:][mask], models["gold_gl_2018"], models["bitcoin_gold"])[0])
+    return results
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    data = load_data()
+
+    legacy_time, legacy = best_of(lambda: legacy_predictions(*data))
+    vectorized_time, vectorized = best_of(lambda: vectorized_predictions(*data))
+
+    for old, new in zip(legacy, vectorized):
+        np.testing.assert_allclose(new, old, rtol=1e-9)
+
+    points = sum(len(values) for values in legacy)
+    print(f"{len(data[0])} price_data rows, {points} predicted points")
+    print(f"sklearn, per point:     {legacy_time * 1000:8.2f} ms")
+    print(f"closed form, vectorized: {vectorized_time * 1000:7.2f} ms")
+    print(f"speedup:                {legacy_time / vectorized_time:8.0f}x")
+
+    # Longer histories: the weekly rows repeated, dates are only counted
+    print("rows      full refit   append one row")
+    for repeat in (1, 10, 100):
+        columns = [np.tile(values, repeat) for values in data]
+        dates = range(len(columns[0]))
+        refit_time, _ = best_of(lambda: to_models(build_state(dates, *columns)))
+        state = build_state(dates[:-1], *(values[:-1] for values in columns))
+        append_time, _ = best_of(lambda: to_models(append_rows(
+            {**state, "fits": {name: dict(stats) for name, stats in state["fits"].items()}},
+            dates[-1:], *(values[-1:] for values in columns))), repeat=20)
+        print(f"{len(dates):6d} {refit_time * 1000:10.2f} ms {append_time * 1000:10.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
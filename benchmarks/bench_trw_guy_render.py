@@ -0,0 +1,81 @@
+"""
+Benchmark sequential vs parallel rendering of the trw_guy charts.
+
+Renders the five charts from db_backup/price_data.csv into temporary
+directories, once in this process one after another (the default) and once
+on the process pool enabled by TRW_GUY_RENDER_WORKERS, and checks that both
+produce the same PNGs. The pool is capped at the usable CPUs, so with one
+CPU both runs render in-process.
+
+Usage:
+    python benchmarks/bench_trw_guy_render.py
+"""
+import csv
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from plots import PLOT_NAMES
+from trw_guy import render_chart, render_charts, usable_cpus
+from trw_guy_model import fit_models
+
+PRICE_DATA_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db_backup', 'price_data.csv')
+
+
+def load_data():
+    with open(PRICE_DATA_CSV, newline='') as f:
+        rows = list(csv.DictReader(f))
+    dates = [datetime.date.fromisoformat(row['date']) for row in rows]
+    global_liquidity = np.array([float(row['global_liquidity']) for row in rows])
+    bitcoin_prices = np.array([float(row['bitcoin_price']) for row in rows])
+    gold_prices = np.array([float(row['gold_price']) for row in rows])
+    return dates, global_liquidity, bitcoin_prices, gold_prices
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def read_plots(plots_dir):
+    plots = {}
+    for name in PLOT_NAMES:
+        with open(os.path.join(plots_dir, f'{name}.png'), 'rb') as f:
+            plots[name] = f.read()
+    return plots
+
+
+def main():
+    data = load_data()
+    models = fit_models(*data)
+
+    with tempfile.TemporaryDirectory() as sequential_dir, tempfile.TemporaryDirectory() as parallel_dir:
+        chart_times = {name: best_of(lambda: render_chart(name, data, models, sequential_dir))[0] for name in PLOT_NAMES}
+        sequential_time, _ = best_of(lambda: render_charts(data, models, sequential_dir, workers=1))
+        # The first run also starts the pool, which later runs reuse
+        render_charts(data, models, parallel_dir, workers=len(PLOT_NAMES))
+        parallel_time, _ = best_of(lambda: render_charts(data, models, parallel_dir, workers=len(PLOT_NAMES)))
+
+        assert read_plots(sequential_dir) == read_plots(parallel_dir)
+
+    print(f"{len(data[0])} price_data rows, {usable_cpus()} usable CPUs")
+    for name, chart_time in chart_times.items():
+        print(f"  {name:30s} {chart_time * 1000:8.1f} ms")
+    print(f"sequential:  {sequential_time * 1000:8.1f} ms")
+    print(f"parallel:    {parallel_time * 1000:8.1f} ms")
+    print(f"speedup:     {sequential_time / parallel_time:8.1f}x")
+    print(f"slowest chart bounds the parallel time at {max(chart_times.values()) * 1000:.1f} ms with one CPU per chart")
+
+
+if __name__ == '__main__':
+    main()
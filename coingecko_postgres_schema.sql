@@ -11,6 +11,18 @@
 -- - Removed MySQL-specific engine and charset specifications
 -- - Converted unique key constraints to PostgreSQL format
 
+--
+-- Table structure for table coingecko_price_history
+--
+
+DROP TABLE IF EXISTS coingecko_price_history CASCADE;
+CREATE TABLE coingecko_price_history (
+    coin VARCHAR(32) NOT NULL,
+    date DATE NOT NULL,
+    price DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (coin, date)
+);
+
 --
 -- Table structure for table liquidity
 --
@@ -1,16 +1,22 @@
-from database import get_db_connection, get_db_cursor
-from collections import defaultdict
+import math
+
+from database import db_session, fetch_frame
 from decimal import Decimal
 from datetime import datetime
 
 import pandas as pd
 
-from correlations import find_rolling_correlation
+from columnar import series_dicts_to_columnar, to_columnar
+from correlations import MISSING_CORRELATION, align_series, rolling_correlations, to_datetime_index
+from market_cap_index import build_market_cap_matrix, rank_index_band
 from prices import get_price_chart
 from tlx import fetch_tlx_time_series
 from toros import fetch_toros_time_series
 
 
+CORRELATION_WINDOWS = [15, 30, 60, 90, 120]
+
+
 def decimal_default(obj):
     if isinstance(obj, Decimal):
         return float(obj)
@@ -20,8 +26,8 @@ def decimal_default(obj):
 def base_index_timeseries(timeseries):
     df = pd.DataFrame(list(timeseries.items()), columns=['timestamp', 'value'])
 
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values(by='timestamp')
+    df['timestamp'] = to_datetime_index(df['timestamp'])
+    df = df.sort_values(by='timestamp', kind='stable')
 
     df['value'] = (df['value'] / df['value'].iloc[0]) * 100
     df['timestamp'] = df['timestamp'].dt.strftime("%Y-%m-%d")
@@ -33,82 +39,75 @@ def base_index_timeseries(timeseries):
 # Database connection function is now imported from database.py
 
 
-def fetch_coins_for_date_range(start_date, end_date, index_name):
-    cnx = get_db_connection()
-    cursor = get_db_cursor(cnx)
-
+def fetch_coins_for_date_range(start_date, end_date, index_name, cursor=None):
     query = ("""
-        SELECT * FROM table1
+        SELECT coin_name, market_cap, timestamp FROM table1
         WHERE timestamp >= %s AND timestamp <= %s AND index_name = %s AND market_cap IS NOT NULL
     """)
-    cursor.execute(query, (start_date + " 00:00:00", end_date + " 23:59:59", index_name))
+    return fetch_frame(query, (start_date + " 00:00:00", end_date + " 23:59:59", index_name),
+                       dtype={'coin_name': str, 'market_cap': 'float64'}, parse_dates=['timestamp'],
+                       cursor=cursor)
 
-    items = cursor.fetchall()
-    cursor.close()
-    cnx.close()
 
-    return items
+def fetch_index_data(start_date, end_date, index_name):
+    """
+    Load the index rows and the coin icons for an index in one pooled session.
+    """
+    table_name = "table2" if index_name == "coingecko" else ("table3" if index_name == "coingecko-sol-memes" else "table4")
 
+    with db_session() as cursor:
+        coins_for_date_range = fetch_coins_for_date_range(start_date, end_date, index_name, cursor=cursor)
+        cursor.execute("SELECT id, image FROM " + table_name)
+        coin_icons = {row['id']: row['image'] for row in cursor.fetchall()}
 
-def get_participation_percentages(start_date, end_date, index_start, index_end, exclude_ids, index_name):
-    table_name = "table2" if index_name == "coingecko" else ("table3" if index_name == "coingecko-sol-memes" else "table4")
-    coins_for_date_range = fetch_coins_for_date_range(start_date, end_date, index_name)
+    return coins_for_date_range, coin_icons
 
-    coins_by_date = defaultdict(list)
-    for coin in coins_for_date_range:
-        date_str = coin['timestamp'].strftime('%Y-%m-%d')
-        if coin['coin_name'] not in exclude_ids:
-            coins_by_date[date_str].append(coin)
 
-    total_days = len(coins_by_date)
-    coin_participation = defaultdict(int)
+def base_index_values(values):
+    # base_index_timeseries for values already sorted by date
+    return (values / values[0]) * 100 if len(values) else values
 
-    for date_str, coins in coins_by_date.items():
-        filtered_coins = sorted(coins, key=lambda x: x['market_cap'], reverse=True)
-        selected_coins = filtered_coins[index_start:index_end + 1]
-        for coin in selected_coins:
-            coin_participation[coin['coin_name']] += 1
 
-    participation_percentages = {coin: round((count / total_days) * 100, 2) for coin, count in coin_participation.items()}
+def select_index_constituents(coins, index_start, index_end, exclude_ids):
+    """
+    Rank coins by market cap per day and keep positions index_start..index_end.
+
+    Returns the dates and daily market cap sums of the selection as arrays,
+    how many days each coin was selected, and the number of days that had
+    any eligible coin.
+    """
+    dates, coin_names, values = build_market_cap_matrix(coins)
+    band = rank_index_band(dates, coin_names, values, index_start, index_end, exclude_ids)
 
-    # Fetch icons for the coins
-    cnx = get_db_connection()
-    cursor = get_db_cursor(cnx)
-    cursor.execute("SELECT id, image FROM " + table_name)
-    coin_icons = {row['id']: row['image'] for row in cursor.fetchall()}
-    cursor.close()
-    cnx.close()
+    selected = band["participation"] > 0
+    participation = dict(zip(coin_names[selected].tolist(), band["participation"][selected].tolist()))
+
+    return band["dates"], band["sums"], participation, len(band["dates"])
+
+
+def get_participation_percentages(coin_participation, total_days, coin_icons):
+    participation_percentages = {coin: round((count / total_days) * 100, 2) for coin, count in coin_participation.items()}
 
     participation_with_icons = [{"coin": coin, "percentage": participation_percentages[coin], "days_participated": coin_participation[coin], "icon": coin_icons.get(coin)} for coin in sorted(participation_percentages, key=participation_percentages.get, reverse=True)]
 
     return participation_with_icons
 
 
-def get_market_cap_sums_and_participation(start_date, end_date, index_start, index_end, exclude_ids, index_name, correlation_coin_ids=None):
+def build_index(start_date, end_date, index_start, index_end, exclude_ids, index_name, correlation_coin_ids=None):
+    """
+    Compute an index's daily market cap sums, participation and correlations.
+
+    Returns:
+        dict: dates, market_cap_sums and market_cap_sums_base_indexed (arrays aligned with dates),
+        the participation list and correlation_data per correlation coin
+    """
     if correlation_coin_ids is None:
         correlation_coin_ids = []
-    coins_for_date_range = fetch_coins_for_date_range(start_date, end_date, index_name)
-
-    coins_by_date = defaultdict(list)
-    for coin in coins_for_date_range:
-        date_str = coin['timestamp'].strftime('%Y-%m-%d')
-        if coin['coin_name'] not in exclude_ids:
-            coins_by_date[date_str].append(coin)
-
-    market_cap_sums = {}
-    participation = defaultdict(int)
+    coins_for_date_range, coin_icons = fetch_index_data(start_date, end_date, index_name)
 
-    for date_str, coins in coins_by_date.items():
-        filtered_coins = sorted(coins, key=lambda x: x['market_cap'], reverse=True)
-        selected_coins = filtered_coins[index_start:index_end + 1]
-        market_cap_sum = sum(coin['market_cap'] for coin in selected_coins)
-        market_cap_sums[date_str] = market_cap_sum
+    dates, market_cap_sums, participation, total_days = select_index_constituents(coins_for_date_range, index_start, index_end, exclude_ids)
 
-        for coin in selected_coins:
-            participation[coin['coin_name']] += 1
-
-    market_cap_sums_base_indexed = base_index_timeseries(market_cap_sums)
-    participation_percentages = get_participation_percentages(start_date, end_date, index_start, index_end, exclude_ids, index_name)
+    participation_percentages = get_participation_percentages(participation, total_days, coin_icons)
 
     correlation_data = dict()
 
@@ -126,27 +125,69 @@ def get_market_cap_sums_and_participation(start_date, end_date, index_start, ind
                 "data": get_price_chart(start_date, end_date, correlation_coin)
             }
 
+    # The correlation series come from outside as {date: value} dicts, so the index is joined with them as one too
+    market_cap_series = dict(zip(dates.tolist(), market_cap_sums.tolist())) if correlation_data else {}
+
     for item in correlation_data:
         data_values = correlation_data[item]["data"]
         data_values_base_indexed = base_index_timeseries(correlation_data[item]["data"])
+        _, index_values, coin_values = align_series(market_cap_series, data_values)
+        correlations = rolling_correlations(index_values, coin_values, CORRELATION_WINDOWS)
+
         correlation_data[item] = {
             "data": data_values,
             "base_indexed_data": data_values_base_indexed,
-            "correlation15": find_rolling_correlation(market_cap_sums, data_values, 15),
-            "correlation15_base_indexed": find_rolling_correlation(market_cap_sums_base_indexed,
-                                                                   data_values_base_indexed, 15),
-            "correlation30": find_rolling_correlation(market_cap_sums, data_values, 30),
-            "correlation30_base_indexed": find_rolling_correlation(market_cap_sums_base_indexed,
-                                                                   data_values_base_indexed, 30),
-            "correlation60": find_rolling_correlation(market_cap_sums, data_values, 60),
-            "correlation60_base_indexed": find_rolling_correlation(market_cap_sums_base_indexed,
-                                                                   data_values_base_indexed, 60),
-            "correlation90": find_rolling_correlation(market_cap_sums, data_values, 90),
-            "correlation90_base_indexed": find_rolling_correlation(market_cap_sums_base_indexed,
-                                                                   data_values_base_indexed, 90),
-            "correlation120": find_rolling_correlation(market_cap_sums, data_values, 120),
-            "correlation120_base_indexed": find_rolling_correlation(market_cap_sums_base_indexed,
-                                                                    data_values_base_indexed, 120),
         }
+        for window in CORRELATION_WINDOWS:
+            correlation = correlations[window] if not math.isnan(correlations[window]) else MISSING_CORRELATION
+            # Pearson correlation is scale-invariant, so base indexing both series leaves it unchanged
+            correlation_data[item][f"correlation{window}"] = correlation
+            correlation_data[item][f"correlation{window}_base_indexed"] = correlation
+
+    return {
+        "dates": dates,
+        "market_cap_sums": market_cap_sums,
+        "market_cap_sums_base_indexed": base_index_values(market_cap_sums),
+        "participation": participation_percentages,
+        "correlation_data": correlation_data,
+    }
+
+
+def get_market_cap_sums_and_participation(start_date, end_date, index_start, index_end, exclude_ids, index_name, correlation_coin_ids=None):
+    index = build_index(start_date, end_date, index_start, index_end, exclude_ids, index_name, correlation_coin_ids)
+
+    dates = index["dates"].tolist()
+    market_cap_sums = dict(zip(dates, index["market_cap_sums"].tolist()))
+    market_cap_sums_base_indexed = dict(zip(dates, index["market_cap_sums_base_indexed"].tolist()))
+
+    return market_cap_sums, market_cap_sums_base_indexed, index["participation"], index["correlation_data"]
+
+
+def get_market_cap_index_columnar(start_date, end_date, index_start, index_end, exclude_ids, index_name, correlation_coin_ids=None, base_indexed=True):
+    """
+    Columnar form of the /coingecko-* range responses.
+
+    The index series are written straight from the arrays of build_index; the
+    correlation coins' own series arrive as dicts and are aligned on their dates.
+
+    Args:
+        base_indexed: Also include market_cap_sums_base_indexed
+    """
+    index = build_index(start_date, end_date, index_start, index_end, exclude_ids, index_name, correlation_coin_ids)
+
+    series = {"market_cap_sums": index["market_cap_sums"]}
+    if base_indexed:
+        series["market_cap_sums_base_indexed"] = index["market_cap_sums_base_indexed"]
+
+    columnar_correlations = {}
+    for coin, data in index["correlation_data"].items():
+        columnar_correlations[coin] = series_dicts_to_columnar({
+            "data": data["data"],
+            "base_indexed_data": data["base_indexed_data"],
+        })
+        columnar_correlations[coin].update({key: value for key, value in data.items() if key not in ("data", "base_indexed_data")})
 
-    return market_cap_sums, market_cap_sums_base_indexed, participation_percentages, correlation_data
+    response = to_columnar(index["dates"], series)
+    response["participation"] = index["participation"]
+    response["correlation_data"] = columnar_correlations
+    return response
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Opt-in with ?format=columnar on the time-series routes
+COLUMNAR_FORMAT = "columnar"
+
+
+def wants_columnar(args):
+    return args.get('format') == COLUMNAR_FORMAT
+
+
+def format_dates(dates):
+    """
+    'YYYY-MM-DD' strings for an array of dates (datetime64 or already formatted strings).
+    """
+    dates = np.asarray(dates)
+    if np.issubdtype(dates.dtype, np.datetime64):
+        return np.datetime_as_string(dates, unit='D').tolist()
+    return dates.tolist()
+
+
+def _column(values):
+    values = np.asarray(values)
+    # The JSON provider writes numeric arrays directly (NaN as null); anything else goes out as a list
+    if values.dtype.kind in 'fiub':
+        return np.ascontiguousarray(values)
+    return values.tolist()
+
+
+def to_columnar(dates, series):
+    """
+    Build a {"dates": [...], "series": {name: [...]}} block from aligned arrays.
+
+    Args:
+        dates: Array of dates, one per row
+        series: name -> array of values aligned with dates
+    """
+    return {
+        "dates": format_dates(dates),
+        "series": {name: _column(values) for name, values in series.items()},
+    }
+
+
+def _align(series):
+    # series: name -> (dates, values); dates missing from a series come out as NaN
+    dates = sorted(set().union(*(series_dates for series_dates, _ in series.values())))
+    positions = {date: i for i, date in enumerate(dates)}
+
+    columns = {}
+    for name, (series_dates, values) in series.items():
+        column = np.full(len(dates), np.nan)
+        index = np.fromiter((positions[date] for date in series_dates), dtype=np.intp, count=len(series_dates))
+        # Later values win when a date repeats; None becomes NaN
+        column[index] = np.array(values, dtype='float64')
+        columns[name] = column
+
+    return to_columnar(dates, columns)
+
+
+def series_dicts_to_columnar(series):
+    """
+    Columnar block from {name: {date: value}} series, aligned on the sorted union of their dates.
+    """
+    return _align({name: (list(values), list(values.values())) for name, values in series.items()})
+
+
+def frame_to_columnar(frame, date_column):
+    """
+    Columnar block from a DataFrame, one series per column other than date_column.
+    """
+    return to_columnar(frame[date_column].to_numpy(),
+                       {name: frame[name].to_numpy() for name in frame.columns if name != date_column})
@@ -0,0 +1,129 @@
+import gzip
+import os
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Responses smaller than this are sent as they are
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+# Per worker process budget for compressed bodies of responses that carry an ETag
+COMPRESSED_CACHE_MAX_BYTES = int(os.getenv('COMPRESSED_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Levels picked for speed: most of the size reduction at a fraction of the CPU of the maximum levels
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'image/svg+xml',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/plain',
+}
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+def _zstd(data):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+# Preferred first when the client accepts several with the same quality
+ENCODERS = OrderedDict(
+    [(name, encoder) for name, encoder, module in (
+        ('zstd', _zstd, zstandard),
+        ('br', _brotli, brotli),
+        ('gzip', _gzip, gzip),
+    ) if module is not None]
+)
+
+_compressed = OrderedDict()
+_compressed_size = 0
+_lock = threading.Lock()
+
+
+def etag_variants(etag):
+    """
+    Every ETag a representation of the response with this ETag can carry.
+    """
+    return [etag] + [f"{etag}-{encoding}" for encoding in ENCODERS]
+
+
+def negotiate_encoding():
+    return request.accept_encodings.best_match(list(ENCODERS))
+
+
+def _cached_compress(etag, encoding, data):
+    global _compressed_size
+    key = (etag, encoding)
+    with _lock:
+        body = _compressed.get(key)
+        if body is not None:
+            _compressed.move_to_end(key)
+            return body
+
+    body = ENCODERS[encoding](data)
+    with _lock:
+        if key not in _compressed:
+            _compressed[key] = body
+            _compressed_size += len(body)
+        while _compressed and _compressed_size > COMPRESSED_CACHE_MAX_BYTES:
+            _, evicted = _compressed.popitem(last=False)
+            _compressed_size -= len(evicted)
+    return body
+
+
+def compress_response(response):
+    """
+    after_request hook: compress the body with the best encoding the client accepts.
+
+    Responses with an ETag get a per-encoding ETag ("<etag>-gzip") and their
+    compressed bytes are kept, keyed by that ETag, so repeat hits are not
+    compressed again.
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    if etag is not None:
+        body = _cached_compress(etag, encoding, data)
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    else:
+        body = ENCODERS[encoding](data)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,25 +1,147 @@
-import pandas as pd
 import math
 
+import numpy as np
+import pandas as pd
+
+
+# Returned in place of a correlation that cannot be computed (too few points, flat series)
+MISSING_CORRELATION = 2
+
+
+def to_datetime_index(keys):
+    """
+    Parse date keys ("YYYY-MM-DD", "YYYY-MM-DD HH:MM:SS", ISO "T" timestamps) into a naive DatetimeIndex.
+
+    A timezone offset is dropped, keeping the local wall time.
+    """
+    index = pd.to_datetime(pd.Index(list(keys), dtype=object), format='ISO8601')
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index
+
+
+def _daily_series(data):
+    # One value per calendar day: sorted by full timestamp, the latest value of a day wins
+    series = pd.Series(list(data.values()), index=to_datetime_index(data.keys()), dtype='float64')
+    series = series.sort_index(kind='stable')
+    series.index = series.index.normalize()
+    return series[~series.index.duplicated(keep='last')]
+
+
+def align_series(data1, data2_raw):
+    """
+    Inner-join two {date: value} series on their calendar day and sort by date.
+
+    Keys are normalized to the day as in base_index_timeseries, so a time part
+    (" HH:MM:SS" or ISO "THH:MM:SS") does not stop rows from matching, and the
+    base-indexed series join on exactly the same rows.
+
+    Returns:
+        tuple: (dates, values of data1, values of data2) as NumPy arrays
+    """
+    joined = pd.concat([_daily_series(data1), _daily_series(data2_raw)], axis=1, join='inner').sort_index()
+    return joined.index.to_numpy(), joined.iloc[:, 0].to_numpy(), joined.iloc[:, 1].to_numpy()
 
-def find_rolling_correlation(data1, data2_raw, window):
-    for i in data1:
-        data1[i] = float(data1[i])
 
-    data2 = {}
-    for i in data2_raw:
-        data2[i.split(" ")[0]] = data2_raw[i]
+def rolling_correlations(x, y, windows, full=False):
+    """
+    Rolling Pearson correlation of two aligned series for several windows at once.
 
-    df1 = pd.DataFrame(list(data1.items()), columns=['date', 'market_cap'])
-    df1['date'] = pd.to_datetime(df1['date'])
-    df1.set_index('date', inplace=True)
+    All windows are read off the same running sums, so each one costs O(n).
+    A window containing a missing value, or a flat series, yields NaN.
 
-    df2 = pd.DataFrame(list(data2.items()), columns=['date', 'price'])
-    df2['date'] = pd.to_datetime(df2['date'])
-    df2.set_index('date', inplace=True)
+    Args:
+        x, y: Aligned 1-D arrays of equal length
+        windows: Window lengths (in observations)
+        full: If True, return the whole rolling series per window instead of
+              only the most recent value
 
-    data = df1.merge(df2, left_index=True, right_index=True)
+    Returns:
+        dict: window -> last correlation (float) or full series (ndarray)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~(np.isnan(x) | np.isnan(y))
 
-    data['rolling_correlation'] = data['market_cap'].rolling(window).corr(data['price'])
+    # Center before accumulating so the running sums stay well conditioned
+    if valid.any():
+        x = x - x[valid].mean()
+        y = y - y[valid].mean()
+    x = np.where(valid, x, 0.0)
+    y = np.where(valid, y, 0.0)
+
+    def running(values):
+        return np.concatenate(([0.0], np.cumsum(values)))
+
+    sums = {
+        'n': running(valid.astype(np.float64)),
+        'x': running(x),
+        'y': running(y),
+        'xx': running(x * x),
+        'yy': running(y * y),
+        'xy': running(x * y),
+    }
+
+    results = {}
+    for window in windows:
+        series = np.full(len(x), np.nan)
+        if 0 < window <= len(x):
+            window_sum = {key: total[window:] - total[:-window] for key, total in sums.items()}
+            cov = window_sum['xy'] - window_sum['x'] * window_sum['y'] / window
+            var_x = window_sum['xx'] - window_sum['x'] ** 2 / window
+            var_y = window_sum['yy'] - window_sum['y'] ** 2 / window
+            denominator = np.sqrt(np.clip(var_x, 0, None) * np.clip(var_y, 0, None))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                corr = np.clip(cov / denominator, -1.0, 1.0)
+            corr[(window_sum['n'] < window) | (denominator <= 0)] = np.nan
+            series[window - 1:] = corr
+
+        if full:
+            results[window] = series
+        else:
+            results[window] = float(series[-1]) if len(series) else math.nan
+
+    return results
+
+
+def expanding_correlation(x, y):
+    """
+    Expanding-window Pearson correlation of two aligned series in O(n).
+
+    Element i equals x[:i + 1].corr(y[:i + 1]) in pandas: only rows where
+    both values are present are used, and fewer than two usable points or
+    a flat prefix yields NaN. x and y may be 2-D, in which case every row
+    is treated as a separate series (the last axis is time) and the two
+    arrays are broadcast against each other.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    x, y = np.broadcast_arrays(x, y)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    if x.shape[-1] == 0:
+        return np.full(x.shape, np.nan)
+
+    # Center each series on its first usable point so early prefixes keep their precision
+    first = np.expand_dims(np.argmax(valid, axis=-1), -1)
+    x = np.where(valid, x - np.take_along_axis(x, first, axis=-1), 0.0)
+    y = np.where(valid, y - np.take_along_axis(y, first, axis=-1), 0.0)
+
+    n = np.cumsum(valid, axis=-1)
+    sum_x = np.cumsum(x, axis=-1)
+    sum_y = np.cumsum(y, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = np.cumsum(x * y, axis=-1) - sum_x * sum_y / n
+        var_x = np.cumsum(x * x, axis=-1) - sum_x ** 2 / n
+        var_y = np.cumsum(y * y, axis=-1) - sum_y ** 2 / n
+        denominator = np.sqrt(np.clip(var_x, 0, None) * np.clip(var_y, 0, None))
+        corr = np.clip(cov / denominator, -1.0, 1.0)
+
+    corr[(n < 2) | ~(denominator > 0)] = np.nan
+    return corr
+
+
+def find_rolling_correlation(data1, data2_raw, window):
+    _, x, y = align_series(data1, data2_raw)
+    value = rolling_correlations(x, y, [window])[window]
 
-    return data['rolling_correlation'].iloc[-1] if not math.isnan(data['rolling_correlation'].iloc[-1]) else 2
+    return value if not math.isnan(value) else MISSING_CORRELATION
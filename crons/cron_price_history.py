@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from price_history import refresh_price_history
+
+
+written = refresh_price_history()
+for coin, rows in written.items():
+    print(f"{coin}: {rows} rows written to coingecko_price_history")
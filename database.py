@@ -1,6 +1,11 @@
+import io
 import os
+import threading
+from contextlib import contextmanager
+
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -15,6 +20,22 @@ DB_CONFIG = {
     'port': os.getenv('DB_PORT', '5432')
 }
 
+# Connection pool sizing (per process; each gunicorn worker gets its own pool)
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pool_stats = {
+    # Mirrors the pool's own idle list and checked-out connections; only changed under _pool_lock
+    'idle': 0,
+    'in_use': 0,
+    'checkouts': 0,
+    'connections_discarded': 0,
+    'health_check_failures': 0,
+}
+
 def get_db_connection():
     """
     Get a PostgreSQL database connection using environment variables.
@@ -50,7 +71,7 @@ def get_db_cursor(connection=None, dict_cursor=True):
 
 def execute_query(query, params=None, fetch_one=False, fetch_all=True, dict_cursor=True):
     """
-    Execute a database query with automatic connection management.
+    Execute a database query using a pooled connection.
     
     Args:
         query: SQL query string
@@ -62,32 +83,212 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=True, dict_curs
     Returns:
         Query results or None
     """
-    connection = None
-    cursor = None
     try:
-        connection = get_db_connection()
+        with db_session(dict_cursor=dict_cursor) as cursor:
+            cursor.execute(query, params)
+
+            if fetch_one:
+                return cursor.fetchone()
+            elif fetch_all:
+                return cursor.fetchall()
+            else:
+                return cursor.rowcount
+    except psycopg2.Error as e:
+        print(f"Database query error: {e}")
+        raise
+
+def _get_pool():
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    The pool is keyed on the current PID: a pool inherited through fork()
+    (e.g. gunicorn with preload_app) shares sockets with the parent, so the
+    child drops its reference and builds a fresh one instead.
+    """
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = psycopg2.pool.ThreadedConnectionPool(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, **DB_CONFIG)
+            _pool_pid = pid
+            # The pool opens its minimum number of connections up front
+            _pool_stats['idle'] = DB_POOL_MIN_SIZE
+            _pool_stats['in_use'] = 0
+        return _pool
+
+def _is_healthy(connection):
+    """
+    Check that a pooled connection is still usable before handing it out.
+    """
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        connection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _getconn(pool):
+    with _pool_lock:
+        connection = pool.getconn()
+        # The pool hands out an idle connection whenever it has one and opens a new one otherwise
+        if _pool_stats['idle'] > 0:
+            _pool_stats['idle'] -= 1
+        _pool_stats['in_use'] += 1
+    return connection
+
+def _putconn(pool, connection, close=False):
+    with _pool_lock:
+        pool.putconn(connection, close=close)
+        _pool_stats['in_use'] -= 1
+        # Connections beyond the pool's minimum are closed rather than kept idle
+        if not connection.closed:
+            _pool_stats['idle'] += 1
+
+def _checkout():
+    """
+    Borrow a connection that answers a health check.
+
+    After a database restart every idle connection is dead, so unhealthy ones
+    are discarded until a live one turns up. The pool never holds more than
+    DB_POOL_MAX_SIZE connections, so by then it has opened a fresh one.
+
+    Returns:
+        tuple: (pool, connection)
+    """
+    pool = _get_pool()
+    for _ in range(DB_POOL_MAX_SIZE + 1):
+        connection = _getconn(pool)
+        if _is_healthy(connection):
+            with _pool_lock:
+                _pool_stats['checkouts'] += 1
+            return pool, connection
+
+        with _pool_lock:
+            _pool_stats['health_check_failures'] += 1
+            _pool_stats['connections_discarded'] += 1
+        _putconn(pool, connection, close=True)
+
+    raise psycopg2.OperationalError('No healthy database connection available')
+
+@contextmanager
+def db_session(dict_cursor=True, commit=True):
+    """
+    Borrow a pooled connection for the duration of a with-block.
+
+    Usage:
+        with db_session() as cursor:
+            cursor.execute("SELECT ...")
+            rows = cursor.fetchall()
+
+    The transaction is committed when the block exits cleanly (unless
+    commit=False) and rolled back on error; the connection is then returned
+    to the pool. Connections left in a broken state are closed instead.
+
+    Args:
+        dict_cursor: If True, yields a RealDictCursor
+        commit: If True, commit on successful exit
+
+    Yields:
+        psycopg2.cursor: Database cursor bound to the borrowed connection
+    """
+    pool, connection = _checkout()
+    discard = False
+    try:
         cursor = get_db_cursor(connection, dict_cursor)
-        
-        cursor.execute(query, params)
-        
-        if fetch_one:
-            return cursor.fetchone()
-        elif fetch_all:
-            return cursor.fetchall()
-        else:
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+        if commit:
             connection.commit()
-            return cursor.rowcount
-            
-    except psycopg2.Error as e:
-        if connection:
+        else:
             connection.rollback()
-        print(f"Database query error: {e}")
+    except Exception:
+        try:
+            connection.rollback()
+        except psycopg2.Error:
+            discard = True
         raise
     finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+        discard = discard or bool(connection.closed)
+        if discard:
+            with _pool_lock:
+                _pool_stats['connections_discarded'] += 1
+        _putconn(pool, connection, close=discard)
+
+def fetch_frame(query, params=None, dtype=None, parse_dates=None, cursor=None):
+    """
+    Run a SELECT through COPY ... TO STDOUT and load the result as a DataFrame.
+
+    The rows are streamed from the server as CSV and parsed by pandas in one
+    pass, so no per-row Python dicts, Decimals or datetimes are built. Only
+    the columns named in the query are transferred.
+
+    Args:
+        query: SELECT statement (may contain %s placeholders)
+        params: Query parameters (optional)
+        dtype: Column dtypes passed to pandas.read_csv (optional)
+        parse_dates: Columns to parse as datetimes (optional)
+        cursor: Existing cursor to reuse; a pooled session is used otherwise
+
+    Returns:
+        pandas.DataFrame: One column per selected field
+    """
+    import pandas as pd
+
+    buffer = io.BytesIO()
+    if cursor is None:
+        with db_session(dict_cursor=False) as session_cursor:
+            _copy_to_buffer(session_cursor, query, params, buffer)
+    else:
+        _copy_to_buffer(cursor, query, params, buffer)
+
+    buffer.seek(0)
+    return pd.read_csv(buffer, dtype=dtype, parse_dates=parse_dates)
+
+def _copy_to_buffer(cursor, query, params, buffer):
+    # COPY does not accept bind parameters, so they are inlined with mogrify
+    select = cursor.mogrify(query, params).decode('utf-8')
+    cursor.copy_expert(f"COPY ({select.strip().rstrip(';')}) TO STDOUT WITH CSV HEADER", buffer)
+
+def get_pool_stats():
+    """
+    Return a snapshot of the connection pool counters for this process.
+
+    Returns:
+        dict: Pool configuration, current idle/in-use counts and lifetime counters
+    """
+    with _pool_lock:
+        stats = dict(_pool_stats)
+        if _pool is None or _pool_pid != os.getpid():
+            # No pool in this process yet (counts inherited through fork() are the parent's)
+            stats.update({'idle': 0, 'in_use': 0})
+        stats.update({
+            'pid': os.getpid(),
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+        })
+    return stats
+
+def close_pool():
+    """
+    Close every connection held by this process's pool.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
+        _pool_stats['idle'] = 0
+        _pool_stats['in_use'] = 0
 
 def test_connection():
     """
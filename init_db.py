@@ -5,6 +5,7 @@ This script:
 1. Creates the 'tlx' database if it doesn't exist
 2. Runs the schema creation script
 3. Imports data from CSV files in db_backup folder
+4. Applies the scripts in migrations/, also on an already initialized database
 """
 
 import os
@@ -127,6 +128,34 @@ def run_schema_script():
         cursor.close()
         conn.close()
 
+def run_migrations():
+    """Apply every migrations/*.sql script in order; each one is idempotent"""
+    migrations_folder = '/app/migrations'
+
+    if not os.path.exists(migrations_folder):
+        logger.warning(f"Migrations folder not found: {migrations_folder}")
+        return True
+
+    conn = get_tlx_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        for migration in sorted(name for name in os.listdir(migrations_folder) if name.endswith('.sql')):
+            logger.info(f"Applying migration {migration}...")
+            with open(os.path.join(migrations_folder, migration), 'r') as f:
+                cursor.execute(f.read())
+            conn.commit()
+        logger.info("Migrations applied successfully")
+        return True
+
+    except psycopg2.Error as e:
+        logger.error(f"Error applying migrations: {e}")
+        conn.rollback()
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
 def import_csv_data():
     """Import data from CSV files"""
     csv_folder = '/app/db_backup'
@@ -257,8 +286,8 @@ def main():
     
     # Check if initialization is needed
     if not check_initialization_needed():
-        logger.info("Database initialization not needed - exiting")
-        return True
+        logger.info("Database initialization not needed - applying migrations only")
+        return run_migrations()
     
     try:
         # Step 1: Create database
@@ -273,6 +302,11 @@ def main():
         if not import_csv_data():
             logger.error("CSV import failed")
             return False
+
+        # Step 4: Apply migrations
+        if not run_migrations():
+            logger.error("Migrations failed")
+            return False
         
         logger.info("Database initialization completed successfully!")
         return True
@@ -0,0 +1,200 @@
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from plots import PLOTS_DIR, file_lock
+
+# Name of the job that regenerates the trw_guy plots
+TRW_GUY_JOB = "trw_guy"
+
+# Job state and lock files live next to what the jobs write (the plot manifest), so every
+# gunicorn worker of a pod sees the same state. Pods do not share static/plots; each one
+# renders and reports its own.
+JOBS_DIR = os.getenv('JOBS_DIR', PLOTS_DIR)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _new_job():
+    return {
+        "state": "idle",
+        "rerun": False,
+        "requested": 0,
+        "coalesced": 0,
+        "runs": 0,
+        "failures": 0,
+        "last_requested_at": None,
+        "last_started_at": None,
+        "last_finished_at": None,
+        "last_duration": None,
+        "last_error": None,
+        # Worker that queued or is running the job
+        "pid": None,
+    }
+
+
+def _get_executor():
+    global _executor
+    # Created on first use so it is never inherited across a gunicorn fork.
+    # One thread: jobs run one at a time, and matplotlib is not thread-safe.
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+        return _executor
+
+
+def _path(name, suffix):
+    return os.path.join(JOBS_DIR, f'{name}.job.{suffix}')
+
+
+def _read_job(name):
+    try:
+        with open(_path(name, 'json')) as f:
+            return {**_new_job(), **json.load(f)}
+    except (OSError, ValueError):
+        return _new_job()
+
+
+def _write_job(name, job):
+    path = _path(name, 'json')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _recover(name, job):
+    """
+    Reset a job whose worker died while it was queued or running (e.g. recycled by gunicorn).
+
+    A running job holds the run lock for as long as it runs; the OS releases it with the process.
+    """
+    if job["state"] == "running":
+        with file_lock(_path(name, 'run'), blocking=False) as acquired:
+            dead = acquired
+    elif job["state"] == "queued":
+        dead = job["pid"] is None or not _pid_alive(job["pid"])
+    else:
+        dead = False
+
+    if dead:
+        print(f"Background job {name} was {job['state']} in worker {job['pid']}, which is gone")
+        job["state"] = "idle"
+        job["rerun"] = False
+    return job
+
+
+def _run(name, fn):
+    # Held while fn runs, so no other worker of this pod writes the same files meanwhile
+    with file_lock(_path(name, 'run')):
+        with file_lock(_path(name, 'lock')):
+            job = _read_job(name)
+            job["state"] = "running"
+            job["pid"] = os.getpid()
+            job["last_started_at"] = time.time()
+            _write_job(name, job)
+
+        error = None
+        try:
+            fn()
+        except Exception as e:
+            print(f"Error in background job {name}: {e}")
+            error = str(e)
+
+        with file_lock(_path(name, 'lock')):
+            job = _read_job(name)
+            job["runs"] += 1
+            job["last_finished_at"] = time.time()
+            job["last_duration"] = round(job["last_finished_at"] - job["last_started_at"], 3)
+            job["last_error"] = error
+            if error is not None:
+                job["failures"] += 1
+
+            if job["rerun"]:
+                # Requested while running: go once more so the newest data is picked up
+                job["rerun"] = False
+                job["state"] = "queued"
+                _get_executor().submit(_run, name, fn)
+            else:
+                job["state"] = "idle"
+            _write_job(name, job)
+
+
+def submit(name, fn):
+    """
+    Queue fn to run in the background under the given job name.
+
+    Requests for a job that is already queued are coalesced into that run.
+    A request for a job that is running schedules exactly one more run after
+    it, however many requests arrive in the meantime. This holds across the
+    gunicorn workers of a pod: the state is kept in JOBS_DIR, and the run is
+    queued in the worker that received the first request.
+
+    Args:
+        name: Job name; one queued run per name at a time
+        fn: Callable taking no arguments
+
+    Returns:
+        dict: Status of the job after the request (see get_status)
+    """
+    with file_lock(_path(name, 'lock')):
+        job = _recover(name, _read_job(name))
+        job["requested"] += 1
+        job["last_requested_at"] = time.time()
+
+        if job["state"] == "queued" or (job["state"] == "running" and job["rerun"]):
+            job["coalesced"] += 1
+        elif job["state"] == "running":
+            job["rerun"] = True
+        else:
+            job["state"] = "queued"
+            job["pid"] = os.getpid()
+            _get_executor().submit(_run, name, fn)
+
+        _write_job(name, job)
+        return _status(name, job)
+
+
+def _status(name, job):
+    status = {key: value for key, value in job.items() if key != "rerun"}
+    status["name"] = name
+    status["rerun_queued"] = job["rerun"]
+    status["host"] = socket.gethostname()
+    return status
+
+
+def get_status(name=None):
+    """
+    Status of one job, or of every job requested on this pod.
+
+    Read from the shared state in JOBS_DIR, so every worker of the pod
+    reports the same thing.
+
+    Returns:
+        dict: The job's status (None if it was never requested), or name -> status
+    """
+    if name is not None:
+        if not os.path.exists(_path(name, 'json')):
+            return None
+        with file_lock(_path(name, 'lock')):
+            return _status(name, _recover(name, _read_job(name)))
+
+    try:
+        names = sorted(filename[:-len('.job.json')] for filename in os.listdir(JOBS_DIR) if filename.endswith('.job.json'))
+    except OSError:
+        names = []
+    return {job_name: get_status(job_name) for job_name in names}
@@ -0,0 +1,48 @@
+from datetime import date
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import JSONProvider
+from werkzeug.http import http_date
+
+# Sorted keys and HTTP dates keep the output identical to Flask's default provider;
+# NumPy arrays and scalars are encoded natively, and NaN / infinity become null
+ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS
+    | orjson.OPT_NON_STR_KEYS
+    | orjson.OPT_SERIALIZE_NUMPY
+    | orjson.OPT_PASSTHROUGH_DATETIME
+)
+
+
+def orjson_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, date):
+        return http_date(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    return orjson.dumps(obj, default=orjson_default, option=ORJSON_OPTIONS)
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    Flask JSON provider that encodes responses once, straight to bytes, with orjson.
+
+    Installed in app.py with `app.json = OrjsonProvider(app)`, so jsonify()
+    and routes returning dicts or lists both go through it.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype='application/json')
@@ -1,21 +1,14 @@
-import json
+import bisect
 import math
 
-from database import get_db_connection, get_db_cursor
-from decimal import Decimal
+from columnar import to_columnar
+from database import db_session
 from datetime import datetime, timedelta
 import numpy as np
-from scipy.stats import skew, kurtosis
 
 # Database configuration is now handled by database.py
 
 
-def decimal_default(obj):
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
-
-
 def format_decimal(value):
     if value is None or math.isnan(value):
         return 0
@@ -23,14 +16,9 @@ def format_decimal(value):
 
 
 def fetch_all_coins():
-    cnx = get_db_connection()
-    cursor = get_db_cursor(cnx)
-
-    cursor.execute('SELECT * FROM lst WHERE coingeckoId != ""')
-    items = cursor.fetchall()
-
-    cursor.close()
-    cnx.close()
+    with db_session() as cursor:
+        cursor.execute('SELECT * FROM lst WHERE coingeckoId != %s', ('',))
+        items = cursor.fetchall()
 
     return items
 
@@ -42,17 +30,10 @@ def get_jupiter_all():
     # Order the items by the "order" field
     items_sorted = sorted(items, key=lambda x: x['name'])
 
-    # Return the items
-    response = {
-        'body': json.dumps(items_sorted, default=decimal_default)
-    }
-    return response
-
+    return items_sorted
 
-def get_jupiter(asset_names):
-    cnx = get_db_connection()
-    cursor = get_db_cursor(cnx)
 
+def get_jupiter(asset_names, columnar=False):
     # Prepare the SQL query to fetch prices for the specified assets
     query = '''
         SELECT asset_name, price, timestamp 
@@ -64,133 +45,241 @@ def get_jupiter(asset_names):
     query = query % format_strings
 
     # Execute the query with the asset names
-    cursor.execute(query, tuple(asset_names))
-    results = cursor.fetchall()
+    with db_session() as cursor:
+        cursor.execute(query, tuple(asset_names))
+        results = cursor.fetchall()
+
+    return get_jupiter_analytics(results, columnar)
+
+
+# Returns are only counted from each asset's fifth price on
+SKIPPED_RETURNS = 4
+ROLLING_APY_WINDOWS = [30, 60, 90, 120]
+
+
+def _price_matrix(price_data):
+    """
+    Pivot {asset: {timestamp: price}} into a dates x assets matrix.
+
+    Returns:
+        tuple: (sorted timestamps, float matrix with NaN where an asset has no price)
+    """
+    dates = sorted(set().union(*price_data.values()))
+    positions = {date: i for i, date in enumerate(dates)}
+
+    prices = np.full((len(dates), len(price_data)), np.nan)
+    for column, asset_prices in enumerate(price_data.values()):
+        rows = np.fromiter((positions[date] for date in asset_prices), dtype=np.intp, count=len(asset_prices))
+        prices[rows, column] = np.fromiter(asset_prices.values(), dtype='float64', count=len(asset_prices))
+    return dates, prices
+
+
+def _sol_relative_returns(prices, sol_column):
+    """
+    Daily returns of every asset against SOL, between each price and the asset's previous one.
+
+    Args:
+        prices: Dates x assets matrix from _price_matrix
+        sol_column: Column of solana in prices
+
+    Returns:
+        tuple: (simple returns, log returns, mask of the returns that count, position of each
+        row within its asset's own dates)
+    """
+    observed = ~np.isnan(prices)
+    position = np.cumsum(observed, axis=0) - 1
+
+    # Row of each asset's previous price, skipping the dates it has none
+    rows = np.where(observed, np.arange(len(prices))[:, None], -1)
+    previous = np.maximum.accumulate(np.vstack([np.full((1, prices.shape[1]), -1), rows[:-1]]), axis=0)
+    has_previous = previous >= 0
+    previous = np.maximum(previous, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = prices / prices[:, [sol_column]]
+        previous_relative = np.take_along_axis(relative, previous, axis=0)
+        returns = (relative / previous_relative) - 1
+        log_relative = np.log(relative)
+        log_returns = log_relative - np.take_along_axis(log_relative, previous, axis=0)
+
+    # SOL must be priced on both dates too, or the return is NaN
+    sol_observed = np.broadcast_to(observed[:, [sol_column]], prices.shape)
+    counted = (observed & has_previous & (position >= SKIPPED_RETURNS)
+               & (np.take_along_axis(prices, previous, axis=0) > 0)
+               & sol_observed & np.take_along_axis(sol_observed, previous, axis=0))
+    return returns, log_returns, counted, position
+
+
+def _right_align(values, mask):
+    """
+    Move each column's masked values to the bottom rows, in order, with NaN above them.
+    """
+    order = np.argsort(mask, axis=0, kind='stable')
+    return np.take_along_axis(np.where(mask, values, np.nan), order, axis=0)
+
+
+def _column_mean(values, counts):
+    # NaN-padded columns; an empty column comes out as NaN
+    return np.nansum(values, axis=0) / counts
+
+
+def _return_statistics(returns, log_returns, counted):
+    """
+    Per-asset statistics of the counted returns, each an array with one value per column.
+    """
+    num_days = counted.sum(axis=0)
+    aligned = _right_align(returns, counted)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = _column_mean(aligned, num_days)
+        deviation = aligned - mean
+        m2 = _column_mean(deviation ** 2, num_days)
+        m3 = _column_mean(deviation ** 3, num_days)
+        m4 = _column_mean(deviation ** 4, num_days)
+        # Biased moments, as scipy.stats.skew/kurtosis (Fisher); NaN when the returns are constant
+        constant = m2 <= (np.finfo(m2.dtype).resolution * mean) ** 2
+        skewness = np.where(constant, np.nan, m3 / m2 ** 1.5)
+        kurt = np.where(constant, np.nan, m4 / m2 ** 2 - 3)
+
+        negative = np.where(aligned < 0, aligned, np.nan)
+        num_negative = (aligned < 0).sum(axis=0)
+        downside_volatility = np.sqrt(_column_mean((negative - _column_mean(negative, num_negative)) ** 2, num_negative))
+        downside_volatility[num_negative == 0] = 0
+
+    # Rolling APYs from the cumulative sums of each asset's last log returns
+    log_sums = np.vstack([np.zeros((1, aligned.shape[1])),
+                          np.cumsum(np.nan_to_num(_right_align(log_returns, counted)), axis=0)])
+    rolling_apy = {}
+    for window in ROLLING_APY_WINDOWS:
+        values = np.full(aligned.shape[1], np.nan)
+        if window < len(log_sums):
+            values = np.expm1((log_sums[-1] - log_sums[-1 - window]) * (365 / window))
+        rolling_apy[window] = [value if days >= window else None for value, days in zip(values, num_days)]
+
+    return {
+        'average_daily_return': mean,
+        'apy': (1 + mean) ** 365 - 1,
+        'variance': m2,
+        'std_deviation': np.sqrt(m2),
+        'downside_volatility': downside_volatility,
+        'rolling_apy': rolling_apy,
+        'skewness': skewness,
+        'kurtosis': kurt,
+        'num_days': num_days,
+    }
+
+
+def get_jupiter_analytics(results, columnar=False):
+    """
+    Build the /jupiter payload from lst2 rows (asset_name, price, timestamp).
 
-    cursor.close()
-    cnx.close()
+    Prices are pivoted into a dates x assets matrix so the SOL-relative returns
+    and their statistics are computed for every asset at once.
 
+    Args:
+        results: lst2 rows
+        columnar: If True, price_data, base_indexed_data and cumulative_yield_data are
+                  {dates, series} blocks taken straight from the matrices instead of
+                  per-asset lists of {timestamp, value} records
+    """
     # Structure the response
     response = {}
     price_data = {}
 
     for row in results:
         asset_name = row['asset_name']
-        price_info = {'price': float(row['price']), 'timestamp': row['timestamp']}
+        price = float(row['price'])
 
-        # Add price info to the asset's list
-        if asset_name not in response:
-            response[asset_name] = []
-        response[asset_name].append(price_info)
-
-        # Keep track of all price data for base indexing
         if asset_name not in price_data:
             price_data[asset_name] = {}
-        price_data[asset_name][row['timestamp']] = float(row['price'])
+            response[asset_name] = []
+        # Keep track of all price data for base indexing
+        price_data[asset_name][row['timestamp']] = price
+        # Add price info to the asset's list
+        if not columnar:
+            response[asset_name].append({'price': price, 'timestamp': row['timestamp']})
 
     # Find the first common date across all assets
     common_dates = set.intersection(*(set(data.keys()) for data in price_data.values()))
     first_common_date = (datetime.strptime(min(common_dates), "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
 
-    # Calculate daily percentage change for each asset
+    assets = list(price_data)
+    dates, prices = _price_matrix(price_data)
+    returns, log_returns, counted, position = _sol_relative_returns(prices, assets.index('solana'))
+    stats = _return_statistics(returns, log_returns, counted)
+    has_returns = stats['num_days'] > 0
+
+    # Cumulative yield and base indexed prices from the first common date on, NaN where an asset has no price
+    start = bisect.bisect_left(dates, first_common_date)
+    dates_from_start = np.array(dates[start:], dtype=object)
+    observed = ~np.isnan(prices[start:])
+
+    cumulative_yield = np.full(observed.shape, np.nan)
+    for column in np.flatnonzero(has_returns):
+        rows = np.flatnonzero(observed[:, column])
+        # One return per date from the asset's SKIPPED_RETURNS-th on; those not counted add no growth
+        eligible = ~np.isnan(prices[:, column]) & (position[:, column] >= SKIPPED_RETURNS)
+        daily_returns = np.where(counted[:, column], returns[:, column], 0.0)[eligible]
+        # Each date takes the return SKIPPED_RETURNS places before its own position among the
+        # asset's dates; an asset with fewer earlier dates wraps to the end of its returns, as before
+        growth = 1 + daily_returns[position[start + rows, column] - SKIPPED_RETURNS]
+        cumulative_yield[rows, column] = np.cumprod(growth) - 1
+
+    base_prices = prices[start] if start < len(dates) and dates[start] == first_common_date else np.full(len(assets), np.nan)
+    has_base = ~np.isnan(base_prices) & (base_prices != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        indexed_prices = np.where(has_base, (prices[start:] / base_prices) * 100, np.nan)
+
     daily_changes = {}
+    for column in np.flatnonzero(has_returns):
+        daily_changes[assets[column]] = {
+            'average_daily_return': stats['average_daily_return'][column],
+            'apy': stats['apy'][column],
+            'variance': stats['variance'][column],
+            'std_deviation': stats['std_deviation'][column],
+            'downside_volatility': stats['downside_volatility'][column],
+            'rolling_apy_30d': stats['rolling_apy'][30][column],
+            'rolling_apy_60d': stats['rolling_apy'][60][column],
+            'rolling_apy_90d': stats['rolling_apy'][90][column],
+            'rolling_apy_120d': stats['rolling_apy'][120][column],
+            'skewness': format_decimal(stats['skewness'][column]),
+            'kurtosis': format_decimal(stats['kurtosis'][column]),
+            'num_days': int(stats['num_days'][column])
+        }
+
+    if columnar:
+        yield_rows = observed[:, has_returns].any(axis=1)
+        return {
+            'price_data': to_columnar(dates, dict(zip(assets, np.ascontiguousarray(prices.T)))),
+            'base_indexed_data': to_columnar(dates_from_start, dict(zip(assets, np.ascontiguousarray(indexed_prices.T)))),
+            'cumulative_yield_data': to_columnar(dates_from_start[yield_rows], dict(zip(
+                (assets[column] for column in np.flatnonzero(has_returns)),
+                np.ascontiguousarray(cumulative_yield[yield_rows][:, has_returns].T)))),
+            'daily_changes': daily_changes,
+        }
+
     cumulative_yield_response = {}
-    for asset_name, prices in price_data.items():
-        sorted_dates = sorted(prices.keys())
-        daily_returns = []
-
-        for i in range(4, len(sorted_dates)):
-            current_date = sorted_dates[i]
-            previous_date = sorted_dates[i - 1]
-
-            if previous_date in prices and current_date in prices:
-                prev_price = prices[previous_date]
-                prev_price_sol = price_data["solana"][previous_date]
-                curr_price = prices[current_date]
-                curr_price_sol = price_data["solana"][current_date]
-                if prev_price > 0:
-                    daily_return = ((curr_price / curr_price_sol) / (prev_price / prev_price_sol)) - 1
-                    daily_returns.append(daily_return)
-
-        if daily_returns:
-            # Variance and Standard Deviation
-            variance = np.var(daily_returns)
-            std_deviation = np.std(daily_returns)
-
-            # Rolling APY Calculation for multiple windows
-            rolling_windows = [30, 60, 90, 120]
-            rolling_apy = {}
-
-            for window in rolling_windows:
-                if len(daily_returns) >= window:
-                    rolling_window_returns = daily_returns[-window:]
-                    cumulative_return = np.prod([(1 + r) for r in rolling_window_returns])
-                    rolling_apy_value = (cumulative_return ** (365 / window)) - 1
-                    rolling_apy[f"rolling_apy_{window}d"] = rolling_apy_value
-                else:
-                    rolling_apy[f"rolling_apy_{window}d"] = None
-
-            # Cumulative Yield Calculation in a similar structure to base_indexed_response
-            cumulative_yield_value = 1
-            cumulative_yield_response[asset_name] = []
-
-            for i in range(0, len(sorted_dates)):
-                current_date = sorted_dates[i]
-
-                if current_date >= first_common_date:
-                    daily_return = daily_returns[i - 4]
-                    cumulative_yield_value *= (1 + daily_return)
-                    cumulative_yield_response[asset_name].append({
-                        'timestamp': current_date,
-                        'cumulative_yield': cumulative_yield_value - 1
-                    })
-
-            # Skewness and Kurtosis
-            skewness = skew(daily_returns)
-            kurt = kurtosis(daily_returns)
-
-            # Downside Volatility Calculation
-            negative_returns = [r for r in daily_returns if r < 0]
-            downside_volatility = np.std(negative_returns) if negative_returns else 0
-
-            average_daily_return = np.mean(daily_returns)
-            apy = (1 + average_daily_return) ** 365 - 1
-            daily_changes[asset_name] = {
-                'average_daily_return': average_daily_return,
-                'apy': apy,
-                'variance': variance,
-                'std_deviation': std_deviation,
-                'downside_volatility': downside_volatility,
-                'rolling_apy_30d': rolling_apy.get('rolling_apy_30d', 0),
-                'rolling_apy_60d': rolling_apy.get('rolling_apy_60d', 0),
-                'rolling_apy_90d': rolling_apy.get('rolling_apy_90d', 0),
-                'rolling_apy_120d': rolling_apy.get('rolling_apy_120d', 0),
-                'skewness': format_decimal(skewness),
-                'kurtosis': format_decimal(kurt),
-                'num_days': len(daily_returns)
-            }
-
-    # Create base indexed data starting from the first common date
     base_indexed_response = {}
-    for asset_name, prices in price_data.items():
-        base_price = prices[first_common_date] if first_common_date in prices else None
-        base_indexed_response[asset_name] = []
-
-        for timestamp in sorted(prices.keys()):
-            if timestamp >= first_common_date:
-                indexed_price = (prices[timestamp] / base_price) * 100 if base_price else None
-                base_indexed_response[asset_name].append({
-                    'timestamp': timestamp,
-                    'indexed_price': indexed_price
-                })
-
-    # Return the response as JSON
+    for column, asset_name in enumerate(assets):
+        rows = np.flatnonzero(observed[:, column])
+        timestamps = dates_from_start[rows].tolist()
+
+        if has_returns[column]:
+            cumulative_yield_response[asset_name] = [
+                {'timestamp': timestamp, 'cumulative_yield': value}
+                for timestamp, value in zip(timestamps, cumulative_yield[rows, column].tolist())
+            ]
+
+        # Create base indexed data starting from the first common date
+        values = indexed_prices[rows, column].tolist() if has_base[column] else [None] * len(rows)
+        base_indexed_response[asset_name] = [
+            {'timestamp': timestamp, 'indexed_price': indexed_price}
+            for timestamp, indexed_price in zip(timestamps, values)
+        ]
+
     return {
-        'body': json.dumps({
-            'price_data': response,
-            'base_indexed_data': base_indexed_response,
-            'cumulative_yield_data': cumulative_yield_response,
-            'daily_changes': daily_changes
-        }, default=decimal_default)
+        'price_data': response,
+        'base_indexed_data': base_indexed_response,
+        'cumulative_yield_data': cumulative_yield_response,
+        'daily_changes': daily_changes
     }
-
@@ -0,0 +1,106 @@
+import base64
+import os
+import threading
+import time
+
+import requests
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# Seconds a downloaded key set is trusted before it is fetched again
+JWKS_CACHE_TTL = int(os.getenv('JWKS_CACHE_TTL', 3600))
+# Minimum seconds between refreshes caused by an unknown kid, so tokens with
+# made-up kids cannot turn every request into a call to the identity provider
+JWKS_MIN_REFRESH_INTERVAL = int(os.getenv('JWKS_MIN_REFRESH_INTERVAL', 30))
+
+_jwks_url = None
+_fetcher = None
+_keys = {}
+_fetched_at = None
+_last_attempt = None
+_lock = threading.Lock()
+
+
+def fetch_jwks(url):
+    """
+    Download a JWKS document.
+
+    Returns:
+        list: The JWK dicts of the "keys" member
+    """
+    response = requests.get(url, timeout=5)
+    response.raise_for_status()
+    return response.json()['keys']
+
+
+def convert_jwk_to_public_key(jwk):
+    n = base64.urlsafe_b64decode(jwk['n'] + '==')
+    e = base64.urlsafe_b64decode(jwk['e'] + '==')
+
+    return rsa.RSAPublicNumbers(
+        int.from_bytes(e, byteorder='big'),
+        int.from_bytes(n, byteorder='big')
+    ).public_key(default_backend())
+
+
+def configure(jwks_url, fetcher=None):
+    """
+    Point the cache at a JWKS URL and drop any keys already loaded.
+
+    Args:
+        jwks_url: URL of the jwks.json document
+        fetcher: Callable taking the URL and returning the list of JWKs;
+                 defaults to fetch_jwks (tests can pass a local stand-in)
+    """
+    global _jwks_url, _fetcher, _keys, _fetched_at, _last_attempt
+    with _lock:
+        _jwks_url = jwks_url
+        _fetcher = fetcher or fetch_jwks
+        _keys = {}
+        _fetched_at = None
+        _last_attempt = None
+
+
+def _is_fresh(now):
+    return _fetched_at is not None and now - _fetched_at < JWKS_CACHE_TTL
+
+
+def _refresh(now):
+    global _keys, _fetched_at, _last_attempt
+    _last_attempt = now
+    try:
+        jwks = _fetcher(_jwks_url)
+        _keys = {jwk['kid']: convert_jwk_to_public_key(jwk) for jwk in jwks if jwk.get('kty') == 'RSA'}
+        _fetched_at = now
+    except Exception as e:
+        print(f"Error refreshing JWKS from {_jwks_url}: {e}")
+
+
+def get_public_key(kid):
+    """
+    Return the parsed public key for a token's kid, or None if it is unknown.
+
+    Keys are served from memory while the key set is younger than
+    JWKS_CACHE_TTL. An expired key set or an unknown kid triggers one
+    refresh; concurrent callers wait for that refresh instead of starting
+    their own.
+    """
+    now = time.monotonic()
+    key = _keys.get(kid)
+    if key is not None and _is_fresh(now):
+        return key
+
+    with _lock:
+        # Another request may have refreshed the keys while we were waiting
+        now = time.monotonic()
+        key = _keys.get(kid)
+        if key is not None and _is_fresh(now):
+            return key
+
+        # Failed and unknown-kid refreshes are rate limited; until one succeeds,
+        # the previous (possibly expired) keys keep being served
+        if _last_attempt is None or now - _last_attempt >= JWKS_MIN_REFRESH_INTERVAL:
+            _refresh(now)
+
+        return _keys.get(kid)
+
@@ -1,108 +1,203 @@
-from datetime import datetime
-
 import numpy as np
 import pandas as pd
-import requests
 
+from columnar import to_columnar
+from correlations import expanding_correlation
+from price_history import load_price_history
 
-def get_data(the_url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
-    response = requests.get(the_url, headers=headers)
-    data = response.json()["stats"]
-    for i in range(0, len(data) - 1):
-        data[i][0] = datetime.utcfromtimestamp(data[i][0] / 1000).strftime('%Y-%m-%d')
-    del data[-1]
-    return data
 
+CORRELATION_COINS = ["btc", "eth", "sol"]
 
-def calculate_correlations(liquidity, lag, ma_length):
-    url = "https://www.coingecko.com/price_charts/1/usd/max.json"
-    url2 = "https://www.coingecko.com/price_charts/279/usd/max.json"
-    url3 = "https://www.coingecko.com/price_charts/4128/usd/max.json"
+# Upper bounds on lags x ma_lengths, and on lags alone, for a single /liquidity/correlation-grid request
+MAX_GRID_CELLS = 10000
+MAX_GRID_LAGS = 500
 
-    btc_data = get_data(url)
-    eth_data = get_data(url2)
-    sol_data = get_data(url3)
+# Lags whose lagged prices and expanding correlations are held in memory at once (each a
+# float matrix of GRID_LAG_CHUNK x days), so peak memory does not grow with the request
+GRID_LAG_CHUNK = 64
 
-    df_btc = pd.DataFrame(btc_data, columns=["timestamp", "price_btc"])
-    df_eth = pd.DataFrame(eth_data, columns=["timestamp", "price_eth"])
-    df_sol = pd.DataFrame(sol_data, columns=["timestamp", "price_sol"])
-    df_liquidity = pd.DataFrame(liquidity, columns=["timestamp", "price_liquidity"])
 
-    df_btc['timestamp'] = pd.to_datetime(df_btc['timestamp'])
-    df_eth['timestamp'] = pd.to_datetime(df_eth['timestamp'])
-    df_sol['timestamp'] = pd.to_datetime(df_sol['timestamp'])
+def merge_price_and_liquidity(prices, liquidity):
+    """
+    Inner-join the stored coin prices with the posted liquidity series on date.
+
+    Args:
+        prices: Frame with a timestamp column and one price_<coin> column per coin
+        liquidity: List of [date, value] pairs from the request body
+    """
+    df_liquidity = pd.DataFrame(liquidity, columns=["timestamp", "price_liquidity"])
     df_liquidity['timestamp'] = pd.to_datetime(df_liquidity['timestamp'])
 
-    merged_df = pd.merge(df_btc, df_liquidity, on='timestamp')
-    merged_df = pd.merge(merged_df, df_eth, on='timestamp')
-    merged_df = pd.merge(merged_df, df_sol, on='timestamp')
-
-    merged_df['price_btc'] = merged_df['price_btc'].shift(-lag)
-    merged_df['price_eth'] = merged_df['price_eth'].shift(-lag)
-    merged_df['price_sol'] = merged_df['price_sol'].shift(-lag)
-
-    cumulative_correlations_btc = []
-    cumulative_correlations_eth = []
-    cumulative_correlations_sol = []
-    sma_cumulative_correlations_btc = []
-    sma_cumulative_correlations_eth = []
-    sma_cumulative_correlations_sol = []
-    for i in range(1, len(merged_df) + 1):
-        subset_df = merged_df.iloc[:i]
-
-        corr_btc = subset_df['price_btc'].corr(subset_df['price_liquidity'])
-        corr_eth = subset_df['price_eth'].corr(subset_df['price_liquidity'])
-        corr_sol = subset_df['price_sol'].corr(subset_df['price_liquidity'])
-
-        cumulative_correlations_btc.append(corr_btc)
-        cumulative_correlations_eth.append(corr_eth)
-        cumulative_correlations_sol.append(corr_sol)
-
-        if len(cumulative_correlations_btc) >= ma_length:
-            sma_btc = pd.Series(cumulative_correlations_btc[-ma_length:]).mean()
-            sma_eth = pd.Series(cumulative_correlations_eth[-ma_length:]).mean()
-            sma_sol = pd.Series(cumulative_correlations_sol[-ma_length:]).mean()
-        else:
-            sma_btc = pd.Series(cumulative_correlations_btc).mean()
-            sma_eth = pd.Series(cumulative_correlations_eth).mean()
-            sma_sol = pd.Series(cumulative_correlations_sol).mean()
-
-        sma_cumulative_correlations_btc.append(sma_btc)
-        sma_cumulative_correlations_eth.append(sma_eth)
-        sma_cumulative_correlations_sol.append(sma_sol)
-
-    merged_df['cumulative_correlation_btc'] = cumulative_correlations_btc
-    merged_df['cumulative_correlation_eth'] = cumulative_correlations_eth
-    merged_df['cumulative_correlation_sol'] = cumulative_correlations_sol
-    merged_df['sma_cumulative_correlation_btc'] = sma_cumulative_correlations_btc
-    merged_df['sma_cumulative_correlation_eth'] = sma_cumulative_correlations_eth
-    merged_df['sma_cumulative_correlation_sol'] = sma_cumulative_correlations_sol
-
-    selected_data = merged_df[['timestamp', 'cumulative_correlation_btc', "cumulative_correlation_eth", "cumulative_correlation_sol", 'sma_cumulative_correlation_btc', 'sma_cumulative_correlation_eth', 'sma_cumulative_correlation_sol']]
-
-    selected_data['timestamp'] = selected_data['timestamp'].dt.strftime('%Y-%m-%d')
-
-    selected_data = selected_data.replace({np.nan: None})
-
-    correlation_btc = [{row['timestamp']: row['cumulative_correlation_btc']} for _, row in selected_data.iterrows()]
-    correlation_eth = [{row['timestamp']: row['cumulative_correlation_eth']} for _, row in selected_data.iterrows()]
-    correlation_sol = [{row['timestamp']: row['cumulative_correlation_sol']} for _, row in selected_data.iterrows()]
-
-    sma_btc = [{row['timestamp']: row['sma_cumulative_correlation_btc']} for _, row in selected_data.iterrows()]
-    sma_eth = [{row['timestamp']: row['sma_cumulative_correlation_eth']} for _, row in selected_data.iterrows()]
-    sma_sol = [{row['timestamp']: row['sma_cumulative_correlation_sol']} for _, row in selected_data.iterrows()]
+    merged_df = pd.merge(prices, df_liquidity, on='timestamp')
+    return merged_df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+def moving_average(values, ma_length):
+    """
+    Trailing mean over the last ma_length values (fewer at the start), skipping NaN.
+    """
+    series = pd.Series(values)
+    if ma_length <= 0:
+        return series.expanding(min_periods=1).mean().to_numpy()
+    return series.rolling(ma_length, min_periods=1).mean().to_numpy()
+
+
+def correlation_series(merged_df, lag, ma_length):
+    """
+    Expanding correlation of each coin's lagged price with liquidity, and its moving average.
+
+    Returns:
+        dict: coin -> (expanding correlation, moving average) arrays aligned with merged_df
+    """
+    liquidity = merged_df['price_liquidity'].to_numpy(dtype=np.float64)
+
+    series = {}
+    for coin in CORRELATION_COINS:
+        price = merged_df[f'price_{coin}'].shift(-lag).to_numpy(dtype=np.float64)
+        cumulative = expanding_correlation(price, liquidity)
+        series[coin] = (cumulative, moving_average(cumulative, ma_length))
+
+    return series
+
+
+def parse_grid_axis(spec, name, max_values=MAX_GRID_CELLS):
+    """
+    Read one axis of the correlation grid from the request body.
+
+    Accepts either an explicit list of integers or a {"start", "stop", "step"}
+    range, where stop is inclusive. At most max_values values are accepted.
+    """
+    if isinstance(spec, dict):
+        step = int(spec.get("step", 1))
+        if step <= 0:
+            raise ValueError(f"{name}.step must be positive")
+        values = range(int(spec["start"]), int(spec["stop"]) + 1, step)
+    elif isinstance(spec, list):
+        values = spec
+    else:
+        raise ValueError(f"{name} must be a list or a {{start, stop, step}} range")
+
+    # Checked before the values are materialized
+    if len(values) > max_values:
+        raise ValueError(f"{name} is limited to {max_values} values")
+    if not values:
+        raise ValueError(f"{name} is empty")
+    return [int(value) for value in values]
+
+
+def lagged_matrix(values, lags):
+    """
+    Stack values.shift(-lag) for every lag into a lags x days matrix.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    source = np.arange(len(values)) + np.asarray(lags, dtype=np.intp)[:, None]
+    in_range = (source >= 0) & (source < len(values))
+    if not len(values):
+        return np.full(source.shape, np.nan)
+    return np.where(in_range, values[np.clip(source, 0, len(values) - 1)], np.nan)
+
+
+def latest_moving_averages(series, ma_lengths):
+    """
+    Last value of moving_average(row, ma_length) for every row and every ma_length.
+
+    Read off running sums of each row, so all MA lengths together cost O(days).
+
+    Returns:
+        ndarray: rows x ma_lengths
+    """
+    n_days = series.shape[-1]
+    valid = ~np.isnan(series)
+    totals = np.concatenate((np.zeros((len(series), 1)), np.cumsum(np.where(valid, series, 0.0), axis=-1)), axis=-1)
+    counts = np.concatenate((np.zeros((len(series), 1)), np.cumsum(valid, axis=-1)), axis=-1)
+
+    # moving_average treats ma_length <= 0 as an expanding mean
+    starts = np.array([n_days - min(ma, n_days) if ma > 0 else 0 for ma in ma_lengths], dtype=np.intp)
+    window_totals = totals[:, -1:] - totals[:, starts]
+    window_counts = counts[:, -1:] - counts[:, starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_counts > 0, window_totals / window_counts, np.nan)
+
+
+def correlation_grid(merged_df, lags, ma_lengths):
+    """
+    Latest expanding correlation and moving average for every (lag, ma_length) pair.
+
+    Every lag is a shifted view of the same aligned series, so the expanding
+    correlations come out of one 2-D pass per coin and GRID_LAG_CHUNK lags.
+
+    Returns:
+        dict: coin -> (latest correlation per lag, latest SMA as lags x ma_lengths)
+    """
+    liquidity = merged_df['price_liquidity'].to_numpy(dtype=np.float64)
+
+    grid = {}
+    for coin in CORRELATION_COINS:
+        price = merged_df[f'price_{coin}'].to_numpy(dtype=np.float64)
+        latest = np.full(len(lags), np.nan)
+        sma = np.full((len(lags), len(ma_lengths)), np.nan)
+        for start in range(0, len(lags), GRID_LAG_CHUNK):
+            chunk = slice(start, start + GRID_LAG_CHUNK)
+            cumulative = expanding_correlation(lagged_matrix(price, lags[chunk]), liquidity)
+            if cumulative.shape[-1]:
+                latest[chunk] = cumulative[:, -1]
+            sma[chunk] = latest_moving_averages(cumulative, ma_lengths)
+        grid[coin] = (latest, sma)
+
+    return grid
+
+
+def to_json_values(values):
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def calculate_correlation_grid(liquidity, lags, ma_lengths):
+    if len(lags) * len(ma_lengths) > MAX_GRID_CELLS:
+        raise ValueError(f"Grid is limited to {MAX_GRID_CELLS} lag x ma_length combinations")
+
+    prices = load_price_history(CORRELATION_COINS)
+
+    merged_df = merge_price_and_liquidity(prices, liquidity)
+    if max(abs(lag) for lag in lags) >= max(len(merged_df), 1):
+        raise ValueError(f"Lags must be shorter than the {len(merged_df)} days of overlapping data")
+    grid = correlation_grid(merged_df, lags, ma_lengths)
 
     data = {
-        "correlation_btc": correlation_btc,
-        "correlation_eth": correlation_eth,
-        "correlation_sol": correlation_sol,
-        "sma_btc": sma_btc,
-        "sma_eth": sma_eth,
-        "sma_sol": sma_sol
+        "lags": list(lags),
+        "ma_lengths": list(ma_lengths),
+        "last_date": merged_df['timestamp'].iloc[-1].strftime('%Y-%m-%d') if len(merged_df) else None,
     }
+    for coin in CORRELATION_COINS:
+        data[f"correlation_{coin}"] = to_json_values(grid[coin][0])
+    for coin in CORRELATION_COINS:
+        data[f"sma_{coin}"] = to_json_values(grid[coin][1])
+
+    return data
+
+
+def to_dated_points(dates, values):
+    return [{date: value} for date, value in zip(dates, np.where(np.isnan(values), None, values).tolist())]
+
+
+def calculate_correlations(liquidity, lag, ma_length, columnar=False):
+    # Histories are kept up to date by crons/cron_price_history.py
+    prices = load_price_history(CORRELATION_COINS)
+
+    merged_df = merge_price_and_liquidity(prices, liquidity)
+    series = correlation_series(merged_df, lag, ma_length)
+
+    if columnar:
+        columns = {f"correlation_{coin}": series[coin][0] for coin in CORRELATION_COINS}
+        columns.update({f"sma_{coin}": series[coin][1] for coin in CORRELATION_COINS})
+        return to_columnar(merged_df['timestamp'].to_numpy(), columns)
+
+    dates = merged_df['timestamp'].dt.strftime('%Y-%m-%d').tolist()
+
+    data = {}
+    for coin in CORRELATION_COINS:
+        data[f"correlation_{coin}"] = to_dated_points(dates, series[coin][0])
+    for coin in CORRELATION_COINS:
+        data[f"sma_{coin}"] = to_dated_points(dates, series[coin][1])
 
     return data
 
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+
+def build_market_cap_matrix(coins):
+    """
+    Pivot table1 rows into a dense dates x coins market cap matrix.
+
+    Missing (day, coin) observations are NaN. Dates and coin names are sorted,
+    so ties in market cap are always broken the same way (by coin name).
+
+    Returns:
+        tuple: (dates as 'YYYY-MM-DD' strings, coin names, 2D float64 matrix)
+    """
+    date_codes, dates = pd.factorize(coins['timestamp'].dt.normalize(), sort=True)
+    coin_codes, names = pd.factorize(coins['coin_name'], sort=True)
+
+    values = np.full((len(dates), len(names)), np.nan)
+    values[date_codes, coin_codes] = coins['market_cap'].to_numpy(dtype=np.float64)
+
+    return np.asarray(dates.strftime('%Y-%m-%d')), np.asarray(names, dtype=object), values
+
+
+def rank_index_band(dates, coin_names, values, index_start, index_end, exclude_ids=()):
+    """
+    Select the coins ranked index_start..index_end by market cap on every day.
+
+    Equivalent to sorting each day's coins by market cap (descending) and
+    slicing [index_start:index_end + 1], but done for all days at once with
+    argpartition on the dates x coins matrix. Days without any eligible coin
+    are dropped, as are excluded coins.
+
+    Returns:
+        dict: dates, per-day band sums, member column indices per day, a mask
+        of filled member slots, and the number of days each coin was selected
+    """
+    excluded = np.isin(coin_names, list(exclude_ids))
+    eligible = ~np.isnan(values) & ~excluded
+
+    day_has_coins = eligible.any(axis=1)
+    ranked = np.where(eligible[day_has_coins], values[day_has_coins], -np.inf)
+
+    n_days, n_coins = ranked.shape
+    top_n = min(max(index_end + 1, 0), n_coins)
+    first = min(max(index_start, 0), top_n)
+
+    if first == top_n:
+        members = np.empty((n_days, 0), dtype=np.intp)
+    else:
+        if top_n < n_coins:
+            members = np.argpartition(-ranked, top_n - 1, axis=1)[:, :top_n]
+        else:
+            members = np.broadcast_to(np.arange(n_coins), (n_days, n_coins))
+        order = np.argsort(-np.take_along_axis(ranked, members, axis=1), axis=1, kind='stable')
+        members = np.take_along_axis(members, order, axis=1)[:, first:]
+
+    member_values = np.take_along_axis(ranked, members, axis=1)
+    member_mask = np.isfinite(member_values)
+
+    return {
+        "dates": dates[day_has_coins],
+        "sums": np.where(member_mask, member_values, 0.0).sum(axis=1),
+        "members": members,
+        "member_mask": member_mask,
+        "participation": np.bincount(members[member_mask], minlength=n_coins),
+    }
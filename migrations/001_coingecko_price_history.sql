@@ -0,0 +1,10 @@
+--
+-- Daily BTC/ETH/SOL closes used by /liquidity/correlation, filled by crons/cron_price_history.py
+--
+
+CREATE TABLE IF NOT EXISTS coingecko_price_history (
+    coin VARCHAR(32) NOT NULL,
+    date DATE NOT NULL,
+    price DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (coin, date)
+);
@@ -0,0 +1,126 @@
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+PLOTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'plots')
+# Written next to the images by trw_guy_def; records the inputs they were rendered from
+MANIFEST_PATH = os.path.join(PLOTS_DIR, 'manifest.json')
+
+PLOT_NAMES = [
+    'global_liquidity_vs_bitcoin',
+    'zscore_btc_prices',
+    'michael_howell_better_model',
+    'btc_vs_gl_better_model',
+    'zscore_btc_prices_valuation',
+]
+
+# Bump when the charts change without their inputs changing, so they are rendered again
+PLOTS_VERSION = 1
+
+# Hashed plot URLs never change content, so clients may keep them for a year
+PLOT_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def input_digest(dates, *arrays):
+    """
+    Digest of the price_data columns the plots are rendered from.
+
+    Args:
+        dates: Row dates
+        arrays: Value columns aligned with dates
+
+    Returns:
+        str: Hex digest that changes whenever any date or value changes
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"v{PLOTS_VERSION}|{len(dates)}".encode('utf-8'))
+    digest.update("|".join(str(date) for date in dates).encode('utf-8'))
+    for values in arrays:
+        digest.update(np.ascontiguousarray(values, dtype='float64').tobytes())
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """
+    Hold an exclusive flock on path for the with-block, across processes and threads.
+
+    Yields:
+        bool: True once held; False if blocking is off and another holder has it
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+
+def save_plot(fig, filename, plots_dir=PLOTS_DIR):
+    """
+    Render a figure to <plots_dir>/<filename>.png.
+
+    The image is written to a temporary file first, so a request never
+    reads a half-written PNG.
+    """
+    os.makedirs(plots_dir, exist_ok=True)
+    path = os.path.join(plots_dir, f'{filename}.png')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    fig.savefig(tmp_path, format='png')
+    os.replace(tmp_path, path)
+
+
+def read_manifest():
+    """
+    Returns:
+        dict: {"digest": input digest, "plots": {name: content hash}}, or None if there is none yet
+    """
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(manifest, digest):
+    """
+    Whether the plots on disk were rendered from inputs with this digest.
+    """
+    if manifest is None or manifest.get('digest') != digest:
+        return False
+    return all(os.path.exists(os.path.join(PLOTS_DIR, f'{name}.png')) for name in PLOT_NAMES)
+
+
+def write_manifest(digest):
+    """
+    Record the input digest and the content hash of every rendered plot.
+
+    Returns:
+        dict: The manifest written
+    """
+    manifest = {
+        'digest': digest,
+        'plots': {name: file_digest(os.path.join(PLOTS_DIR, f'{name}.png')) for name in PLOT_NAMES},
+    }
+    tmp_path = f'{MANIFEST_PATH}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, MANIFEST_PATH)
+    return manifest
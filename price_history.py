@@ -0,0 +1,154 @@
+import os
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+import requests
+
+from database import db_session, fetch_frame
+
+# CoinGecko price chart ids for the coins used by the liquidity correlation
+COINGECKO_CHARTS = {
+    "btc": 1,
+    "eth": 279,
+    "sol": 4128,
+}
+
+PRICE_CHART_URL = "https://www.coingecko.com/price_charts/{chart_id}/usd/max.json"
+
+# Shipped as a migration so init_db.py creates the table before the first cron run
+MIGRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', '001_coingecko_price_history.sql')
+
+# pg_advisory_xact_lock key serializing refreshes across workers, pods and the cron
+PRICE_HISTORY_LOCK_ID = 7007
+
+
+class PriceHistoryUnavailable(Exception):
+    """
+    Raised when the store has no prices yet for a requested coin.
+    """
+
+
+def create_price_history_table(cursor):
+    with open(MIGRATION_PATH) as f:
+        cursor.execute(f.read())
+
+
+def parse_price_chart(payload):
+    """
+    Turn a CoinGecko max.json payload into a date-indexed price frame.
+
+    The last point of the chart is the live intraday price and is dropped,
+    leaving one closing price per day.
+    """
+    stats = np.asarray(payload["stats"][:-1], dtype=np.float64).reshape(-1, 2)
+    return pd.DataFrame({
+        "date": pd.to_datetime(stats[:, 0], unit='ms').normalize(),
+        "price": stats[:, 1],
+    })
+
+
+def fetch_price_chart(chart_id):
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+    }
+    response = requests.get(PRICE_CHART_URL.format(chart_id=chart_id), headers=headers)
+    response.raise_for_status()
+    return parse_price_chart(response.json())
+
+
+def store_price_history(cursor, coin, history):
+    """
+    Upsert the days that are not yet stored for a coin.
+
+    The most recent stored day is rewritten too, in case it was captured
+    before CoinGecko settled its closing price.
+
+    Returns:
+        int: Number of rows written
+    """
+    cursor.execute('SELECT MAX(date) AS last_date FROM coingecko_price_history WHERE coin = %s', (coin,))
+    last_date = cursor.fetchone()['last_date']
+
+    if last_date is not None:
+        history = history[history["date"] >= pd.Timestamp(last_date)]
+    history = history.drop_duplicates("date", keep="last")
+    if history.empty:
+        return 0
+
+    rows = list(zip([coin] * len(history), history["date"].dt.date, history["price"].tolist()))
+    psycopg2.extras.execute_values(cursor, '''
+        INSERT INTO coingecko_price_history (coin, date, price)
+        VALUES %s
+        ON CONFLICT (coin, date) DO UPDATE SET price = EXCLUDED.price
+    ''', rows)
+    return len(rows)
+
+
+def refresh_price_history(coins=None):
+    """
+    Download the CoinGecko histories and append any new days to the local store.
+
+    The charts are downloaded before a connection is borrowed; only the
+    upsert holds the Postgres advisory lock that serializes concurrent
+    refreshes.
+
+    Args:
+        coins: Coins to refresh (all of COINGECKO_CHARTS by default)
+
+    Returns:
+        dict: coin -> number of rows written
+    """
+    coins = coins or list(COINGECKO_CHARTS)
+    histories = {coin: fetch_price_chart(COINGECKO_CHARTS[coin]) for coin in coins}
+
+    with db_session() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', (PRICE_HISTORY_LOCK_ID,))
+        create_price_history_table(cursor)
+        return {coin: store_price_history(cursor, coin, history) for coin, history in histories.items()}
+
+
+def read_price_history(coins):
+    """
+    Read the stored rows of coins as a (date, coin, price) frame.
+
+    A store whose table has not been created yet reads as empty.
+    """
+    try:
+        return fetch_frame(
+            "SELECT date, coin, price FROM coingecko_price_history WHERE coin = ANY(%s)",
+            (list(coins),),
+            dtype={'coin': str, 'price': 'float64'},
+            parse_dates=['date'],
+        )
+    except psycopg2.errors.UndefinedTable:
+        return pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'),
+                             'coin': pd.Series(dtype=str), 'price': pd.Series(dtype='float64')})
+
+
+def load_price_history(coins):
+    """
+    Read stored daily prices as a frame with one price_<coin> column per coin.
+
+    Only days present for every requested coin are kept. The store is only
+    read here; crons/cron_price_history.py fills it.
+
+    Raises:
+        PriceHistoryUnavailable: A coin has no stored prices yet
+    """
+    history = read_price_history(coins)
+
+    stored = set(history['coin'])
+    missing = [coin for coin in coins if coin not in stored]
+    if missing:
+        raise PriceHistoryUnavailable(
+            f"No price history stored for {', '.join(missing)}; "
+            f"run crons/cron_price_history.py to fill coingecko_price_history")
+
+    prices = history.pivot(index='date', columns='coin', values='price').reindex(columns=list(coins))
+    prices = prices.dropna().sort_index()
+    prices.columns = [f"price_{coin}" for coin in prices.columns]
+
+    return prices.rename_axis('timestamp').reset_index()
@@ -1,42 +1,84 @@
-from database import get_db_connection, get_db_cursor
+from columnar import frame_to_columnar
+from database import db_session, fetch_frame
 
 # Database connection function is now imported from database.py
 
 
 def fetch_coin_price_for_date_range(start_date, end_date, coin):
-    cnx = get_db_connection()
-    cursor = get_db_cursor(cnx)
-
     query = ("""
-        SELECT * FROM table1
-        WHERE timestamp >= %s AND timestamp <= %s AND coin_name = %s AND index_name = "coingecko"
+        SELECT timestamp, price FROM table1
+        WHERE timestamp >= %s AND timestamp <= %s AND coin_name = %s AND index_name = %s
     """)
-    cursor.execute(query, (start_date + " 00:00:00", end_date + " 23:59:59", coin))
-
-    items = {row['timestamp'].strftime('%Y-%m-%d'): float(row['price']) for row in cursor.fetchall()}
-    cursor.close()
-    cnx.close()
+    with db_session() as cursor:
+        cursor.execute(query, (start_date + " 00:00:00", end_date + " 23:59:59", coin, "coingecko"))
+        items = {row['timestamp'].strftime('%Y-%m-%d'): float(row['price']) for row in cursor.fetchall()}
 
     return items
 
 
 def fetch_tradingview_price_for_date_range(start_date, end_date, coin):
-    cnx = get_db_connection()
-    cursor = get_db_cursor(cnx)
+    query = ("""
+        SELECT timestamp, price FROM table1
+        WHERE timestamp >= %s AND timestamp <= %s AND coin_name = %s AND index_name = %s
+    """)
+    with db_session() as cursor:
+        cursor.execute(query, (start_date + " 00:00:00", end_date + " 23:59:59", coin, "tradingview"))
+        items = {row['timestamp'].strftime('%Y-%m-%d'): float(row['price']) for row in cursor.fetchall()}
+
+    return items
+
+
+def fetch_tradingview_prices(start_date, end_date, symbols):
+    """
+    Fetch the daily prices of several TradingView symbols in one query.
+
+    Args:
+        start_date: Start date (YYYY-MM-DD)
+        end_date: End date (YYYY-MM-DD)
+        symbols: TradingView symbols, e.g. ["total", "btc"]
 
+    Returns:
+        DataFrame: Sorted dates x symbols price frame, NaN where a symbol has
+        no price for a date that another symbol has
+    """
     query = ("""
-        SELECT * FROM table1
-        WHERE timestamp >= %s AND timestamp <= %s AND coin_name = %s AND index_name = "tradingview"
+        SELECT coin_name, timestamp, price FROM table1
+        WHERE timestamp >= %s AND timestamp <= %s AND coin_name = ANY(%s) AND index_name = %s
     """)
-    cursor.execute(query, (start_date + " 00:00:00", end_date + " 23:59:59", coin))
+    rows = fetch_frame(query, (start_date + " 00:00:00", end_date + " 23:59:59", list(symbols), "tradingview"),
+                       dtype={'coin_name': str, 'price': 'float64'},
+                       parse_dates=['timestamp'])
 
-    items = {row['timestamp'].strftime('%Y-%m-%d'): float(row['price']) for row in cursor.fetchall()}
-    cursor.close()
-    cnx.close()
+    # One price per symbol and day; the latest row of the day wins
+    rows['date'] = rows['timestamp'].dt.normalize()
+    rows = rows.sort_values('timestamp', kind='stable').drop_duplicates(['date', 'coin_name'], keep='last')
+    prices = rows.pivot(index='date', columns='coin_name', values='price')
 
-    return items
+    return prices.reindex(columns=list(symbols)).sort_index().rename_axis(columns=None)
 
 
 def get_price_chart(start_date, end_date, coin):
     data = fetch_coin_price_for_date_range(start_date, end_date, coin)
     return data
+
+
+def get_price_chart_columnar(start_date, end_date, coin):
+    """
+    The /coin/<coin> prices as a columnar block, built from the fetched frame.
+
+    Returns:
+        dict: {"dates": [...], "series": {coin: [...]}}, one price per day in date order
+    """
+    query = ("""
+        SELECT timestamp, price FROM table1
+        WHERE timestamp >= %s AND timestamp <= %s AND coin_name = %s AND index_name = %s
+    """)
+    rows = fetch_frame(query, (start_date + " 00:00:00", end_date + " 23:59:59", coin, "coingecko"),
+                       dtype={'price': 'float64'},
+                       parse_dates=['timestamp'])
+
+    # One price per day; the latest row of the day wins
+    rows['date'] = rows['timestamp'].dt.normalize()
+    rows = rows.sort_values('timestamp', kind='stable').drop_duplicates('date', keep='last')
+
+    return frame_to_columnar(rows[['date', 'price']].rename(columns={'price': coin}), 'date')
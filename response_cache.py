@@ -0,0 +1,265 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from compression import etag_variants
+from database import db_session
+
+# Per worker process limits; the least recently used entries are evicted first
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 512))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+# How often the data version of routes that also read external APIs (TLX, Toros) rolls over
+RESPONSE_CACHE_MAX_AGE = int(os.getenv('RESPONSE_CACHE_MAX_AGE', 3600))
+# How long table watermarks are trusted before they are read again
+WATERMARK_TTL = int(os.getenv('WATERMARK_TTL', 30))
+# max-age sent to browsers and the CDN; after it they revalidate with If-None-Match
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 60))
+
+# One cheap expression per table that changes whenever the crons write to it
+TABLE_WATERMARKS = {
+    "table1": "SELECT MAX(id)::text FROM table1",
+    "table2": """SELECT COUNT(*) || ':' || COALESCE(SUM(hashtext(id || ':' || image || ':' || "order")), 0) FROM table2""",
+    "table3": """SELECT COUNT(*) || ':' || COALESCE(SUM(hashtext(id || ':' || image || ':' || "order")), 0) FROM table3""",
+    "table4": """SELECT COUNT(*) || ':' || COALESCE(SUM(hashtext(id || ':' || image || ':' || "order")), 0) FROM table4""",
+    "lst": "SELECT COUNT(*) || ':' || COALESCE(MAX(id), 0) FROM lst",
+    "lst2": "SELECT MAX(id)::text FROM lst2",
+    "liquidity": "SELECT COUNT(*) || ':' || COALESCE(MAX(record_date)::text, '') FROM liquidity",
+    "price_data": """SELECT COUNT(*) || ':' || COALESCE(SUM(hashtext(date || ':' || global_liquidity || ':' || bitcoin_price || ':' || gold_price)), 0) FROM price_data""",
+}
+
+_entries = OrderedDict()
+_size = 0
+_watermarks = None
+_watermarks_read_at = None
+_lock = threading.Lock()
+_watermark_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "stale": 0,
+    "not_modified": 0,
+    "evictions": 0,
+    "watermark_reads": 0,
+    "watermark_errors": 0,
+}
+
+
+def read_watermarks():
+    """
+    Read the watermark of every table in TABLE_WATERMARKS in one query.
+
+    Returns:
+        dict: table -> watermark string
+    """
+    query = "SELECT " + ", ".join(f"({expression}) AS {table}" for table, expression in TABLE_WATERMARKS.items())
+    with db_session(commit=False) as cursor:
+        cursor.execute(query)
+        row = cursor.fetchone()
+
+    return {table: str(row[table]) for table in TABLE_WATERMARKS}
+
+
+def get_watermarks():
+    """
+    Current table watermarks, re-read at most once every WATERMARK_TTL seconds.
+
+    Returns None if they cannot be read, in which case nothing is cached.
+    """
+    global _watermarks, _watermarks_read_at
+
+    if _watermarks_read_at is not None and time.monotonic() - _watermarks_read_at < WATERMARK_TTL:
+        return _watermarks
+
+    with _watermark_lock:
+        # Another request may have read them while we were waiting
+        now = time.monotonic()
+        if _watermarks_read_at is not None and now - _watermarks_read_at < WATERMARK_TTL:
+            return _watermarks
+
+        try:
+            _watermarks = read_watermarks()
+            counter = "watermark_reads"
+        except Exception as e:
+            print(f"Error reading table watermarks: {e}")
+            _watermarks = None
+            counter = "watermark_errors"
+        _watermarks_read_at = now
+        # _stats is guarded by _lock, whichever lock the caller holds
+        with _lock:
+            _stats[counter] += 1
+
+    return _watermarks
+
+
+def data_version(tables, external=False):
+    """
+    Short token that changes whenever any of the given tables changes.
+
+    Args:
+        tables: Names from TABLE_WATERMARKS
+        external: The data also comes from outside APIs, so the version
+                  additionally rolls over every RESPONSE_CACHE_MAX_AGE seconds
+
+    Returns:
+        str: Hex digest of the tables' watermarks, or None if they are unavailable
+    """
+    watermarks = get_watermarks()
+    if watermarks is None:
+        return None
+
+    state = "|".join(f"{table}={watermarks[table]}" for table in tables)
+    if external:
+        state += f"|external={int(time.time() // RESPONSE_CACHE_MAX_AGE)}"
+    return hashlib.blake2b(state.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def not_modified_etag(etag):
+    """
+    The ETag to send with a 304, or None if the client's copy is out of date.
+
+    The client may hold a compressed representation, whose ETag carries an
+    encoding suffix (see compression.py); that ETag is echoed back.
+
+    Only If-None-Match is honoured. The watermarks say whether data changed,
+    not when, so no Last-Modified is sent and If-Modified-Since is ignored.
+    """
+    if request.if_none_match:
+        return next((tag for tag in etag_variants(etag) if request.if_none_match.contains_weak(tag)), None)
+    return None
+
+
+def add_validators(response, etag):
+    response.set_etag(etag)
+    # Responses to authenticated requests must not be stored by shared caches
+    if 'Authorization' in request.headers:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.cache_control.max_age = HTTP_CACHE_MAX_AGE
+    return response
+
+
+def cache_key(path, args):
+    """
+    Route plus query parameters, independent of parameter order and surrounding whitespace.
+    """
+    params = sorted((name, value.strip()) for name, values in args.lists() for value in values)
+    return path, tuple(params)
+
+
+def _evict():
+    global _size
+    while _entries and (len(_entries) > RESPONSE_CACHE_MAX_ENTRIES or _size > RESPONSE_CACHE_MAX_BYTES):
+        _, entry = _entries.popitem(last=False)
+        _size -= len(entry["body"])
+        _stats["evictions"] += 1
+
+
+def lookup(key, version):
+    global _size
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+
+        if entry["version"] != version:
+            del _entries[key]
+            _size -= len(entry["body"])
+            _stats["stale"] += 1
+            _stats["misses"] += 1
+            return None
+
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry
+
+
+def store(key, version, response):
+    global _size
+    body = response.get_data()
+    if len(body) > RESPONSE_CACHE_MAX_BYTES:
+        return
+
+    entry = {
+        "version": version,
+        "body": body,
+        "mimetype": response.mimetype,
+    }
+    with _lock:
+        previous = _entries.pop(key, None)
+        if previous is not None:
+            _size -= len(previous["body"])
+        _entries[key] = entry
+        _size += len(body)
+        _evict()
+
+
+def cached_response(*tables, external=False):
+    """
+    Serve a GET route from the response cache until one of its tables changes.
+
+    Args:
+        tables: Names from TABLE_WATERMARKS whose data the route reads
+        external: The route also reads outside APIs (see data_version)
+
+    Responses carry an ETag derived from the data version, the same on every
+    worker and pod, and a matching If-None-Match is answered with 304 before
+    the route runs. Only 200 responses are cached. Apply below
+    @token_required so that authentication still runs on every request.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            version = data_version(tables, external)
+            if version is None:
+                return f(*args, **kwargs)
+
+            key = cache_key(request.path, request.args)
+            etag = hashlib.blake2b(repr((version, key)).encode('utf-8'), digest_size=8).hexdigest()
+
+            current_etag = not_modified_etag(etag)
+            if current_etag is not None:
+                with _lock:
+                    _stats["not_modified"] += 1
+                return add_validators(Response(status=304), current_etag)
+
+            entry = lookup(key, version)
+            if entry is not None:
+                return add_validators(Response(entry["body"], mimetype=entry["mimetype"]), etag)
+
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                store(key, version, response)
+                add_validators(response, etag)
+            return response
+
+        return wrapper
+    return decorator
+
+
+def clear():
+    global _size
+    with _lock:
+        _entries.clear()
+        _size = 0
+
+
+def get_cache_stats():
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_ratio": round(_stats["hits"] / lookups, 4) if lookups else None,
+            "entries": len(_entries),
+            "bytes": _size,
+            "max_entries": RESPONSE_CACHE_MAX_ENTRIES,
+            "max_bytes": RESPONSE_CACHE_MAX_BYTES,
+            "watermarks": _watermarks,
+            "pid": os.getpid(),
+        }
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from coingecko_sol import base_index_timeseries
+from correlations import align_series, rolling_correlations
+
+DATES = pd.date_range('2024-01-01', periods=40, freq='D')
+rng = np.random.default_rng(7)
+MARKET_CAP_SUMS = {date.strftime('%Y-%m-%d'): value for date, value in zip(DATES, rng.uniform(1e9, 2e9, len(DATES)))}
+PRICES = rng.uniform(10, 20, len(DATES))
+
+
+def test_align_series_matches_iso_t_keys_on_their_day():
+    coin = {date.strftime('%Y-%m-%dT%H:%M:%S.000Z'): price for date, price in zip(DATES, PRICES)}
+
+    dates, index_values, coin_values = align_series(MARKET_CAP_SUMS, coin)
+
+    assert len(dates) == len(DATES)
+    np.testing.assert_array_equal(dates, DATES.to_numpy())
+    np.testing.assert_array_equal(index_values, list(MARKET_CAP_SUMS.values()))
+    np.testing.assert_array_equal(coin_values, PRICES)
+
+
+def test_align_series_keeps_the_latest_value_of_a_day():
+    coin = {'2024-01-02T18:00:00': 3.0, '2024-01-01T09:00:00': 1.0, '2024-01-02T06:00:00': 2.0}
+
+    _, _, coin_values = align_series(MARKET_CAP_SUMS, coin)
+
+    np.testing.assert_array_equal(coin_values, [1.0, 3.0])
+
+
+def test_base_indexed_series_join_on_the_same_rows():
+    # One day missing and a timestamped key, as TLX/Toros series may have
+    coin = {f'{date.strftime("%Y-%m-%d")}T12:00:00': price for date, price in zip(DATES, PRICES) if date.day != 15}
+
+    raw_dates, index_values, coin_values = align_series(MARKET_CAP_SUMS, coin)
+    indexed_dates, indexed_index, indexed_coin = align_series(base_index_timeseries(MARKET_CAP_SUMS),
+                                                              base_index_timeseries(coin))
+
+    np.testing.assert_array_equal(raw_dates, indexed_dates)
+    windows = [15, 30]
+    raw = rolling_correlations(index_values, coin_values, windows)
+    indexed = rolling_correlations(indexed_index, indexed_coin, windows)
+    for window in windows:
+        np.testing.assert_allclose(indexed[window], raw[window], rtol=1e-9)
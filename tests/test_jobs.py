@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import sys
+import threading
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import jobs
+
+
+def submit_from_other_worker(name):
+    # A forked gunicorn worker: no executor of its own, only the shared state
+    jobs._executor = None
+    status = jobs.submit(name, lambda: None)
+    os._exit(0 if status["rerun_queued"] else 1)
+
+
+def test_running_job_is_shared_across_workers(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, 'JOBS_DIR', str(tmp_path))
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_job():
+        calls.append(os.getpid())
+        started.set()
+        release.wait(5)
+
+    jobs.submit('plots', slow_job)
+    assert started.wait(5)
+
+    # Another worker sees the run and queues one rerun instead of rendering alongside it
+    worker = multiprocessing.get_context('fork').Process(target=submit_from_other_worker, args=('plots',))
+    worker.start()
+    worker.join(10)
+    assert worker.exitcode == 0
+
+    status = jobs.get_status('plots')
+    assert status["state"] == "running"
+    assert status["rerun_queued"] is True
+    assert status["pid"] == os.getpid()
+
+    release.set()
+    jobs._get_executor().submit(lambda: None).result(5)
+    jobs._get_executor().submit(lambda: None).result(5)
+
+    status = jobs.get_status('plots')
+    assert status["state"] == "idle"
+    assert status["runs"] == 2
+    assert status["requested"] == 2
+    assert calls == [os.getpid(), os.getpid()]
+
+
+def test_job_of_dead_worker_is_recovered(monkeypatch, tmp_path):
+    monkeypatch.setattr(jobs, 'JOBS_DIR', str(tmp_path))
+    job = jobs._new_job()
+    job.update(state="running", pid=2 ** 22 + 1)
+    jobs._write_job('plots', job)
+
+    # Nobody holds the run lock, so the worker that claimed the run is gone
+    assert jobs.get_status('plots')["state"] == "idle"
+    assert jobs.get_status() == {'plots': jobs.get_status('plots')}
+    assert jobs.get_status('other') is None
@@ -0,0 +1,44 @@
+import math
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jupiter import SKIPPED_RETURNS, get_jupiter_analytics
+
+
+def make_rows(n_days=20, missing_sol_day=None):
+    rng = np.random.default_rng(5)
+    days = [(date(2024, 1, 1) + timedelta(days=day)).isoformat() for day in range(n_days)]
+    sol = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_days)))
+    jitosol = sol * np.exp(np.cumsum(rng.normal(0.0003, 0.001, n_days)))
+
+    rows = [{'asset_name': 'jitosol', 'price': price, 'timestamp': day} for day, price in zip(days, jitosol)]
+    rows += [{'asset_name': 'solana', 'price': price, 'timestamp': day}
+             for i, (day, price) in enumerate(zip(days, sol)) if i != missing_sol_day]
+    return rows, jitosol, sol
+
+
+def test_returns_without_a_sol_price_are_not_counted():
+    rows, jitosol, sol = make_rows(missing_sol_day=10)
+
+    stats = get_jupiter_analytics(rows)['daily_changes']['jitosol']
+
+    # Returns into and out of the day SOL has no price are left out
+    relative = jitosol / sol
+    expected = [relative[day] / relative[day - 1] - 1 for day in range(SKIPPED_RETURNS, len(sol)) if day not in (10, 11)]
+    assert stats['num_days'] == len(expected) == 14
+    assert math.isclose(stats['average_daily_return'], np.mean(expected), rel_tol=1e-12)
+    assert math.isclose(stats['variance'], np.var(expected), rel_tol=1e-9)
+    assert all(not math.isnan(value) for value in (stats['apy'], stats['std_deviation']))
+
+
+def test_fully_priced_sol_counts_every_return():
+    rows, _, sol = make_rows()
+
+    stats = get_jupiter_analytics(rows)['daily_changes']['jitosol']
+
+    assert stats['num_days'] == len(sol) - SKIPPED_RETURNS
@@ -0,0 +1,109 @@
+import base64
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import jwks_cache
+
+JWKS_URL = 'https://cognito-idp.example.com/pool/.well-known/jwks.json'
+
+
+def b64url(number):
+    return base64.urlsafe_b64encode(number.to_bytes((number.bit_length() + 7) // 8, 'big')).rstrip(b'=').decode()
+
+
+def make_jwk(kid):
+    numbers = rsa.generate_private_key(public_exponent=65537, key_size=1024).public_key().public_numbers()
+    return {'kid': kid, 'kty': 'RSA', 'alg': 'RS256', 'n': b64url(numbers.n), 'e': b64url(numbers.e)}
+
+
+class FakeFetcher:
+    """
+    Stand-in for fetch_jwks serving a mutable key set and counting the downloads.
+    """
+
+    def __init__(self, *kids):
+        self.jwks = [make_jwk(kid) for kid in kids]
+        self.calls = 0
+
+    def __call__(self, url):
+        assert url == JWKS_URL
+        self.calls += 1
+        return list(self.jwks)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(jwks_cache, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_keys_are_served_from_memory_until_the_ttl_expires(clock):
+    fetcher = FakeFetcher('a')
+    jwks_cache.configure(JWKS_URL, fetcher)
+
+    key = jwks_cache.get_public_key('a')
+    assert key is not None
+    clock[0] += jwks_cache.JWKS_CACHE_TTL - 1
+    assert jwks_cache.get_public_key('a') is key
+    assert fetcher.calls == 1
+
+    # Rotated key set: picked up once the cached one expires
+    fetcher.jwks = [make_jwk('a')]
+    clock[0] += 1
+    assert jwks_cache.get_public_key('a').public_numbers() != key.public_numbers()
+    assert fetcher.calls == 2
+
+
+def test_unknown_kids_refresh_at_most_once_per_interval(clock):
+    fetcher = FakeFetcher('a')
+    jwks_cache.configure(JWKS_URL, fetcher)
+    jwks_cache.get_public_key('a')
+
+    # Within the interval of the first download: no refresh at all
+    assert jwks_cache.get_public_key('made-up') is None
+    assert fetcher.calls == 1
+
+    clock[0] += jwks_cache.JWKS_MIN_REFRESH_INTERVAL
+    for _ in range(5):
+        assert jwks_cache.get_public_key('made-up') is None
+    assert fetcher.calls == 2
+
+    # A key added inside the interval is not fetched until it has passed
+    fetcher.jwks.append(make_jwk('b'))
+    clock[0] += jwks_cache.JWKS_MIN_REFRESH_INTERVAL - 1
+    assert jwks_cache.get_public_key('b') is None
+    assert fetcher.calls == 2
+    clock[0] += 1
+    assert jwks_cache.get_public_key('b') is not None
+    assert fetcher.calls == 3
+
+
+def test_concurrent_misses_fetch_once():
+    release = threading.Event()
+    fetcher = FakeFetcher('a')
+
+    def slow_fetcher(url):
+        release.wait(5)
+        return fetcher(url)
+
+    jwks_cache.configure(JWKS_URL, slow_fetcher)
+    keys = []
+    threads = [threading.Thread(target=lambda: keys.append(jwks_cache.get_public_key('a'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert fetcher.calls == 1
+    assert len(keys) == 8 and all(key is keys[0] is not None for key in keys)
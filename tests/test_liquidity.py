@@ -0,0 +1,53 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import liquidity
+from liquidity import CORRELATION_COINS, MAX_GRID_LAGS, calculate_correlation_grid, correlation_series, parse_grid_axis
+
+
+def make_inputs(n_days=120, seed=3):
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range('2023-01-01', periods=n_days, freq='D')
+    prices = pd.DataFrame({'timestamp': timestamps})
+    for coin in CORRELATION_COINS:
+        prices[f'price_{coin}'] = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, n_days)))
+    liquidity_values = 6e6 + np.cumsum(rng.normal(0, 3e4, n_days))
+    return prices, [[str(day.date()), value] for day, value in zip(timestamps, liquidity_values)]
+
+
+def test_grid_in_chunks_matches_each_lag(monkeypatch):
+    prices, liquidity_values = make_inputs()
+    monkeypatch.setattr(liquidity, 'load_price_history', lambda coins: prices)
+    monkeypatch.setattr(liquidity, 'GRID_LAG_CHUNK', 4)
+    lags, ma_lengths = list(range(-9, 10)), [0, 7, 14]
+
+    grid = calculate_correlation_grid(liquidity_values, lags, ma_lengths)
+
+    merged_df = liquidity.merge_price_and_liquidity(prices, liquidity_values)
+    for i, lag in enumerate(lags):
+        series = correlation_series(merged_df, lag, 0)
+        for coin in CORRELATION_COINS:
+            np.testing.assert_allclose(grid[f"correlation_{coin}"][i], series[coin][0][-1], rtol=1e-9)
+            for j, ma_length in enumerate(ma_lengths):
+                expected = correlation_series(merged_df, lag, ma_length)[coin][1][-1]
+                np.testing.assert_allclose(grid[f"sma_{coin}"][i][j], expected, rtol=1e-9)
+
+
+def test_grid_rejects_oversized_requests(monkeypatch):
+    prices, liquidity_values = make_inputs()
+    monkeypatch.setattr(liquidity, 'load_price_history', lambda coins: prices)
+
+    # Too many lags is rejected before the range is built
+    with pytest.raises(ValueError):
+        parse_grid_axis({"start": 0, "stop": 10 ** 12}, "lags", MAX_GRID_LAGS)
+    assert len(parse_grid_axis({"start": 0, "stop": MAX_GRID_LAGS - 1}, "lags", MAX_GRID_LAGS)) == MAX_GRID_LAGS
+
+    # A lag as long as the overlapping history leaves nothing to correlate
+    with pytest.raises(ValueError):
+        calculate_correlation_grid(liquidity_values, [0, -len(prices)], [14])
@@ -0,0 +1,111 @@
+import json
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+import psycopg2.errors
+import pytest
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import price_history
+from price_history import PriceHistoryUnavailable, load_price_history, parse_price_chart
+
+# Trimmed payload in the shape of https://www.coingecko.com/price_charts/1/usd/max.json:
+# [milliseconds, price] closes at midnight UTC, then the live intraday point
+MAX_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'coingecko_max_btc.json')
+
+
+def load_fixture():
+    with open(MAX_JSON) as f:
+        return json.load(f)
+
+
+def stored_rows(coins):
+    dates = pd.to_datetime(['2025-01-01', '2025-01-02'])
+    return pd.DataFrame({
+        'date': list(dates) * len(coins),
+        'coin': [coin for coin in coins for _ in dates],
+        'price': [float(i + 1) for i in range(len(coins) * len(dates))],
+    })
+
+
+def test_parse_price_chart_drops_the_live_point():
+    payload = load_fixture()
+
+    history = parse_price_chart(payload)
+
+    closes = payload['stats'][:-1]
+    assert len(history) == len(closes)
+    assert history['price'].tolist() == [price for _, price in closes]
+    # Same days as the old row-by-row utcfromtimestamp conversion
+    assert history['date'].dt.strftime('%Y-%m-%d').tolist() == [
+        datetime.fromtimestamp(ms / 1000, timezone.utc).strftime('%Y-%m-%d') for ms, _ in closes
+    ]
+    assert (history['date'] == history['date'].dt.normalize()).all()
+
+
+def test_read_price_history_is_empty_before_the_table_exists(monkeypatch):
+    def fetch_frame(*args, **kwargs):
+        raise psycopg2.errors.UndefinedTable('relation "coingecko_price_history" does not exist')
+    monkeypatch.setattr(price_history, 'fetch_frame', fetch_frame)
+
+    history = price_history.read_price_history(['btc'])
+
+    assert history.empty
+    assert list(history.columns) == ['date', 'coin', 'price']
+
+
+def test_load_price_history_only_reads_the_store(monkeypatch):
+    def refresh_price_history(coins=None):
+        raise AssertionError('the request path must not download from CoinGecko')
+    monkeypatch.setattr(price_history, 'refresh_price_history', refresh_price_history)
+    monkeypatch.setattr(price_history, 'read_price_history', lambda coins: stored_rows(['btc']))
+
+    with pytest.raises(PriceHistoryUnavailable, match='eth'):
+        load_price_history(['btc', 'eth'])
+
+    monkeypatch.setattr(price_history, 'read_price_history', lambda coins: stored_rows(['btc', 'eth']))
+    prices = load_price_history(['btc', 'eth'])
+    assert list(prices.columns) == ['timestamp', 'price_btc', 'price_eth']
+    assert len(prices) == 2
+
+
+def test_refresh_downloads_before_taking_the_lock(monkeypatch):
+    events = []
+
+    class Cursor:
+        def execute(self, query, params=None):
+            events.append('lock' if 'pg_advisory_xact_lock' in query else 'sql')
+
+    @contextmanager
+    def db_session():
+        events.append('session')
+        yield Cursor()
+
+    def fetch_price_chart(chart_id):
+        events.append('download')
+        return parse_price_chart(load_fixture())
+
+    monkeypatch.setattr(price_history, 'db_session', db_session)
+    monkeypatch.setattr(price_history, 'fetch_price_chart', fetch_price_chart)
+    monkeypatch.setattr(price_history, 'store_price_history', lambda cursor, coin, history: len(history))
+
+    written = price_history.refresh_price_history(['btc', 'eth'])
+
+    assert events[:4] == ['download', 'download', 'session', 'lock']
+    assert set(written) == {'btc', 'eth'}
+
+
+def test_correlation_route_reports_an_empty_store(monkeypatch):
+    from app import app
+
+    monkeypatch.setattr(price_history, 'read_price_history', lambda coins: stored_rows([]))
+
+    response = app.test_client().post('/liquidity/correlation',
+                                      json={'liquidity': [['2025-01-01', 1.0]], 'lag': 0, 'ma_length': 1})
+
+    assert response.status_code == 503
+    assert 'No price history stored' in response.get_json()['error']
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prices
+from columnar import series_dicts_to_columnar
+
+
+def test_columnar_price_chart_matches_the_records(monkeypatch):
+    # Unordered rows with a second, later price on 2024-01-02
+    rows = pd.DataFrame({
+        'timestamp': pd.to_datetime(['2024-01-03 00:00', '2024-01-01 00:00', '2024-01-02 00:00', '2024-01-02 12:00']),
+        'price': [3.0, 1.0, 2.0, 2.5],
+    })
+    monkeypatch.setattr(prices, 'fetch_frame', lambda *args, **kwargs: rows.copy())
+
+    columnar = prices.get_price_chart_columnar('2024-01-01', '2024-01-03', 'solana')
+
+    records = {'2024-01-01': 1.0, '2024-01-02': 2.5, '2024-01-03': 3.0}
+    expected = series_dicts_to_columnar({'solana': records})
+    assert columnar['dates'] == expected['dates'] == ['2024-01-01', '2024-01-02', '2024-01-03']
+    np.testing.assert_array_equal(columnar['series']['solana'], expected['series']['solana'])
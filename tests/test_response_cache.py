@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+
+from flask import Flask, jsonify
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import response_cache
+from response_cache import cached_response, get_cache_stats
+
+
+def make_client(monkeypatch, watermark='1:abc'):
+    monkeypatch.setattr(response_cache, 'read_watermarks', lambda: {table: watermark for table in response_cache.TABLE_WATERMARKS})
+    monkeypatch.setattr(response_cache, '_watermarks_read_at', None)
+    response_cache.clear()
+
+    app = Flask(__name__)
+
+    @app.route('/liquidity')
+    @cached_response('liquidity')
+    def liquidity():
+        return jsonify({'value': 1})
+
+    return app.test_client()
+
+
+def test_etag_revalidation_without_last_modified(monkeypatch):
+    client = make_client(monkeypatch)
+
+    response = client.get('/liquidity')
+    assert response.status_code == 200
+    assert response.headers.get('ETag')
+    assert 'Last-Modified' not in response.headers
+
+    revalidated = client.get('/liquidity', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert 'Last-Modified' not in revalidated.headers
+
+
+def test_if_modified_since_is_ignored(monkeypatch):
+    client = make_client(monkeypatch)
+
+    response = client.get('/liquidity', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+
+    assert response.status_code == 200
+
+
+def test_etag_is_the_same_for_every_worker(monkeypatch):
+    first = make_client(monkeypatch).get('/liquidity').headers['ETag']
+    # A fresh process state with the same data version
+    second = make_client(monkeypatch).get('/liquidity').headers['ETag']
+    changed = make_client(monkeypatch, watermark='2:def').get('/liquidity').headers['ETag']
+
+    assert first == second
+    assert changed != first
+
+
+def test_not_modified_is_counted_for_every_revalidation(monkeypatch):
+    client = make_client(monkeypatch)
+    etag = client.get('/liquidity').headers['ETag']
+    before = get_cache_stats()['not_modified']
+
+    def revalidate():
+        thread_client = client.application.test_client()
+        for _ in range(50):
+            assert thread_client.get('/liquidity', headers={'If-None-Match': etag}).status_code == 304
+
+    threads = [threading.Thread(target=revalidate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert get_cache_stats()['not_modified'] - before == 200
@@ -0,0 +1,126 @@
+import datetime
+import os
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+# Add the parent directory to the path so we can import from the main app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trw_guy_model
+from trw_guy_model import fit_models, get_models, load_state, record_delete, record_upsert
+
+
+class FakePriceData:
+    """
+    price_data as a dict of date -> (global_liquidity, bitcoin_price, gold_price), with the queries trw_guy_model runs.
+    """
+
+    def __init__(self, n_rows=300):
+        rng = np.random.default_rng(0)
+        global_liquidity = np.linspace(50, 180, n_rows) * rng.uniform(0.95, 1.05, n_rows)
+        gold_prices = 10 * global_liquidity ** 1.2 * rng.uniform(0.9, 1.1, n_rows)
+        bitcoin_prices = 1e-3 * gold_prices ** 2 * rng.uniform(0.7, 1.3, n_rows)
+        self.rows = {
+            str(datetime.date(2015, 1, 4) + datetime.timedelta(weeks=week)): (global_liquidity[week], bitcoin_prices[week], gold_prices[week])
+            for week in range(n_rows)
+        }
+        self.full_reads = 0
+
+    @staticmethod
+    def row_hash(row_date, row):
+        return zlib.crc32(repr((row_date, row)).encode()) - 2 ** 31
+
+    def columns(self, dates):
+        return (dates, *(np.array([self.rows[date][i] for date in dates]) for i in range(3)))
+
+    def fetch_state_rows(self):
+        self.full_reads += 1
+        dates = sorted(self.rows)
+        return self.columns(dates), sum(self.row_hash(date, self.rows[date]) for date in dates)
+
+    def fetch_rows_after(self, last_date):
+        covered = [date for date in sorted(self.rows) if date <= last_date]
+        after = [date for date in sorted(self.rows) if date > last_date]
+        return (len(covered), sum(self.row_hash(date, self.rows[date]) for date in covered),
+                self.columns(after), sum(self.row_hash(date, self.rows[date]) for date in after))
+
+    def read_row(self, row_date):
+        row = self.rows.get(row_date)
+        return {
+            "n_rows": len(self.rows),
+            "hash_sum": sum(self.row_hash(date, values) for date, values in self.rows.items()),
+            "index": sum(date < row_date for date in self.rows),
+            "row": row,
+            "hash": self.row_hash(row_date, row) if row is not None else 0,
+        }
+
+    def fit(self):
+        return fit_models(*self.columns(sorted(self.rows)))
+
+
+@pytest.fixture
+def table(monkeypatch, tmp_path):
+    monkeypatch.setattr(trw_guy_model, 'MODEL_STATE_PATH', str(tmp_path / 'trw_guy_model.npz'))
+    monkeypatch.setattr(trw_guy_model, 'MODEL_STATE_LOCK_PATH', str(tmp_path / 'trw_guy_model.npz.lock'))
+    fake = FakePriceData()
+    monkeypatch.setattr(trw_guy_model, 'fetch_state_rows', fake.fetch_state_rows)
+    monkeypatch.setattr(trw_guy_model, 'fetch_rows_after', fake.fetch_rows_after)
+    return fake
+
+
+def assert_same_models(models, expected):
+    for name, fit in expected.items():
+        for key, value in fit.items():
+            np.testing.assert_allclose(models[name][key], value, rtol=1e-7)
+
+
+def upsert(table, row_date, row):
+    before = table.read_row(row_date)
+    table.rows[row_date] = row
+    record_upsert(row_date, before, table.read_row(row_date))
+
+
+def test_rows_appended_elsewhere_are_read_after_the_last_date(table):
+    get_models()
+    last_date = max(table.rows)
+    for week in range(1, 3):
+        table.rows[str(datetime.date.fromisoformat(last_date) + datetime.timedelta(weeks=week))] = (190.0, 60000.0, 2500.0)
+
+    assert_same_models(get_models(), table.fit())
+    assert table.full_reads == 1
+    assert load_state()["n_rows"] == len(table.rows)
+
+
+def test_writes_update_the_state_in_place(table):
+    get_models()
+
+    # Appended week, edited past week, deleted last week
+    upsert(table, '2030-01-06', (200.0, 70000.0, 2600.0))
+    upsert(table, sorted(table.rows)[10], (60.0, 300.0, 1200.0))
+    before = table.read_row('2030-01-06')
+    del table.rows['2030-01-06']
+    record_delete(before, max(table.rows))
+
+    assert_same_models(get_models(), table.fit())
+    assert table.full_reads == 1
+
+
+def test_edits_no_hook_applied_refit_the_state(table):
+    get_models()
+
+    # Same row count and last date, one value changed in place (e.g. through another pod)
+    first_date = sorted(table.rows)[0]
+    table.rows[first_date] = (table.rows[first_date][0], table.rows[first_date][1] * 3, table.rows[first_date][2])
+    assert_same_models(get_models(), table.fit())
+    assert table.full_reads == 2
+
+    # A hook whose before-version no longer matches the state leaves it to the next read
+    stale = table.read_row('2030-01-06')
+    table.rows[sorted(table.rows)[5]] = (70.0, 400.0, 1300.0)
+    get_models()
+    table.rows['2030-01-06'] = (200.0, 70000.0, 2600.0)
+    record_upsert('2030-01-06', stale, table.read_row('2030-01-06'))
+    assert_same_models(get_models(), table.fit())
+    assert table.full_reads == 3
@@ -1,121 +1,43 @@
-from database import get_db_connection, get_db_cursor
-import psycopg2
-import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.metrics import r2_score
-from matplotlib.ticker import FixedLocator, FuncFormatter, ScalarFormatter, LogLocator
-import datetime
-import matplotlib.ticker as mticker  # For tick formatting
 import os
+import math
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import matplotlib
 matplotlib.use('Agg')
 
-def trw_guy_def():
-    # Database configuration is now handled by database.py
-
-    # Connect to MySQL and create a table if it doesn't exist
-    def create_connection():
-        try:
-            conn = get_db_connection()
-            return conn
-        except psycopg2.Error as err:
-            print(f"Database connection error: {err}")
-        return None
-
-    # Create the table if it doesn't exist
-    def create_table(conn):
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS price_data (
-                date DATE PRIMARY KEY,
-                global_liquidity REAL,
-                bitcoin_price REAL,
-                gold_price REAL
-            )
-        """)
-        conn.commit()
-
-    # Insert data if the table is empty
-    def insert_sample_data(conn, global_liquidity, bitcoin_prices, gold_prices, dates):
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM price_data")
-        result = cursor.fetchone()[0]
-
-        if result == 0:
-            for i in range(len(global_liquidity)):
-                cursor.execute("""
-                    INSERT INTO price_data (date, global_liquidity, bitcoin_price, gold_price)
-                    VALUES (%s, %s, %s, %s)
-                """, (dates[i].strftime('%Y-%m-%d'), global_liquidity[i], bitcoin_prices[i], gold_prices[i]))
-            conn.commit()
-
-    # Fetch data from the database
-    def fetch_data(conn):
-        cursor = conn.cursor()
-        cursor.execute("SELECT date, global_liquidity, bitcoin_price, gold_price FROM price_data ORDER BY date")
-        rows = cursor.fetchall()
-        dates_db = [row[0] for row in rows]
-        global_liquidity_db = np.array([row[1] for row in rows])
-        bitcoin_prices_db = np.array([row[2] for row in rows])
-        gold_prices_db = np.array([row[3] for row in rows])
-        return dates_db, global_liquidity_db, bitcoin_prices_db, gold_prices_db
-
-    # Save plot images in static/plots folder
-    def save_plot(fig, filename):
-        plots_dir = os.path.join(os.path.dirname(__file__), 'static', 'plots')
-        if not os.path.exists(plots_dir):
-            os.makedirs(plots_dir)
-        fig.savefig(os.path.join(plots_dir, f'{filename}.png'))
-
-    # ----------------------------
-    # Step 1: Define Your Data
-    # ----------------------------
-
-    conn = create_connection()
-    # create_table(conn)
-    # insert_sample_data(conn, global_liquidity, bitcoin_prices, gold_prices, dates)
-
-    dates, global_liquidity, bitcoin_prices, gold_prices = fetch_data(conn)
-    conn.close()
-
-    gold_prices_2019 = gold_prices[241:]
-    bitcoin_prices_2019 = bitcoin_prices[241:]
-    global_liquidity_2018 = global_liquidity[192:]
-    gold_prices_2018 = gold_prices[192:]
-    bitcoin_prices_2018 = bitcoin_prices[192:]
-
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.ticker import FixedLocator, FuncFormatter, ScalarFormatter, LogLocator
+from trw_guy_model import fetch_data, fit_models, get_models, predict_bitcoin_price
+from plots import PLOT_NAMES, PLOTS_DIR, input_digest, is_current, read_manifest, save_plot, write_manifest
 
-    # Dates array 2
-    dates_2018 = dates[192:]
+# Processes the charts are rendered on; 1 (the default) renders them one after another in this
+# process. Higher values are capped at the CPUs the container may use.
+TRW_GUY_RENDER_WORKERS = int(os.getenv('TRW_GUY_RENDER_WORKERS', 1))
 
-    #################################################################################################
-    ########################## 3rd degree polynomial on log-log #####################################
-    #################################################################################################
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
 
-    # Convert data to numpy arrays
-    x = np.array(global_liquidity)
-    y = np.array(bitcoin_prices)
 
+#################################################################################################
+########################## 3rd degree polynomial on log-log #####################################
+#################################################################################################
+def render_global_liquidity_vs_bitcoin(dates, global_liquidity, bitcoin_prices, gold_prices, models, plots_dir=PLOTS_DIR):
     # Ensure all values are positive
-    x = x[x > 0]
-    y = y[y > 0]
+    positive = (global_liquidity > 0) & (bitcoin_prices > 0)
+    x = global_liquidity[positive]
+    y = bitcoin_prices[positive]
 
     # Log-transform the data
     log_x = np.log10(x)
-    log_y = np.log10(y)
-
-    # Fit a 3rd-degree polynomial to the log-transformed data
-    coeffs = np.polyfit(log_x, log_y, deg=3)
 
-    # Compute the predicted log_y values
-    log_y_pred = np.polyval(coeffs, log_x)
-
-    # Compute R-squared
-    SS_res = np.sum((log_y - log_y_pred) ** 2)
-    SS_tot = np.sum((log_y - np.mean(log_y)) ** 2)
-    R_squared = 1 - (SS_res / SS_tot)
+    # 3rd-degree polynomial fitted to the log-transformed data
+    coeffs = models["polynomial"]["coefficients"]
+    R_squared = models["polynomial"]["r2"]
 
     # Prepare data for plotting the trend line
     log_x_fit = np.linspace(min(log_x), max(log_x), 100)
@@ -168,23 +90,25 @@ def trw_guy_def():
     # plt.text(0.05, 0.95, f'$R^2 = {R_squared:.4f}$', transform=ax.transAxes, fontsize=12, verticalalignment='top')
 
     # Save the plot
-    save_plot(plt, 'global_liquidity_vs_bitcoin')
+    save_plot(plt, 'global_liquidity_vs_bitcoin', plots_dir)
+    plt.close('all')
 
-    #################################################################################################
-    ########################## 3rd degree polynomial on log-log Valuation ###########################
-    #################################################################################################
 
+#################################################################################################
+########################## 3rd degree polynomial on log-log Valuation ###########################
+#################################################################################################
+def render_zscore_btc_prices(dates, global_liquidity, bitcoin_prices, gold_prices, models, plots_dir=PLOTS_DIR):
     # ----------------------------
     # Step 2: Data Alignment and Filtering
     # ----------------------------
 
     # Ensure all values are positive for log transformation
     # Create a mask where both x and y are greater than zero
-    mask = (x > 0) & (y > 0)
+    mask = (global_liquidity > 0) & (bitcoin_prices > 0)
 
     # Apply the mask to filter the data
-    x_filtered = x[mask]
-    y_filtered = y[mask]
+    x_filtered = global_liquidity[mask]
+    y_filtered = bitcoin_prices[mask]
 
     # ----------------------------
     # Step 3: Validate Dates Array Length
@@ -204,21 +128,13 @@ def trw_guy_def():
     log_y = np.log10(y_filtered)
 
     # ----------------------------
-    # Step 5: Fit a 3rd-Degree Polynomial
+    # Step 5: 3rd-Degree Polynomial
     # ----------------------------
 
-    # Fit a 3rd-degree polynomial to the log-transformed data
-    coeffs = np.polyfit(log_x, log_y, deg=3)
-
-    # Compute the predicted log_y values using the polynomial
+    # Compute the predicted log_y values using the fitted polynomial
+    coeffs = models["polynomial"]["coefficients"]
     log_y_pred = np.polyval(coeffs, log_x)
-
-    # Compute R-squared to assess the fit quality
-    SS_res = np.sum((log_y - log_y_pred) ** 2)
-    SS_tot = np.sum((log_y - np.mean(log_y)) ** 2)
-    R_squared = 1 - (SS_res / SS_tot)
-
-    # print(f"3rd-degree Polynomial Fit: R-squared = {R_squared:.4f}")
+    R_squared = models["polynomial"]["r2"]
 
     # ----------------------------
     # Step 6: Calculate Residuals and Z-scores
@@ -303,98 +219,17 @@ def trw_guy_def():
     ax2.yaxis.set_major_formatter(FuncFormatter(y_fmt))
 
     # Save the plot
-    save_plot(fig, 'zscore_btc_prices')
-
-    #################################################################################################
-    ########################## Michael Howell's "Better Model" ######################################
-    #################################################################################################
-
-    bitcoin_prices = np.array(bitcoin_prices)
-    gold_prices = np.array(gold_prices)
-    global_liquidity = np.array(global_liquidity)
-    bitcoin_prices_2019 = np.array(bitcoin_prices_2019)
-    gold_prices_2019 = np.array(gold_prices_2019)
-
-    assert len(bitcoin_prices) == len(gold_prices) == len(global_liquidity), "Data arrays must be of the same length."
-    assert len(bitcoin_prices_2019) == len(gold_prices_2019), "Data arrays (2019) must be of the same length."
-
-    # Log-transform the Bitcoin and gold prices
-    log_bitcoin_prices_2019 = np.log(bitcoin_prices_2019)
-    log_gold_prices_2019 = np.log(gold_prices_2019)
-
-    # Linear Regression on Log-Log Data
-
-    # Reshape data for sklearn
-    X_log_gold = log_gold_prices_2019.reshape(-1, 1)
-    y_log_bitcoin = log_bitcoin_prices_2019
-
-    # Perform linear regression
-    linear_model_log = LinearRegression()
-    linear_model_log.fit(X_log_gold, y_log_bitcoin)
-    y_pred_log_linear = linear_model_log.predict(X_log_gold)
-
-    # Calculate R-squared
-    r2_log_linear = r2_score(y_log_bitcoin, y_pred_log_linear)
-    # print(f'Log-Log Linear Regression R^2: {r2_log_linear:.4f}')
-    # print(f'Estimated Coefficient (Slope): {linear_model_log.coef_[0]:.4f}')
-    # print(f'Estimated Intercept: {linear_model_log.intercept_:.4f}')
-
-    # Log-transform the data
-    log_global_liquidity = np.log(global_liquidity)
-    log_gold_prices_gl = np.log(gold_prices)
-
-    # Reshape data for sklearn
-    X_log_gl = log_global_liquidity.reshape(-1, 1)
-    y_log_gold = log_gold_prices_gl
-
-    # Perform linear regression
-    linear_model_gl = LinearRegression()
-    linear_model_gl.fit(X_log_gl, y_log_gold)
-    y_pred_gl = linear_model_gl.predict(X_log_gl)
-
-    # Calculate R-squared
-    r2_gl = r2_score(y_log_gold, y_pred_gl)
-    loading_factor = linear_model_gl.coef_[0]
-    # print(f'Gold vs. Global Liquidity Regression R^2: {r2_gl:.4f}')
-    # print(f'Estimated Loading Factor (Slope): {loading_factor:.4f}')
-
-    # Predict log(Gold Price) at GL = 350
-    gl_target = 350  # Global Liquidity target in trillions
-    log_gl_target = np.log(gl_target)
-    log_gold_pred_target = linear_model_gl.predict([[log_gl_target]])
-    gold_price_pred_target = np.exp(log_gold_pred_target)[0]
-    # print(f'Predicted Gold Price at GL={gl_target}: ${gold_price_pred_target:,.2f}')
+    save_plot(fig, 'zscore_btc_prices', plots_dir)
+    plt.close('all')
 
-    # Predict log(Bitcoin Price) using log(Gold Price)
-    log_gold_pred_target = np.log(gold_price_pred_target)
-    log_bitcoin_pred_target = linear_model_log.predict([[log_gold_pred_target]])
-    bitcoin_price_pred_target = np.exp(log_bitcoin_pred_target)[0]
-    # print(f'Predicted Bitcoin Price at GL={gl_target}: ${bitcoin_price_pred_target:,.2f}')
 
-
-    def predict_bitcoin_price(gl_value):
-        # Step 1: Predict Gold Price
-        log_gl_value = np.log(gl_value)
-        log_gold_pred = linear_model_gl.predict([[log_gl_value]])
-        gold_price_pred = np.exp(log_gold_pred)[0]
-
-        # Step 2: Predict Bitcoin Price
-        log_gold_pred = np.log(gold_price_pred)
-        log_bitcoin_pred = linear_model_log.predict([[log_gold_pred]])
-        bitcoin_price_pred = np.exp(log_bitcoin_pred)[0]
-
-        return bitcoin_price_pred, gold_price_pred
-
-
-    # Define a range of Global Liquidity values
+#################################################################################################
+########################## Michael Howell's "Better Model" ######################################
+#################################################################################################
+def render_michael_howell_better_model(dates, global_liquidity, bitcoin_prices, gold_prices, models, plots_dir=PLOTS_DIR):
+    # Predict Bitcoin through gold over a range of Global Liquidity values
     gl_values = np.linspace(global_liquidity.min(), 350, 100)
-    bitcoin_prices_pred = []
-    gold_prices_pred = []
-
-    for gl in gl_values:
-        bitcoin_pred, gold_pred = predict_bitcoin_price(gl)
-        bitcoin_prices_pred.append(bitcoin_pred)
-        gold_prices_pred.append(gold_pred)
+    bitcoin_prices_pred, gold_prices_pred = predict_bitcoin_price(gl_values, models["gold_gl"], models["bitcoin_gold"])
 
     # Plot Bitcoin Price vs. Global Liquidity
     plt.figure(figsize=(12, 6))
@@ -417,62 +252,27 @@ def trw_guy_def():
     ax.yaxis.set_major_formatter(FuncFormatter(y_fmt))
 
     # Save the plot
-    save_plot(plt, 'michael_howell_better_model')
+    save_plot(plt, 'michael_howell_better_model', plots_dir)
+    plt.close('all')
 
-    #################################################################################################
-    ################### Michael Howell's "Better Model" with BTC vs. GL #############################
-    #################################################################################################
 
+#################################################################################################
+################### Michael Howell's "Better Model" with BTC vs. GL #############################
+#################################################################################################
+def render_btc_vs_gl_better_model(dates, global_liquidity, bitcoin_prices, gold_prices, models, plots_dir=PLOTS_DIR):
     # Ensure data alignment and positivity
     mask = (bitcoin_prices > 0) & (gold_prices > 0) & (global_liquidity > 0)
     bitcoin_prices_filtered = bitcoin_prices[mask]
     gold_prices_filtered = gold_prices[mask]
     global_liquidity_filtered = global_liquidity[mask]
 
-    # Log-transform the Bitcoin and gold prices for regression
-    log_bitcoin_prices_2019 = np.log(bitcoin_prices_2019)
-    log_gold_prices_2019 = np.log(gold_prices_2019)
-
-    # Linear Regression on Log-Log Data for Bitcoin vs. Gold Price
-    X_log_gold = log_gold_prices_2019.reshape(-1, 1)
-    y_log_bitcoin = log_bitcoin_prices_2019
-    linear_model_log = LinearRegression()
-    linear_model_log.fit(X_log_gold, y_log_bitcoin)
-
-    # Linear Regression on Log-Log Data for Gold Price vs. Global Liquidity
-    log_global_liquidity = np.log(global_liquidity)
-    log_gold_prices_gl = np.log(gold_prices)
-    X_log_gl = log_global_liquidity.reshape(-1, 1)
-    y_log_gold = log_gold_prices_gl
-    linear_model_gl = LinearRegression()
-    linear_model_gl.fit(X_log_gl, y_log_gold)
-
-
-    # Define the prediction function
-    def predict_bitcoin_price(gl_value):
-        # Ensure gl_value is a scalar
-        gl_value = np.atleast_1d(gl_value).astype(float)[0]
-        # Step 1: Predict Gold Price
-        log_gl_value = np.log(gl_value)
-        log_gold_pred = linear_model_gl.predict([[log_gl_value]])
-        gold_price_pred = np.exp(log_gold_pred)[0]
-        # Step 2: Predict Bitcoin Price
-        log_bitcoin_pred = linear_model_log.predict([[log_gold_pred[0]]])
-        bitcoin_price_pred = np.exp(log_bitcoin_pred)[0]
-        return bitcoin_price_pred, gold_price_pred
-
-
     # Define a range of Global Liquidity values for prediction
     gl_min = global_liquidity_filtered.min()
     gl_max = 350  # As per your requirement
     gl_values = np.logspace(np.log10(gl_min), np.log10(gl_max), 1000)
 
     # Generate predicted Bitcoin prices
-    bitcoin_prices_pred = []
-    for gl in gl_values:
-        bitcoin_pred, _ = predict_bitcoin_price(gl)
-        bitcoin_prices_pred.append(bitcoin_pred)
-    bitcoin_prices_pred = np.array(bitcoin_prices_pred)
+    bitcoin_prices_pred, _ = predict_bitcoin_price(gl_values, models["gold_gl"], models["bitcoin_gold"])
 
     # Plot Bitcoin Price vs. Global Liquidity
     plt.figure(figsize=(12, 6))
@@ -541,95 +341,41 @@ def trw_guy_def():
     plt.tight_layout()
 
     # Save the plot
-    save_plot(plt, 'btc_vs_gl_better_model')
+    save_plot(plt, 'btc_vs_gl_better_model', plots_dir)
+    plt.close('all')
 
-    #################################################################################################
-    ################### Michael Howell's "Better Model" Valuation ###################################
-    #################################################################################################
+
+#################################################################################################
+################### Michael Howell's "Better Model" Valuation ###################################
+#################################################################################################
+def render_zscore_btc_prices_valuation(dates, global_liquidity, bitcoin_prices, gold_prices, models, plots_dir=PLOTS_DIR):
+    global_liquidity_2018 = global_liquidity[192:]
+    gold_prices_2018 = gold_prices[192:]
+    bitcoin_prices_2018 = bitcoin_prices[192:]
+
+    # Dates array 2
+    dates_2018 = dates[192:]
 
     # ----------------------------
     # Step 2: Ensure Data Alignment and Positivity
     # ----------------------------
 
-    # Convert data lists to NumPy arrays
-    bitcoin_prices = np.array(bitcoin_prices_2018)
-    gold_prices = np.array(gold_prices_2018)
-    global_liquidity = np.array(global_liquidity_2018)
-    bitcoin_prices_2019 = np.array(bitcoin_prices_2019)
-    gold_prices_2019 = np.array(gold_prices_2019)
-
     # Ensure data alignment and positivity
-    mask = (bitcoin_prices > 0) & (gold_prices > 0) & (global_liquidity > 0)
-    bitcoin_prices_filtered = bitcoin_prices[mask]
-    gold_prices_filtered = gold_prices[mask]
-    global_liquidity_filtered = global_liquidity[mask]
+    mask = (bitcoin_prices_2018 > 0) & (gold_prices_2018 > 0) & (global_liquidity_2018 > 0)
+    bitcoin_prices_filtered = bitcoin_prices_2018[mask]
+    global_liquidity_filtered = global_liquidity_2018[mask]
     dates_filtered = [date for i, date in enumerate(dates_2018) if mask[i]]  # Adjust dates accordingly
 
     # Verify that the dates array aligns with the filtered data
     if len(bitcoin_prices_filtered) != len(dates_filtered):
         raise ValueError("Length of filtered bitcoin prices and dates do not match.")
 
-    # print(
-    #     f"After filtering - Length of Bitcoin Prices: {len(bitcoin_prices_filtered)}, Length of Dates: {len(dates_filtered)}")
-
-    # ----------------------------
-    # Step 3: Log-transform the Data for Regression
-    # ----------------------------
-
-    # Log-transform the Bitcoin and Gold prices for regression
-    log_bitcoin_prices_2019 = np.log(bitcoin_prices_2019)
-    log_gold_prices_2019 = np.log(gold_prices_2019)
-
-    # Log-transform the Global Liquidity and Gold Prices for regression
-    log_global_liquidity = np.log(global_liquidity_filtered)
-    log_gold_prices_gl = np.log(gold_prices_filtered)
-
-    # ----------------------------
-    # Step 4: Perform Linear Regression
-    # ----------------------------
-
-    # Linear Regression on Log-Log Data for Gold Price vs. Global Liquidity
-    X_log_gl = log_global_liquidity.reshape(-1, 1)
-    y_log_gold = log_gold_prices_gl
-    linear_model_gl = LinearRegression()
-    linear_model_gl.fit(X_log_gl, y_log_gold)
-
-    # Linear Regression on Log-Log Data for Bitcoin Price vs. Gold Price
-    X_log_gold = log_gold_prices_2019.reshape(-1, 1)
-    y_log_bitcoin = log_bitcoin_prices_2019
-    linear_model_log = LinearRegression()
-    linear_model_log.fit(X_log_gold, y_log_bitcoin)
-
-
     # ----------------------------
     # Step 5: Predict Bitcoin Prices for Actual Data Points
     # ----------------------------
 
-    def predict_bitcoin_price(gl_value):
-        """
-        Predicts Bitcoin price based on Global Liquidity using the two-step regression model.
-        Returns both predicted Bitcoin price and predicted Gold price.
-        """
-        # Predict log(Gold Price) from log(Global Liquidity)
-        log_gl_value = np.log(gl_value)
-        log_gold_pred = linear_model_gl.predict([[log_gl_value]])[0]
-
-        # Predict log(Bitcoin Price) from log(Gold Price)
-        log_bitcoin_pred = linear_model_log.predict([[log_gold_pred]])[0]
-
-        # Convert back to original scale
-        gold_price_pred = np.exp(log_gold_pred)
-        bitcoin_price_pred = np.exp(log_bitcoin_pred)
-
-        return bitcoin_price_pred, gold_price_pred
-
-
-    # Generate predicted Bitcoin prices for the actual Global Liquidity data points
-    bitcoin_prices_pred = []
-    for gl in global_liquidity_filtered:
-        btc_pred, _ = predict_bitcoin_price(gl)
-        bitcoin_prices_pred.append(btc_pred)
-    bitcoin_prices_pred = np.array(bitcoin_prices_pred)
+    # Gold is fitted on GL from 2018, Bitcoin on gold from 2019
+    bitcoin_prices_pred, _ = predict_bitcoin_price(global_liquidity_filtered, models["gold_gl_2018"], models["bitcoin_gold"])
 
     # ----------------------------
     # Step 6: Calculate Residuals and Z-scores
@@ -727,5 +473,117 @@ def trw_guy_def():
     ax.yaxis.set_major_formatter(FuncFormatter(y_fmt))
 
     # Save the plot
-    save_plot(fig, 'zscore_btc_prices_valuation')
+    save_plot(fig, 'zscore_btc_prices_valuation', plots_dir)
+    plt.close('all')
+
+
+RENDERERS = {
+    'global_liquidity_vs_bitcoin': render_global_liquidity_vs_bitcoin,
+    'zscore_btc_prices': render_zscore_btc_prices,
+    'michael_howell_better_model': render_michael_howell_better_model,
+    'btc_vs_gl_better_model': render_btc_vs_gl_better_model,
+    'zscore_btc_prices_valuation': render_zscore_btc_prices_valuation,
+}
+
+
+def render_chart(name, data, models, plots_dir=PLOTS_DIR):
+    """
+    Render one chart from the fetched price_data arrays; the unit of work sent to the pool.
+    """
+    RENDERERS[name](*data, models, plots_dir=plots_dir)
+    return name
+
+
+def _pool_context():
+    # Workers are forked from a clean server process that has already imported this
+    # module, rather than from the multi-threaded gunicorn worker
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def usable_cpus():
+    """
+    CPUs this process may run on: its affinity mask, capped by the cgroup CPU quota (pod limit).
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    try:
+        # cgroup v2: "<quota> <period>", or "max <period>" when unlimited
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    # One pool per gunicorn worker, kept across runs so the render processes start only once
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def render_charts(data, models=None, plots_dir=PLOTS_DIR, workers=TRW_GUY_RENDER_WORKERS):
+    """
+    Render every chart in PLOT_NAMES, in parallel when workers > 1.
+
+    Args:
+        data: (dates, global_liquidity, bitcoin_prices, gold_prices) as returned by fetch_data
+        models: Regressions from trw_guy_model.fit_models; fitted here if not given
+        plots_dir: Directory the PNGs are written to
+        workers: Number of render processes, capped at usable_cpus()
+    """
+    # Fitted once and shared by every chart
+    if models is None:
+        models = fit_models(*data)
+
+    workers = min(workers, len(PLOT_NAMES), usable_cpus())
+    if workers <= 1:
+        for name in PLOT_NAMES:
+            render_chart(name, data, models, plots_dir)
+        return
+
+    pool = _get_pool(workers)
+    try:
+        futures = [pool.submit(render_chart, name, data, models, plots_dir) for name in PLOT_NAMES]
+        for future in futures:
+            future.result()
+    except BrokenProcessPool:
+        # A render process died (e.g. OOM-killed); start a fresh pool on the next run
+        _reset_pool()
+        raise
+
+
+def trw_guy_def():
+    data = fetch_data()
+
+    # Nothing to fit or render if price_data is unchanged since the last run
+    digest = input_digest(*data)
+    manifest = read_manifest()
+    if is_current(manifest, digest):
+        return manifest
 
+    # Fits come from the stored sufficient statistics while only rows were appended
+    render_charts(data, get_models())
+    return write_manifest(digest)
@@ -0,0 +1,553 @@
+import os
+
+import numpy as np
+
+from columnar import to_columnar
+from database import db_session
+from plots import PLOTS_DIR, file_lock
+
+# Row offsets of the shorter fit windows in the weekly price_data history
+BITCOIN_GOLD_START = 241  # from 2019
+GOLD_GL_2018_START = 192  # from 2018
+
+POLYNOMIAL_DEGREE = 3
+
+# |Z| above which a residual is reported as significant
+SIGNIFICANT_Z = 2
+
+# Default Global Liquidity range end and resolution of the projection curve
+PROJECTION_GL_MAX = 350
+PROJECTION_POINTS = 1000
+MAX_PROJECTION_POINTS = 10000
+
+# Sufficient statistics of every fit, kept next to the plots and versioned by the row count and
+# hash sum of the price_data rows they cover, so writes through any worker or pod are noticed
+MODEL_STATE_PATH = os.path.join(PLOTS_DIR, 'trw_guy_model.npz')
+# Held by whichever worker of the pod reads, rebuilds or writes the state
+MODEL_STATE_LOCK_PATH = f'{MODEL_STATE_PATH}.lock'
+
+# Polynomial degree of each fit; all are least squares on log-transformed columns
+FITS = {
+    "polynomial": POLYNOMIAL_DEGREE,  # log10(BTC) ~ log10(GL), positive rows
+    "bitcoin_gold": 1,                # log(BTC) ~ log(gold), from 2019
+    "gold_gl": 1,                     # log(gold) ~ log(GL), all rows
+    "gold_gl_2018": 1,                # log(gold) ~ log(GL), positive rows from 2018
+}
+
+_STAT_FIELDS = ("xtx", "xty", "yty", "ysum", "n", "shift", "scale", "y_shift")
+
+# Per-row hash of the price_data watermark in response_cache; summed over the covered rows it
+# versions the model state, and a write changes the sum by the rows it adds or removes
+ROW_HASH = "hashtext(date || ':' || global_liquidity || ':' || bitcoin_price || ':' || gold_price)"
+
+
+def fetch_data():
+    with db_session(dict_cursor=False) as cursor:
+        cursor.execute("SELECT date, global_liquidity, bitcoin_price, gold_price FROM price_data ORDER BY date")
+        rows = cursor.fetchall()
+    dates_db = [row[0] for row in rows]
+    global_liquidity_db = np.array([row[1] for row in rows])
+    bitcoin_prices_db = np.array([row[2] for row in rows])
+    gold_prices_db = np.array([row[3] for row in rows])
+    return dates_db, global_liquidity_db, bitcoin_prices_db, gold_prices_db
+
+
+def _to_columns(rows):
+    # (date, global_liquidity, bitcoin_price, gold_price, row hash) rows -> columns and hash sum
+    dates = [str(row[0]) for row in rows]
+    columns = [np.array([row[i] for row in rows], dtype='float64') for i in (1, 2, 3)]
+    return (dates, *columns), sum(int(row[4]) for row in rows)
+
+
+def fetch_state_rows():
+    """
+    Every price_data row, for a full refit.
+
+    Returns:
+        tuple: ((dates, global_liquidity, bitcoin_prices, gold_prices), hash sum)
+    """
+    with db_session(dict_cursor=False) as cursor:
+        cursor.execute(f"SELECT date, global_liquidity, bitcoin_price, gold_price, {ROW_HASH} FROM price_data ORDER BY date")
+        return _to_columns(cursor.fetchall())
+
+
+def fetch_rows_after(last_date):
+    """
+    Version of the price_data rows up to last_date, and the rows after it, in one snapshot.
+
+    Returns:
+        tuple: (row count, hash sum, (dates, global_liquidity, bitcoin_prices, gold_prices) after
+        last_date, hash sum of those rows)
+    """
+    with db_session(dict_cursor=False) as cursor:
+        cursor.execute(f"""
+            WITH covered AS (
+                SELECT COUNT(*) AS n_rows, COALESCE(SUM({ROW_HASH}), 0) AS hash_sum
+                FROM price_data WHERE date <= %(last_date)s
+            )
+            SELECT covered.n_rows, covered.hash_sum, date, global_liquidity, bitcoin_price, gold_price, {ROW_HASH}
+            FROM covered LEFT JOIN price_data ON date > %(last_date)s
+            ORDER BY date
+        """, {"last_date": last_date})
+        rows = cursor.fetchall()
+    columns, new_hash_sum = _to_columns([row[2:] for row in rows if row[2] is not None])
+    return int(rows[0][0]), int(rows[0][1]), columns, new_hash_sum
+
+
+def read_row(cursor, row_date):
+    """
+    Version of price_data and the row at row_date, read inside a write's transaction.
+
+    Returns:
+        dict: n_rows and hash_sum of the table, index (rows before row_date),
+        row ((global_liquidity, bitcoin_price, gold_price) as stored, or None) and its hash
+    """
+    cursor.execute(f"""
+        WITH version AS (
+            SELECT COUNT(*) AS n_rows, COALESCE(SUM({ROW_HASH}), 0) AS hash_sum,
+                   COUNT(*) FILTER (WHERE date < %(date)s) AS row_index
+            FROM price_data
+        )
+        SELECT version.n_rows, version.hash_sum, version.row_index,
+               global_liquidity, bitcoin_price, gold_price, {ROW_HASH}
+        FROM version LEFT JOIN price_data ON date = %(date)s
+    """, {"date": row_date})
+    n_rows, hash_sum, index, *row, row_hash = cursor.fetchone()
+    return {
+        "n_rows": int(n_rows),
+        "hash_sum": int(hash_sum),
+        "index": int(index),
+        "row": tuple(row) if row_hash is not None else None,
+        "hash": int(row_hash) if row_hash is not None else 0,
+    }
+
+
+def fit_inputs(start, global_liquidity, bitcoin_prices, gold_prices):
+    """
+    The (x, y) points each fit takes from a run of consecutive price_data rows.
+
+    Args:
+        start: Row index of the first row in the full, date-ordered table
+        global_liquidity, bitcoin_prices, gold_prices: Column values of the rows
+
+    Returns:
+        dict: fit name -> (x, y)
+    """
+    global_liquidity = np.asarray(global_liquidity, dtype='float64')
+    bitcoin_prices = np.asarray(bitcoin_prices, dtype='float64')
+    gold_prices = np.asarray(gold_prices, dtype='float64')
+    index = start + np.arange(len(global_liquidity))
+
+    positive = (global_liquidity > 0) & (bitcoin_prices > 0)
+    from_2019 = index >= BITCOIN_GOLD_START
+    from_2018 = (index >= GOLD_GL_2018_START) & positive & (gold_prices > 0)
+
+    log_global_liquidity = np.log(global_liquidity)
+    log_gold_prices = np.log(gold_prices)
+    log_bitcoin_prices = np.log(bitcoin_prices)
+
+    return {
+        "polynomial": (np.log10(global_liquidity[positive]), np.log10(bitcoin_prices[positive])),
+        "bitcoin_gold": (log_gold_prices[from_2019], log_bitcoin_prices[from_2019]),
+        "gold_gl": (log_global_liquidity, log_gold_prices),
+        "gold_gl_2018": (log_global_liquidity[from_2018], log_gold_prices[from_2018]),
+    }
+
+
+def _design(stats, x):
+    # Powers of x centred and scaled by the values fixed at the last full fit, highest first
+    return np.vander((x - stats["shift"]) / stats["scale"], len(stats["xty"]))
+
+
+def new_stats(x, y, degree):
+    """
+    Least-squares sufficient statistics (XᵀX, Xᵀy, yᵀy, Σy, n) of the points (x, y).
+
+    x and y are centred (and x scaled) by their values at this full fit, which
+    keeps the normal equations well conditioned as rows are appended later.
+    """
+    spread = np.max(np.abs(x - x.mean())) if len(x) else 0.0
+    stats = {
+        "xtx": np.zeros((degree + 1, degree + 1)),
+        "xty": np.zeros(degree + 1),
+        "yty": 0.0,
+        "ysum": 0.0,
+        "n": 0,
+        "shift": x.mean() if len(x) else 0.0,
+        "scale": spread if spread > 0 else 1.0,
+        "y_shift": y.mean() if len(y) else 0.0,
+    }
+    return accumulate(stats, x, y)
+
+
+def accumulate(stats, x, y, sign=1):
+    """
+    Add the points (x, y) to a fit's sufficient statistics, or remove them with sign=-1.
+    """
+    X = _design(stats, x)
+    y = y - stats["y_shift"]
+    stats["xtx"] = stats["xtx"] + sign * (X.T @ X)
+    stats["xty"] = stats["xty"] + sign * (X.T @ y)
+    stats["yty"] = stats["yty"] + sign * (y @ y)
+    stats["ysum"] = stats["ysum"] + sign * y.sum()
+    stats["n"] = stats["n"] + sign * len(y)
+    return stats
+
+
+def solve(stats):
+    """
+    Fit from sufficient statistics.
+
+    Returns:
+        dict: coefficients (highest power first, as np.polyval expects), r2,
+        residual_std (population std of the residuals) and n
+    """
+    degree = len(stats["xty"]) - 1
+    n = int(stats["n"])
+    if n <= degree:
+        return {"coefficients": np.full(degree + 1, np.nan), "r2": np.nan, "residual_std": np.nan, "n": n}
+
+    beta = np.linalg.solve(stats["xtx"], stats["xty"])
+    SS_res = max(stats["yty"] - beta @ stats["xty"], 0.0)
+    SS_tot = stats["yty"] - stats["ysum"] ** 2 / n
+
+    # Back from the centred, scaled variable to x itself
+    scale = stats["scale"]
+    polynomial = np.polynomial.Polynomial(beta[::-1],
+                                          domain=[stats["shift"] - scale, stats["shift"] + scale],
+                                          window=[-1, 1])
+    coefficients = np.zeros(degree + 1)
+    converted = polynomial.convert().coef
+    coefficients[:len(converted)] = converted
+    coefficients[0] += stats["y_shift"]
+
+    return {
+        "coefficients": coefficients[::-1].copy(),
+        "r2": 1 - (SS_res / SS_tot),
+        "residual_std": np.sqrt(SS_res / n),
+        "n": n,
+    }
+
+
+def to_models(state):
+    """
+    The fitted models the charts use, from a model state.
+
+    Returns:
+        dict: polynomial -> {coefficients, r2, residual_std, n}; the linear
+        fits -> {slope, intercept, r2, residual_std, n}
+    """
+    models = {}
+    for name, stats in state["fits"].items():
+        fit = solve(stats)
+        if FITS[name] == 1:
+            slope, intercept = fit.pop("coefficients")
+            fit.update(slope=slope, intercept=intercept)
+        models[name] = fit
+    return models
+
+
+def build_state(dates, global_liquidity, bitcoin_prices, gold_prices, hash_sum=0):
+    """
+    Model state from the full price_data history (a full refit).
+    """
+    inputs = fit_inputs(0, global_liquidity, bitcoin_prices, gold_prices)
+    return {
+        "n_rows": len(dates),
+        "last_date": str(dates[-1]) if len(dates) else "",
+        "hash_sum": hash_sum,
+        "fits": {name: new_stats(*inputs[name], degree) for name, degree in FITS.items()},
+    }
+
+
+def update_rows(state, start, global_liquidity, bitcoin_prices, gold_prices, sign=1):
+    """
+    Add (or with sign=-1 remove) the rows at positions start, start + 1, ... to every fit.
+
+    Row count, last date and hash sum are left to the caller.
+    """
+    inputs = fit_inputs(start, global_liquidity, bitcoin_prices, gold_prices)
+    for name, stats in state["fits"].items():
+        accumulate(stats, *inputs[name], sign=sign)
+    return state
+
+
+def append_rows(state, dates, global_liquidity, bitcoin_prices, gold_prices):
+    """
+    Update a model state with rows appended after its last date.
+    """
+    update_rows(state, state["n_rows"], global_liquidity, bitcoin_prices, gold_prices)
+    state["n_rows"] += len(dates)
+    state["last_date"] = str(dates[-1])
+    return state
+
+
+def fit_models(dates, global_liquidity, bitcoin_prices, gold_prices):
+    """
+    Fit every regression the trw_guy charts use, once.
+
+    Returns:
+        dict: polynomial (log-log GL vs. BTC), bitcoin_gold (log BTC ~ log gold
+        from 2019), gold_gl (log gold ~ log GL) and gold_gl_2018 (the same
+        from 2018, positive rows only)
+    """
+    return to_models(build_state(dates, global_liquidity, bitcoin_prices, gold_prices))
+
+
+def predict_line(model, x):
+    return model["slope"] * x + model["intercept"]
+
+
+def predict_bitcoin_price(gl_values, gold_model, bitcoin_model):
+    """
+    Michael Howell's "Better Model": Global Liquidity -> gold -> Bitcoin, for an array of GL values.
+
+    Args:
+        gl_values: Global Liquidity values ($ trillions)
+        gold_model: log(gold) ~ log(GL) fit
+        bitcoin_model: log(BTC) ~ log(gold) fit
+
+    Returns:
+        tuple: (predicted Bitcoin prices, predicted gold prices)
+    """
+    log_gold = predict_line(gold_model, np.log(gl_values))
+    return np.exp(predict_line(bitcoin_model, log_gold)), np.exp(log_gold)
+
+
+def save_state(state):
+    arrays = {"n_rows": state["n_rows"], "last_date": state["last_date"], "hash_sum": state["hash_sum"]}
+    for name, stats in state["fits"].items():
+        arrays.update({f"{name}__{field}": stats[field] for field in _STAT_FIELDS})
+    # Coefficients are re-derived from the statistics on load; stored for inspection
+    for name, fit in to_models(state).items():
+        arrays[f"{name}__residual_std"] = fit["residual_std"]
+        arrays[f"{name}__coefficients"] = fit.get("coefficients", [fit.get("slope"), fit.get("intercept")])
+
+    os.makedirs(os.path.dirname(MODEL_STATE_PATH), exist_ok=True)
+    tmp_path = f'{MODEL_STATE_PATH}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, MODEL_STATE_PATH)
+
+
+def load_state():
+    """
+    Returns:
+        dict: The stored model state, or None if there is none or it is unreadable
+    """
+    try:
+        with np.load(MODEL_STATE_PATH) as stored:
+            return {
+                "n_rows": int(stored["n_rows"]),
+                "last_date": str(stored["last_date"]),
+                "hash_sum": int(stored["hash_sum"]),
+                "fits": {
+                    name: {field: stored[f"{name}__{field}"] for field in _STAT_FIELDS}
+                    for name in FITS
+                },
+            }
+    except (OSError, KeyError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Error reading trw_guy model state: {e}")
+        return None
+
+
+def _save(state):
+    try:
+        save_state(state)
+    except OSError as e:
+        print(f"Error writing trw_guy model state: {e}")
+
+
+def current_state():
+    """
+    The model state for the current price_data, brought up to date from the stored one.
+
+    Only the version of the covered rows and the rows after the stored last
+    date are read. If the version still matches, those rows are appended in
+    place; if not (an edit, delete or insert before the last date that no
+    write hook applied, e.g. on another pod), the state is refitted from the
+    full history.
+    """
+    with file_lock(MODEL_STATE_LOCK_PATH):
+        state = load_state()
+        if state is not None and state["n_rows"]:
+            n_rows, hash_sum, rows, new_hash_sum = fetch_rows_after(state["last_date"])
+            if (n_rows, hash_sum) != (state["n_rows"], state["hash_sum"]):
+                state = None
+            elif not rows[0]:
+                return state
+            else:
+                state = append_rows(state, *rows)
+                state["hash_sum"] += new_hash_sum
+        else:
+            state = None
+
+        if state is None:
+            rows, hash_sum = fetch_state_rows()
+            state = build_state(*rows, hash_sum=hash_sum)
+        _save(state)
+    return state
+
+
+def get_models():
+    """
+    Fitted models for the current price_data (see current_state).
+    """
+    return to_models(current_state())
+
+
+def _is_current(state, version):
+    # Whether the state covers exactly the table a write read its version from
+    return state is not None and (state["n_rows"], state["hash_sum"]) == (version["n_rows"], version["hash_sum"])
+
+
+def record_upsert(row_date, before, after):
+    """
+    Apply an upserted price_data row to the stored state, if it was current before the write.
+
+    A new row after the last date is appended and an edited row is replaced
+    in the statistics. A row inserted before the last date shifts the rows
+    after it, so that (like a state that was already behind) is left to the
+    next read to refit.
+
+    Args:
+        row_date: Date of the upserted row
+        before: read_row(cursor, row_date) before the upsert
+        after: read_row(cursor, row_date) after it, in the same transaction
+    """
+    with file_lock(MODEL_STATE_LOCK_PATH):
+        state = load_state()
+        if not _is_current(state, before):
+            return
+
+        index = before["index"]
+        if before["row"] is not None:
+            update_rows(state, index, *([value] for value in before["row"]), sign=-1)
+        elif index == state["n_rows"]:
+            state["n_rows"] += 1
+            state["last_date"] = str(row_date)[:10]
+        else:
+            return
+        update_rows(state, index, *([value] for value in after["row"]))
+        state["hash_sum"] += after["hash"] - before["hash"]
+        _save(state)
+
+
+def record_delete(before, last_date):
+    """
+    Apply a deleted price_data row to the stored state, if it was current before the delete.
+
+    Only the last row can be taken out in place; deleting an earlier one
+    shifts the rows after it, which the next read refits.
+
+    Args:
+        before: read_row(cursor, row_date) before the delete
+        last_date: Latest date in price_data after the delete
+    """
+    with file_lock(MODEL_STATE_LOCK_PATH):
+        state = load_state()
+        if not _is_current(state, before) or before["row"] is None or before["index"] != state["n_rows"] - 1:
+            return
+
+        update_rows(state, before["index"], *([value] for value in before["row"]), sign=-1)
+        state["n_rows"] -= 1
+        state["last_date"] = str(last_date) if last_date is not None else ""
+        state["hash_sum"] -= before["hash"]
+        _save(state)
+
+
+def model_summary():
+    """
+    Coefficients, R² and residual std of every fit, for /trw-guy/model.
+    """
+    state = current_state()
+    return {
+        "n_rows": state["n_rows"],
+        "last_date": state["last_date"] or None,
+        "models": to_models(state),
+    }
+
+
+def _zscore_response(dates, z_scores, bitcoin_prices, r2):
+    dates = np.array(dates, dtype='datetime64[D]')
+    significant = np.abs(z_scores) > SIGNIFICANT_Z
+    return {
+        "r2": r2,
+        **to_columnar(dates, {"z_score": z_scores, "bitcoin_price": bitcoin_prices}),
+        "significant": to_columnar(dates[significant], {"z_score": z_scores[significant]}),
+    }
+
+
+def polynomial_zscores(dates, global_liquidity, bitcoin_prices, gold_prices):
+    """
+    Z-scores of log10(BTC) around the log-log cubic fit on Global Liquidity (the zscore_btc_prices chart).
+
+    Returns:
+        dict: r2, columnar dates / series (z_score, bitcoin_price) and the
+        columnar |Z| > 2 points under "significant"
+    """
+    fit = get_models()["polynomial"]
+    positive = (global_liquidity > 0) & (bitcoin_prices > 0)
+
+    residuals = np.log10(bitcoin_prices[positive]) - np.polyval(fit["coefficients"], np.log10(global_liquidity[positive]))
+    z_scores = residuals / fit["residual_std"]
+
+    return _zscore_response(np.asarray(dates)[positive], z_scores, bitcoin_prices[positive], fit["r2"])
+
+
+def better_model_zscores(dates, global_liquidity, bitcoin_prices, gold_prices):
+    """
+    Z-scores of log(BTC) around the GL -> gold -> BTC chain from 2018 (the zscore_btc_prices_valuation chart).
+
+    Returns:
+        dict: Same shape as polynomial_zscores
+    """
+    models = get_models()
+    index = np.arange(len(dates))
+    rows = ((index >= GOLD_GL_2018_START) & (bitcoin_prices > 0) & (gold_prices > 0) & (global_liquidity > 0))
+
+    bitcoin_prices_pred, _ = predict_bitcoin_price(global_liquidity[rows], models["gold_gl_2018"], models["bitcoin_gold"])
+    log_bitcoin_actual = np.log(bitcoin_prices[rows])
+    residuals = log_bitcoin_actual - np.log(bitcoin_prices_pred)
+    z_scores = residuals / np.std(residuals)
+
+    SS_res = np.sum(residuals ** 2)
+    SS_tot = np.sum((log_bitcoin_actual - np.mean(log_bitcoin_actual)) ** 2)
+
+    return _zscore_response(np.asarray(dates)[rows], z_scores, bitcoin_prices[rows], 1 - (SS_res / SS_tot))
+
+
+ZSCORE_MODELS = {
+    "polynomial": polynomial_zscores,
+    "better_model": better_model_zscores,
+}
+
+
+def projection(dates, global_liquidity, bitcoin_prices, gold_prices, gl_max=PROJECTION_GL_MAX, points=PROJECTION_POINTS):
+    """
+    Predicted gold and Bitcoin prices over log-spaced Global Liquidity values (the btc_vs_gl_better_model curve).
+
+    Args:
+        gl_max: Global Liquidity ($ trillions) the curve ends at
+        points: Number of points on the curve
+
+    Returns:
+        dict: global_liquidity, bitcoin_price and gold_price arrays
+    """
+    if not 2 <= points <= MAX_PROJECTION_POINTS:
+        raise ValueError(f"points must be between 2 and {MAX_PROJECTION_POINTS}")
+
+    models = get_models()
+    positive = (bitcoin_prices > 0) & (gold_prices > 0) & (global_liquidity > 0)
+    gl_min = global_liquidity[positive].min()
+    if not gl_max > gl_min:
+        raise ValueError(f"gl_max must be above the smallest Global Liquidity value ({gl_min:g})")
+
+    gl_values = np.logspace(np.log10(gl_min), np.log10(gl_max), points)
+    bitcoin_prices_pred, gold_prices_pred = predict_bitcoin_price(gl_values, models["gold_gl"], models["bitcoin_gold"])
+    return {
+        "global_liquidity": gl_values,
+        "bitcoin_price": bitcoin_prices_pred,
+        "gold_price": gold_prices_pred,
+    }
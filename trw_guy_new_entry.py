@@ -1,9 +1,10 @@
 import os
 
 from flask import request, jsonify
-from database import get_db_connection, get_db_cursor
+from database import db_session
 import psycopg2
 from datetime import date
+from trw_guy_model import read_row, record_delete, record_upsert
 
 PASSWORD = os.getenv('SECRET_PASSWORD', 'default')
 
@@ -29,10 +30,6 @@ def add_data(data):
         return jsonify({"error": "Missing required fields"}), 400
 
     try:
-        # Connect to the database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         # Insert the new data into the database (PostgreSQL upsert syntax)
         query = """
             INSERT INTO price_data (date, global_liquidity, bitcoin_price, gold_price)
@@ -42,12 +39,14 @@ def add_data(data):
                 bitcoin_price = EXCLUDED.bitcoin_price,
                 gold_price = EXCLUDED.gold_price
             """
-        cursor.execute(query, (date, global_liquidity, bitcoin_price, gold_price))
-        conn.commit()
+        with db_session(dict_cursor=False) as cursor:
+            before = read_row(cursor, date)
+            cursor.execute(query, (date, global_liquidity, bitcoin_price, gold_price))
+            # The row as stored (REAL columns)
+            after = read_row(cursor, date)
 
-        # Close the connection
-        cursor.close()
-        conn.close()
+        # Keep the stored trw_guy fit in step without refitting the whole history
+        record_upsert(date, before, after)
 
         return jsonify({"message": "Data added successfully"}), 201
 
@@ -60,20 +59,19 @@ def delete_data_by_date(date_value, password):
         return jsonify({"error": "Unauthorized"}), 401
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         query = "DELETE FROM price_data WHERE date = %s"
-        cursor.execute(query, (date_value,))
-        conn.commit()
-
-        rows_deleted = cursor.rowcount
-        cursor.close()
-        conn.close()
+        with db_session(dict_cursor=False) as cursor:
+            before = read_row(cursor, date_value)
+            cursor.execute(query, (date_value,))
+            rows_deleted = cursor.rowcount
+            cursor.execute("SELECT MAX(date) FROM price_data")
+            last_date = cursor.fetchone()[0]
 
         if rows_deleted == 0:
             return jsonify({"error": "No data found for the provided date"}), 404
 
+        record_delete(before, last_date)
+
         return jsonify({"message": "Data deleted successfully"}), 200
 
     except psycopg2.Error as err:
@@ -85,24 +83,17 @@ def get_data(password):
     if password != PASSWORD or PASSWORD == "default":
         return jsonify({"error": "Unauthorized"}), 401
     try:
-        # Connect to the database
-        conn = get_db_connection()
-        cursor = get_db_cursor(conn)  # Use dictionary cursor for readable output
-
         # Fetch all rows from the price_data table
         query = "SELECT * FROM price_data ORDER BY date"
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        with db_session() as cursor:  # Use dictionary cursor for readable output
+            cursor.execute(query)
+            rows = cursor.fetchall()
 
         # Format the date to YYYY-MM-DD if it is of type 'date'
         for row in rows:
             if 'date' in row and isinstance(row['date'], date):
                 row['date'] = row['date'].strftime("%Y-%m-%d")
 
-        # Close the connection
-        cursor.close()
-        conn.close()
-
         return jsonify({"data": rows}), 200
 
     except psycopg2.Error as err: